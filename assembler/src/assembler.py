@@ -119,6 +119,6 @@ class Assembler():
 
     def print_instruction(self, instruction: dict):
         if "operands" in instruction:
-            print(f"{instruction["mnemonic"]}, {instruction["operands"]}, addr_mod={instruction["addressing_mode"]}")
+            print(f"{instruction['mnemonic']}, {instruction['operands']}, addr_mod={instruction['addressing_mode']}")
         else:
-            print(f"{instruction["mnemonic"]}")
\ No newline at end of file
+            print(f"{instruction['mnemonic']}")
\ No newline at end of file
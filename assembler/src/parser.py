@@ -10,6 +10,8 @@ REGISTERS = {
 OPCODES = {
     "NOP":      0b00_0000, "HALT":      0b00_0001,
     "RET":      0b00_0010, "MOV":       0b00_0011,
+    "EI":       0b00_0100, "DI":        0b00_0101,
+    "RETI":     0b00_0110, "WAIT":      0b00_0111,
     "ADD":      0b01_0000, "SUB":       0b01_0001,
     "MUL":      0b01_0010, "MULH":      0b01_0011,
     "AND":      0b01_0100, "OR":        0b01_0101,
@@ -7,6 +7,7 @@
       package = pkgs.python3.withPackages (ps: [
         ps.pytest
         ps.blessed
+        ps.numpy
       ]);
     };
     rust = {
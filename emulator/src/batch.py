@@ -0,0 +1,75 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import json
+import os
+import sys
+from .cpu import ENGINES, get_reg_name
+from .main import load_program
+from .headless import HeadlessIO, console_frame, read_key_script, parse_cycles
+
+def run_job(job):
+    filename, max_cycles, engine, keys, capture_cycles = job
+    cpu = load_program(filename, engine=engine)
+    headless = HeadlessIO(keys, capture_cycles)
+    headless.attach(cpu)
+    status = "halted"
+    error = None
+    start = perf_counter()
+    try:
+        cpu.run(max_cycles=max_cycles)
+    except Exception as e:
+        status = "max_cycles" if max_cycles >= 0 and cpu.clock_cycle >= max_cycles else "error"
+        error = str(e)
+    wall_time = perf_counter() - start
+
+    return {
+        "program": filename,
+        "engine": engine,
+        "max_cycles": max_cycles,
+        "status": status,
+        "error": error,
+        "registers": {get_reg_name(rN): cpu.reg[rN] for rN in range(len(cpu.reg))},
+        "flags": dict(cpu.flags),
+        "clock_cycle": cpu.clock_cycle,
+        "wall_time": wall_time,
+        "console": console_frame(cpu),
+        "frames": headless.frames,
+        "counters": cpu.counters.snapshot(),
+    }
+
+def run_batch(jobs, workers=None):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_job, jobs))
+
+def parse_job(spec, max_cycles, engine, keys=(), capture_cycles=()):
+    if ":" in spec:
+        filename, cycles = spec.rsplit(":", 1)
+        return filename, int(cycles), engine, keys, capture_cycles
+    return spec, max_cycles, engine, keys, capture_cycles
+
+def main():
+    parser = ArgumentParser(prog="YR-µ16 Batch Runner")
+    parser.add_argument("programs", nargs="+", help="program binaries to execute, optionally with a cycle limit (program.bin:100000)")
+    parser.add_argument("--max-cycles", type=int, default=1_000_000, help="cycle limit for programs without their own limit")
+    parser.add_argument("--engine", choices=ENGINES, default="translated", help="instruction execution engine")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--keys", help="key script with the keyboard input for every program (lines of 'CYCLE KEYS')")
+    parser.add_argument("--capture", type=parse_cycles, default=[], help="clock cycles to capture console frames at (comma separated)")
+    parser.add_argument("-o", "--output", help="output file for the JSON results (default: stdout)")
+    args = parser.parse_args()
+
+    keys = read_key_script(args.keys) if args.keys else []
+    jobs = [parse_job(spec, args.max_cycles, args.engine, keys, args.capture) for spec in args.programs]
+    start = perf_counter()
+    results = run_batch(jobs, args.jobs)
+    report = {"wall_time": perf_counter() - start, "results": results}
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+import json
+import os
+import platform
+import re
+import sys
+from .cpu import CPU, ENGINES
+
+ROOT = Path(__file__).resolve().parents[2]
+PROGRAMS = ROOT / "programs"
+RESULTS_VERSION = 1
+
+# Microbenchmark loop bodies per opcode group and addressing mode, {i} numbers the copies of the body
+MICROBENCHMARKS = {
+    "general/mov_imm4": "mov r0, 5",
+    "general/mov_imm8": "mov r0, 0x55",
+    "general/mov_imm16": "mov r0, 0x5555",
+    "general/mov_reg": "mov r0, r1",
+    "general/mov_indirect_reg": "mov r0, [r2]",
+    "general/mov_indirect_offset": "mov r0, [r2 + 4]",
+    "general/mov_indirect_imm16": "mov r0, [0x2000]",
+    "general/nop": "nop",
+    "alu/add_imm4": "add r0, 5",
+    "alu/add_imm8": "add r0, 0x55",
+    "alu/add_imm16": "add r0, 0x5555",
+    "alu/add_reg": "add r0, r1",
+    "alu/add_indirect_reg": "add r0, [r2]",
+    "alu/add_indirect_offset": "add r0, [r2 + 4]",
+    "alu/add_indirect_imm16": "add r0, [0x2000]",
+    "alu/mul_reg": "mul r0, r1",
+    "alu/shl_imm4": "shl r0, 1",
+    "alu/cmp_imm16": "cmp r0, 0x1234",
+    "jump/jmp_imm16": "jmp .next{i}\n.next{i}:",
+    "jump/jc_not_taken": "jc .next{i}\n.next{i}:",
+    "jump/jmp_reg": "mov r3, .next{i}\njmp r3\n.next{i}:",
+    "jump/call_ret": "call subroutine",
+    "memory/load_imm16": "load r0, 0x2000",
+    "memory/load_indirect_reg": "load r0, [r2]",
+    "memory/loadb_indirect_offset": "loadb r0, [r2 + 4]",
+    "memory/store_imm16": "store r0, 0x2000",
+    "memory/storeb_indirect_reg": "storeb r0, [r2]",
+    "stack/push_pop": "push r0\npop r1",
+    "stack/pushb_popb": "pushb r0\npopb r1",
+}
+MICROBENCHMARK_COPIES = 16
+
+def measure_ips(program, engine, instructions, state=None):
+    cpu = CPU(engine=engine)
+    cpu.counters.enabled = False
+    cpu.bus.memory.load_program(program)
+    if state:
+        cpu.restore_state(state)
+    start = perf_counter()
+    cpu.run(steps=instructions)
+    return instructions / (perf_counter() - start)
+
+def measure_vector_ips(program, machines, steps):
+    from .engines.vector import VectorMachine, cross_check # NumPy is only needed for the lockstep engine
+    machine = VectorMachine(machines)
+    machine.load_program(program)
+    start = perf_counter()
+    executed = machine.run(steps)
+    ips = executed / (perf_counter() - start)
+
+    checked = VectorMachine(8)
+    checked.load_program(program)
+    mismatches = cross_check(checked, range(checked.count), min(steps, 20_000))
+    return ips, mismatches
+
+@contextmanager
+def working_directory(path): # Like contextlib.chdir, which needs Python 3.11
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def assemble(source):
+    from assembler.src.assembler import Assembler
+    with working_directory(ROOT): # Imports in the programs are relative to the repository root
+        return Assembler().assemble(source.splitlines())
+
+def find_programs():
+    sources = sorted(PROGRAMS.glob("*.asm"))
+    imported = set()
+    for path in sources:
+        imported.update(Path(name).name for name in re.findall(r'@import\s+"([^"]+)"', path.read_text()))
+    return [path for path in sources if path.name not in imported] # Libraries can't run on their own
+
+def measure_program(program, engine, cycles):
+    cpu = CPU(engine=engine)
+    cpu.idle.enabled = False # Programs waiting for input would be fast-forwarded, that's not execution speed
+    cpu.counters.enabled = False
+    cpu.bus.memory.load_program(program)
+    start = perf_counter()
+    try:
+        cpu.run(max_cycles=cycles)
+    except RuntimeError:
+        if cpu.clock_cycle < cycles: # Only the end of the cycle budget is expected, faults fail the benchmark
+            raise
+    elapsed = perf_counter() - start
+    return cpu.clock_cycle / elapsed
+
+def microbenchmark_source(body):
+    lines = ["setup:", "    mov r2, 0x2000", "loop:"]
+    for i in range(MICROBENCHMARK_COPIES):
+        lines += ["    " + line if not line.startswith(".") else line for line in body.format(i=i).splitlines()]
+    lines += ["    jmp loop", "subroutine:", "    ret"]
+    return "\n".join(lines)
+
+def measure_microbenchmark(program, engine, instructions):
+    cpu = CPU(engine=engine)
+    cpu.idle.enabled = False # Most bodies don't change any state, they would be fast-forwarded
+    cpu.counters.enabled = False
+    cpu.bus.memory.load_program(program)
+    start = perf_counter()
+    cpu.run(steps=instructions)
+    return instructions / (perf_counter() - start)
+
+def synthetic_source(lines):
+    source = ["@let BUFFER = 0x2000", "main:"]
+    for i in range(lines // 8):
+        source += [
+            f"block{i}:",
+            f"    mov r0, {i & 0xFFFF}",
+            "    add r0, [r2 + 4]",
+            f"    cmp r0, 0x{(i * 7) & 0xFFFF:X}",
+            "    jeq .skip",
+            "    storeb r0, [BUFFER]",
+            ".skip:",
+            f"    call block{(i * 13) % (lines // 8)}",
+        ]
+    return "\n".join(source)
+
+def measure_assembler(lines):
+    source = synthetic_source(lines)
+    start = perf_counter()
+    assemble(source)
+    return len(source.splitlines()) / (perf_counter() - start)
+
+def run_suite(cycles=200_000, instructions=100_000, assembler_lines=20_000, repeat=3, engines=ENGINES, log=None):
+    results = {}
+    def record(name, unit, measure):
+        value = max(measure() for _ in range(repeat))
+        results[name] = {"value": value, "unit": unit}
+        if log:
+            log(f"{name:<48} {value:>14,.0f} {unit}")
+
+    for path in find_programs():
+        program = assemble(path.read_text())
+        for engine in engines:
+            record(f"program/{path.stem}/{engine}", "cycles/s", lambda: measure_program(program, engine, cycles))
+    for name, body in MICROBENCHMARKS.items():
+        program = assemble(microbenchmark_source(body))
+        for engine in engines:
+            record(f"micro/{name}/{engine}", "instructions/s", lambda: measure_microbenchmark(program, engine, instructions))
+    record(f"assembler/synthetic_{assembler_lines}", "lines/s", lambda: measure_assembler(assembler_lines))
+
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {"cycles": cycles, "instructions": instructions, "assembler_lines": assembler_lines, "repeat": repeat},
+        "results": results,
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["value"]
+        change = result["value"] / before - 1 if before else 0.0 # All results are rates, higher is better
+        if change < -threshold:
+            regressions.append((name, before, result["value"], change))
+    return regressions
+
+def main():
+    parser = ArgumentParser(prog="YR-µ16 Emulator Benchmark")
+    parser.add_argument("filename", nargs="?", help="program binary to benchmark (without it, the whole suite runs)")
+    parser.add_argument("--instructions", type=int, default=500_000, help="number of instructions to execute per engine")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per engine, the fastest one is reported")
+    parser.add_argument("--machines", type=int, default=0, help="also benchmark the NumPy lockstep engine with this many machines")
+    parser.add_argument("--state", help="save state to start from instead of the program start")
+    parser.add_argument("--cycles", type=int, default=200_000, help="suite: cycles to run each program for")
+    parser.add_argument("--micro-instructions", type=int, default=100_000, help="suite: instructions per microbenchmark run")
+    parser.add_argument("--assembler-lines", type=int, default=20_000, help="suite: size of the synthetic assembler source")
+    parser.add_argument("-o", "--output", help="suite: JSON file to write the results to")
+    parser.add_argument("--compare", help="suite: baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="suite: slowdown that counts as a regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if not args.filename:
+        results = run_suite(args.cycles, args.micro_instructions, args.assembler_lines, args.repeat, log=print)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+        if args.compare:
+            with open(args.compare) as baseline_file:
+                regressions = compare(results, json.load(baseline_file), args.threshold)
+            for name, before, after, change in regressions:
+                print(f"REGRESSION {name}: {before:,.0f} -> {after:,.0f} ({change:+.1%})")
+            if regressions:
+                sys.exit(1)
+            print(f"No regressions beyond {args.threshold:.0%}")
+        return
+
+    with open(args.filename, "rb") as program_file:
+        program = program_file.read()
+    state = None
+    if args.state:
+        with open(args.state, "rb") as state_file:
+            state = state_file.read()
+
+    baseline = None
+    for engine in ENGINES:
+        ips = max(measure_ips(program, engine, args.instructions, state) for _ in range(args.repeat))
+        baseline = baseline or ips
+        print(f"{engine:<12} {ips:>12,.0f} instructions/s ({ips / baseline:.2f}x)")
+
+    if args.machines:
+        ips, mismatches = measure_vector_ips(program, args.machines, args.instructions // args.machines or 1)
+        print(f"{'vector':<12} {ips:>12,.0f} instructions/s ({ips / baseline:.2f}x, {args.machines} machines)")
+        if mismatches:
+            print(f"Lockstep engine diverged from CPU on machines: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,48 @@
+from .devices.memory import MemoryDevice
+
+PAGE_COUNT = 256 # 256 pages of 256 bytes each
+
 class Bus():
     def __init__(self):
         self.devices = []
+        self.page_map = [None] * PAGE_COUNT # Device that covers a whole page, None for unmapped or shared pages
+        self.ram_pages = [None] * PAGE_COUNT # Read/write MemoryDevice covering a whole page, accessed directly
+        self.overlays = {} # Page -> handler that replaces the page's devices, e.g. for watchpoints (see debugger.py)
 
     def attach_device(self, device):
         self.devices.append(device)
         setattr(self, device.name, device)
+        self.build_page_map()
+
+    def build_page_map(self):
+        for page in range(PAGE_COUNT):
+            start = page << 8
+            end = start | 0xFF
+            devices = [device for device in self.devices if device.min_address <= end and start <= device.max_address]
+            if len(devices) == 1 and devices[0].min_address <= start and end <= devices[0].max_address:
+                device = devices[0]
+            else: # Pages shared by multiple devices (like the MMIO registers) are resolved by scanning
+                device = None
+            if page in self.overlays:
+                device = self.overlays[page]
+            self.page_map[page] = device
+            is_ram = isinstance(device, MemoryDevice) and device.io_type == "rw"
+            self.ram_pages[page] = device if is_ram else None
+
+    def set_overlay(self, page, handler): # None removes the overlay
+        if handler is None:
+            self.overlays.pop(page, None)
+        else:
+            self.overlays[page] = handler
+        self.build_page_map()
 
     def get_device(self, addr):
+        device = self.page_map[addr >> 8]
+        if device is not None:
+            return device
+        return self.find_device(addr)
+
+    def find_device(self, addr): # Ignores the page map and overlays
         for device in self.devices:
             if device.min_address <= addr <= device.max_address:
                 return device
@@ -14,23 +50,44 @@ class Bus():
 
     def read_byte(self, addr):
         addr &= 0xFFFF
+        memory = self.ram_pages[addr >> 8]
+        if memory is not None:
+            return memory.data[addr - memory.min_address]
         device = self.get_device(addr)
         if device.io_type == "wo":
             raise RuntimeError(f"Can't read from write-only device '{device.name} at address: {addr:04X}")
+        device.reads += 1
         return device.read_byte(addr)
 
     def write_byte(self, addr, value):
         addr &= 0xFFFF
+        memory = self.ram_pages[addr >> 8]
+        if memory is not None:
+            memory.write_byte(addr, value & 0xFF)
+            return
         device = self.get_device(addr)
         if device.io_type == "ro":
             raise RuntimeError(f"Can't write to read-only device '{device.name} at address: {addr:04X}")
+        device.writes += 1
         device.write_byte(addr, value & 0xFF)
 
     def read_word(self, addr):
+        addr &= 0xFFFF
+        memory = self.ram_pages[addr >> 8]
+        if memory is not None and (addr & 0xFF) != 0xFF: # Both bytes are in the same RAM page
+            index = addr - memory.min_address
+            return (memory.data[index] << 8) | memory.data[index + 1]
         hi = self.read_byte(addr)
         lo = self.read_byte(addr + 1)
         return (hi << 8) | lo
 
     def write_word(self, addr, value):
+        addr &= 0xFFFF
+        memory = self.ram_pages[addr >> 8]
+        if memory is not None and (addr & 0xFF) != 0xFF and memory.watch_map is None:
+            index = addr - memory.min_address
+            memory.data[index] = (value >> 8) & 0xFF
+            memory.data[index + 1] = value & 0xFF
+            return
         self.write_byte(addr, value >> 8)
-        self.write_byte(addr + 1, value)
\ No newline at end of file
+        self.write_byte(addr + 1, value)
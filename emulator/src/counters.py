@@ -0,0 +1,180 @@
+# Performance counters. The hot paths only keep raw counts: executions per instruction word (the
+# interpreter loops increment a list entry, translated blocks and fused sequences count how far each run
+# got with one increment per run) and taken jumps per jump type. Without enabled the interpreter loops
+# don't count, for benchmarks. Bus traffic of MMIO devices is counted by the slow path of the bus, RAM
+# traffic of instructions is derived from the instruction mix and the rest (interrupt entry, DMA
+# transfers) is counted where it happens. Everything else (opcode classes, addressing modes, stack
+# operations, not-taken branches) is aggregated when the counters are read.
+
+import json
+from .engines.translator import operand_length
+
+MNEMONICS = {
+    0b00_0000: "NOP", 0b00_0001: "HALT", 0b00_0010: "RET", 0b00_0011: "MOV",
+    0b00_0100: "EI", 0b00_0101: "DI", 0b00_0110: "RETI", 0b00_0111: "WAIT",
+    0b01_0000: "ADD", 0b01_0001: "SUB", 0b01_0010: "MUL", 0b01_0011: "MULH",
+    0b01_0100: "AND", 0b01_0101: "OR", 0b01_0110: "XOR", 0b01_0111: "SHL",
+    0b01_1000: "ROL", 0b01_1001: "SHR", 0b01_1010: "ASR", 0b01_1011: "ROR",
+    0b01_1100: "CMP", 0b01_1101: "NOT", 0b01_1110: "NEG",
+    0b10_0000: "JMP", 0b10_0001: "JZ", 0b10_0010: "JNZ", 0b10_0011: "JLT",
+    0b10_0100: "JGT", 0b10_0101: "JC", 0b10_0110: "JNC", 0b10_0111: "CALL",
+    0b10_1000: "LOADB", 0b10_1001: "LOAD", 0b10_1010: "STOREB", 0b10_1011: "STORE",
+    0b10_1100: "POPB", 0b10_1101: "POP", 0b10_1110: "PUSHB", 0b10_1111: "PUSH",
+}
+JUMP_TYPES = ["JMP", "JZ", "JNZ", "JLT", "JGT", "JC", "JNC", "CALL"]
+ADDRESSING_MODES = ["imm4", "imm8", "imm16", "reg", "indirect_reg", "indirect_offset", "indirect_imm16"]
+WITHOUT_OPERAND = {"NOP", "HALT", "RET", "EI", "DI", "RETI", "WAIT", "POPB", "POP"}
+STACK_OPERATIONS = {"PUSHB": "push", "PUSH": "push", "CALL": "push", "POPB": "pop", "POP": "pop", "RET": "pop", "RETI": "pop"}
+DATA_READS = {"RET": 2, "RETI": 4, "LOADB": 1, "LOAD": 2, "POPB": 1, "POP": 2}
+DATA_WRITES = {"STOREB": 1, "STORE": 2, "PUSHB": 1, "PUSH": 2, "CALL": 2}
+OPERAND_READERS = {"MOV", "ADD", "SUB", "MUL", "MULH", "AND", "OR", "XOR", "SHL", "ROL", "SHR", "ASR", "ROR",
+                   "CMP", "NOT", "NEG", "PUSHB", "PUSH"} # Read a word for indirect addressing modes
+
+class Counters():
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.enabled = True # Instruction counts of the interpreter loops
+        self.instructions = [0] * 0x10000 # Executions per instruction word
+        self.taken = [0] * len(JUMP_TYPES)
+        self.ram_reads = 0 # RAM bytes outside of instructions
+        self.ram_writes = 0
+
+    def reset(self): # In place, the engines hold references to the lists
+        self.instructions[:] = [0] * len(self.instructions)
+        self.taken[:] = [0] * len(self.taken)
+        for block in self.blocks():
+            block.exits[:] = [0] * len(block.exits)
+        for device in self.cpu.bus.devices:
+            device.reads = device.writes = 0
+        self.ram_reads = self.ram_writes = 0
+
+    def blocks(self): # Cached code that counts its own runs
+        cpu = self.cpu
+        if cpu.translator:
+            return cpu.translator.blocks.values()
+        elif cpu.fused:
+            return cpu.fused.sequences.values()
+        return ()
+
+    def ram_traffic(self, reads, writes):
+        self.ram_reads += reads
+        self.ram_writes += writes
+
+    def fold_block(self, block): # Adds the executions counted by a translated block or fused sequence
+        runs = sum(block.exits)
+        for i, instr in enumerate(block.instrs):
+            runs -= block.exits[i] # Runs that stopped before instruction i
+            self.instructions[instr] += runs
+
+    def instruction_counts(self):
+        counts = {instr: count for instr, count in enumerate(self.instructions) if count}
+        blocks = self.blocks()
+        if blocks:
+            pending = Counters(self.cpu)
+            for block in blocks:
+                pending.fold_block(block)
+            for instr, count in enumerate(pending.instructions):
+                if count:
+                    counts[instr] = counts.get(instr, 0) + count
+        return counts
+
+    # Idle loops are fast-forwarded, checkpoint() and repeat() count the skipped iterations
+    def checkpoint(self):
+        return list(self.taken), [(device.reads, device.writes) for device in self.cpu.bus.devices]
+
+    def repeat(self, checkpoint, instrs, times):
+        taken, traffic = checkpoint
+        for instr in instrs:
+            self.instructions[instr] += times
+        for i, count in enumerate(taken):
+            self.taken[i] += (self.taken[i] - count) * times
+        for device, (reads, writes) in zip(self.cpu.bus.devices, traffic):
+            device.reads += (device.reads - reads) * times
+            device.writes += (device.writes - writes) * times
+
+    def snapshot(self):
+        mnemonics = {}
+        classes = {"general": 0, "alu": 0, "jump": 0, "memory": 0, "stack": 0}
+        modes = dict.fromkeys(ADDRESSING_MODES, 0)
+        stack = {"push": 0, "pop": 0}
+        executed = dict.fromkeys(JUMP_TYPES, 0)
+        bus_reads = bus_writes = 0
+        for instr, count in self.instruction_counts().items():
+            mnemonic = MNEMONICS.get(instr >> 10, "UNDEFINED")
+            mnemonics[mnemonic] = mnemonics.get(mnemonic, 0) + count
+            classes[opcode_class(instr, mnemonic)] += count
+            mode = instr & 0b111
+            if mnemonic not in WITHOUT_OPERAND and mnemonic != "UNDEFINED" and mode < len(ADDRESSING_MODES):
+                modes[ADDRESSING_MODES[mode]] += count
+            if mnemonic in STACK_OPERATIONS:
+                stack[STACK_OPERATIONS[mnemonic]] += count
+            if mnemonic in executed:
+                executed[mnemonic] += count
+            reads, writes = bus_bytes(instr, mnemonic)
+            bus_reads += reads * count
+            bus_writes += writes * count
+
+        bus = {}
+        for device in self.cpu.bus.devices:
+            bus[device.name] = {"reads": device.reads, "writes": device.writes}
+            bus_reads -= device.reads
+            bus_writes -= device.writes
+        memory = bus[self.cpu.bus.memory.name] # RAM accesses bypass the counting slow path
+        memory["reads"] += bus_reads + self.ram_reads
+        memory["writes"] += bus_writes + self.ram_writes
+
+        branches = {}
+        for jump_type, taken in zip(JUMP_TYPES, self.taken):
+            branches[jump_type] = {"taken": taken, "not_taken": executed[jump_type] - taken}
+        return {
+            "clock_cycles": self.cpu.clock_cycle,
+            "instructions": sum(mnemonics.values()),
+            "opcode_classes": classes,
+            "mnemonics": dict(sorted(mnemonics.items())),
+            "branches": branches,
+            "stack": stack,
+            "addressing_modes": modes,
+            "bus_bytes": bus,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        metrics = [
+            ("clock_cycles_total", "Clock cycles (instruction and operand fetches)", [({}, snapshot["clock_cycles"])]),
+            ("instructions_total", "Instructions retired", [({"mnemonic": name}, count) for name, count in snapshot["mnemonics"].items()]),
+            ("instructions_by_class_total", "Instructions retired per opcode class", [({"class": name}, count) for name, count in snapshot["opcode_classes"].items()]),
+            ("branches_total", "Executed jumps", [({"type": name, "outcome": outcome}, count)
+                for name, outcomes in snapshot["branches"].items() for outcome, count in outcomes.items()]),
+            ("stack_operations_total", "Stack pushes and pops", [({"operation": name}, count) for name, count in snapshot["stack"].items()]),
+            ("addressing_modes_total", "Instructions per addressing mode", [({"mode": name}, count) for name, count in snapshot["addressing_modes"].items()]),
+            ("bus_bytes_total", "Bytes transferred per device", [({"device": name, "direction": direction}, count)
+                for name, traffic in snapshot["bus_bytes"].items() for direction, count in traffic.items()]),
+        ]
+        lines = []
+        for name, help_text, samples in metrics:
+            lines += [f"# HELP yr_{name} {help_text}", f"# TYPE yr_{name} counter"]
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"yr_{name}{{{label_text}}} {value}" if label_text else f"yr_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename, counter_format="json"):
+        with open(filename, "w") as counter_file:
+            counter_file.write(self.to_prometheus() if counter_format == "prometheus" else self.to_json())
+
+def opcode_class(instr, mnemonic):
+    instr_type = instr >> 14
+    if instr_type == 0b01:
+        return "alu"
+    elif instr_type == 0b10:
+        return "stack" if mnemonic in STACK_OPERATIONS and mnemonic != "CALL" else "jump" if mnemonic in JUMP_TYPES else "memory"
+    return "general"
+
+def bus_bytes(instr, mnemonic): # Bytes read and written by the bus while executing instr
+    reads = 2 + operand_length(instr) + DATA_READS.get(mnemonic, 0)
+    if mnemonic in OPERAND_READERS and (instr & 0b111) in (0x4, 0x5, 0x6):
+        reads += 2
+    return reads, DATA_WRITES.get(mnemonic, 0)
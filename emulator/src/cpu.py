@@ -1,34 +1,96 @@
 from .bus import Bus
 from .devices.memory import MemoryDevice
-from .devices.console import ConsoleDevice
+from .devices.console import ConsoleDevice, ConsoleFrameRegisters
 from .devices.keyboard import KeyboardDevice
-from time import sleep
+from .devices.interrupts import InterruptController, IRQ_KEYBOARD, IRQ_TIMER
+from .devices.dma import DMAController
+from .devices.timer import TimerDevice
+from .status import StatusFlags, FLAG_Z, FLAG_N, FLAG_C, FLAG_I
+from array import array
+from collections import deque
+from threading import Event
 from .ui.input import InputThread
+from .engines.predecoded import PredecodedEngine
+from .engines.translator import BlockTranslator
+from .engines.fused import FusedEngine
+from .scheduler import Scheduler
+from .idle import IdleDetector
+from . import snapshot
+from .counters import Counters
+from .debugger import Debugger
+from .shared_state import PUBLISH_RATE
+
+ENGINES = ["interpreter", "predecoded", "fused", "translated"]
+RAM_SIZE = 0xF000 # 0x0000 - 0xEFFF
 
 class CPU:
-    def __init__(self, term=None):
+    def __init__(self, term=None, engine="interpreter", shared=None):
         self.term = term
+        self.shared = shared # Optional SharedState with the registers and RAM, for a UI in another process
         self.clock_cycle = 0
+        self.scheduler = Scheduler()
+        self.host_event = Event() # Set by the host (input thread, pause/stop) to wake up an idle or paused CPU
+        self.host_calls = deque() # Callbacks from other threads, see call_soon
+        self.irq_requested = False # An unmasked interrupt line might be pending, checked between instructions
+        self.waiting = False # Executed WAIT, no instructions run until an interrupt line is pending
         self.stop = False
-        self.reg = [0] * 9 # R0 - R6, SP, PC (16-bit)
+        self.reg = shared.reg if shared else array('H', [0] * 9) # R0 - R6, SP, PC (16-bit)
         self.sp = 0xEFFF # Stack grows downwards
         self.pc = 0
-        self.flags = {
-            "Z": 0, # Zero
-            "N": 0, # Negative
-            "C": 0, # Carry
-            "V": 0  # Overflow
-        }
-        self.init_devices(device_tick_rate=60)
+        self.status = 0 # Packed status flags (see status.py)
+        self.flags = StatusFlags(self) # Compatibility view, e.g. cpu.flags["Z"]
+        self.init_devices()
         self.init_input_thread()
+        self.counters = Counters(self)
+        self.init_engine(engine)
+        self.idle = IdleDetector(self)
+        self.debugger = Debugger(self) # Inactive until a breakpoint or watchpoint is set
+
+    def init_engine(self, engine):
+        self.engine = engine
+        self.translator = None
+        self.fused = None
+        self.run_chunk = self.run_instructions
+        if engine == "interpreter":
+            self.execute = self.decode_execute
+        elif engine == "predecoded":
+            self.execute = PredecodedEngine(self).execute
+        elif engine == "fused":
+            predecoded = PredecodedEngine(self)
+            self.execute = predecoded.execute # Used by the debugger and tracer loops
+            self.fused = FusedEngine(self, predecoded)
+            self.run_chunk = self.fused.run_chunk
+        elif engine == "translated":
+            self.execute = PredecodedEngine(self).execute # Used for instructions that can't run as a whole block
+            self.translator = BlockTranslator(self)
+            self.run_chunk = self.translator.run_chunk
+        else:
+            raise ValueError(f"Unknown execution engine: {engine}")
 
-    def init_devices(self, device_tick_rate):
-        self.device_tick_rate = device_tick_rate
+    def init_devices(self):
         self.bus = Bus()
-        self.bus.attach_device(MemoryDevice("memory", 0x0000, 0xEFFF))
-        if self.term:
-            self.bus.attach_device(ConsoleDevice("console", 0xF000, 0xF003))
-            self.bus.attach_device(KeyboardDevice("keyboard", 0xF004, 0xF005))
+        self.attach_device(MemoryDevice("memory", 0x0000, 0xEFFF))
+        if self.shared:
+            self.bus.memory.use_buffer(self.shared.ram)
+        # Both are plain registers and always mapped, headless runs feed the keyboard from a script (see headless.py)
+        self.attach_device(ConsoleDevice("console", 0xF000, 0xF003))
+        self.bus.console.defer = self.call_soon
+        self.attach_device(KeyboardDevice("keyboard", 0xF004, 0xF005))
+        self.attach_device(InterruptController("interrupts", 0xF006, 0xF009))
+        self.bus.interrupts.notify = self.request_interrupt
+        self.bus.keyboard.irq = lambda: self.bus.interrupts.raise_irq(IRQ_KEYBOARD)
+        self.attach_device(DMAController("dma", 0xF00A, 0xF012, self.bus.memory))
+        self.bus.dma.stall = self.stall
+        self.bus.dma.traffic = lambda reads, writes: self.counters.ram_traffic(reads, writes)
+        self.attach_device(TimerDevice("timer", 0xF013, 0xF01A, self.scheduler, lambda: self.clock_cycle))
+        self.bus.timer.defer = self.call_soon
+        self.bus.timer.irq = lambda: self.bus.interrupts.raise_irq(IRQ_TIMER)
+        self.attach_device(ConsoleFrameRegisters("console_frame", 0xF01B, 0xF01D, self.bus.console))
+
+    def attach_device(self, device):
+        self.bus.attach_device(device)
+        if device.tick_rate: # Devices opt in to ticking by setting a tick rate
+            self.scheduler.every(device.tick_rate, device.tick, self.clock_cycle)
 
     def init_input_thread(self):
         self.paused = False
@@ -37,29 +99,193 @@ class CPU:
             self.input_thread = InputThread(self)
             self.input_thread.start()
 
-    def run(self, steps=-1, max_cycles=-1, dump_state=False, ui=None):
-        while steps != 0:
-            if max_cycles >= 0 and self.clock_cycle >= max_cycles:
-                raise RuntimeError("Max cycles exceeded!")
-            instr = self.fetch_word()
-            self.decode_execute(instr)
-
-            if self.stop:
-                break
-            if self.paused:
-                if self.step_once:
+    def save_state(self):
+        return snapshot.save_state(self)
+
+    def restore_state(self, data):
+        snapshot.restore_state(self, data)
+
+    def wake(self):
+        self.host_event.set()
+
+    # Setting stop or paused (from an instruction or the input thread) ends the running chunk
+    @property
+    def stop(self):
+        return self._stop
+
+    @stop.setter
+    def stop(self, value):
+        self._stop = value
+        if value:
+            self.scheduler.interrupt()
+        self.wake()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @paused.setter
+    def paused(self, value):
+        self._paused = value
+        if value:
+            self.scheduler.interrupt()
+        self.wake()
+
+    def run(self, steps=-1, max_cycles=-1, dump_state=False, return_paused=False):
+        scheduler = self.scheduler
+        publish = scheduler.every(PUBLISH_RATE, self.publish_state, self.clock_cycle, background=True) if self.shared else None
+        try:
+            while steps != 0:
+                if max_cycles >= 0 and self.clock_cycle >= max_cycles:
+                    raise RuntimeError("Max cycles exceeded!")
+                # Run until the next event, a max cycles error or until stop/paused interrupt the chunk
+                scheduler.deadline = scheduler.next_cycle
+                if max_cycles >= 0:
+                    scheduler.deadline = min(scheduler.deadline, max_cycles)
+                if self.host_calls: # After setting the deadline, so an interrupt from call_soon can't get lost
+                    self.run_host_calls()
+                    scheduler.deadline = min(scheduler.deadline, scheduler.next_cycle) # They might have scheduled events
+                if self.irq_requested and not self.paused:
+                    self.waiting = False
+                    self.take_interrupt()
+                if self.paused:
+                    if self.stop or return_paused: # Drivers like the debug server step a paused CPU themselves
+                        break
+                    self.host_event.clear()
+                    if not self.step_once:
+                        if self.paused: # Checked again after clearing, the setter might have run in between
+                            self.publish_state()
+                            self.host_event.wait()
+                        continue
                     self.step_once = False
+                    executed = self.run_chunk(1)
+                    self.publish_state()
+                elif self.waiting:
+                    self.wait_for_interrupt(max_cycles)
+                    executed = 0
+                elif self.idle.due:
+                    executed = self.idle.run(steps, max_cycles)
                 else:
-                    sleep(0.01)
-                    continue
-            if (self.clock_cycle % self.device_tick_rate) == 0:
-                for device in self.bus.devices:
-                    device.tick()
-            if ui and self.clock_cycle % ui.refresh_rate == 0:
-                ui.refresh()
-            if steps > 0:
-                steps -= 1
-            # sleep(0.001)
+                    executed = self.run_chunk(steps)
+
+                if self.stop:
+                    break
+                scheduler.run_due(self.clock_cycle)
+                if steps > 0:
+                    steps -= executed
+        finally:
+            if publish:
+                scheduler.cancel(publish)
+                self.publish_state()
+
+    def call_soon(self, callback): # From any thread, callback runs on the CPU thread between two instructions
+        self.host_calls.append(callback)
+        self.scheduler.interrupt()
+        self.wake()
+
+    def run_host_calls(self):
+        while self.host_calls:
+            self.host_calls.popleft()()
+
+    # Interrupts (see devices/interrupts.py)
+    def request_interrupt(self): # From any thread
+        self.irq_requested = True
+        self.scheduler.interrupt()
+        self.wake()
+
+    def take_interrupt(self):
+        self.irq_requested = False
+        if not self.status & FLAG_I:
+            return # EI checks again
+        line = self.bus.interrupts.acknowledge()
+        if line is None:
+            return
+        self.push_word(self.reg[8])
+        self.push_word(self.status)
+        self.status &= ~FLAG_I
+        self.reg[8] = self.bus.read_word(self.bus.interrupts.vector(line))
+        self.counters.ram_traffic(2, 4) # Not part of an instruction, the counters can't derive it
+
+    def wait(self): # WAIT, does nothing while all lines are masked, as nothing could end it
+        interrupts = self.bus.interrupts
+        if interrupts.mask and not interrupts.pending & interrupts.mask:
+            self.waiting = True
+            self.scheduler.interrupt()
+
+    def wait_for_interrupt(self, max_cycles=-1):
+        # Only events can raise a line, so the clock skips straight to the next one. With nothing scheduled
+        # only the host (key presses, pause, stop) can end the wait, so it blocks like the idle detector does.
+        self.host_event.clear() # Flags set before this are checked here, later ones end the wait below
+        if self.irq_requested or self.host_calls or self.paused or self.stop:
+            return
+        wakeup = self.next_wakeup(max_cycles)
+        if wakeup == float("inf"):
+            self.publish_state()
+            self.host_event.wait()
+        elif wakeup > self.clock_cycle:
+            self.clock_cycle = wakeup
+
+    def next_wakeup(self, max_cycles=-1): # Where the clock of a waiting guest can skip to
+        wakeup = self.scheduler.next_wakeup
+        return min(wakeup, max_cycles) if max_cycles >= 0 else wakeup
+
+    def enable_interrupts(self): # EI
+        self.status |= FLAG_I
+        self.bus.interrupts.check()
+
+    def disable_interrupts(self): # DI
+        self.status &= ~FLAG_I
+
+    def return_from_interrupt(self): # RETI
+        self.status = self.pop_word()
+        self.reg[8] = self.pop_word()
+        self.bus.interrupts.check()
+
+    def stall(self, cycles): # The CPU waits for a device, e.g. a DMA transfer
+        self.clock_cycle += cycles
+
+    def publish_state(self):
+        if self.shared:
+            self.shared.publish(self)
+
+    # Executes instructions until the scheduler deadline, returns the number of executed instructions
+    def run_instructions(self, steps=-1):
+        if not self.counters.enabled:
+            return self.run_uncounted(steps)
+        execute = self.execute
+        fetch_word = self.fetch_word
+        scheduler = self.scheduler
+        counts = self.counters.instructions
+        if steps < 0:
+            executed = 0
+            while self.clock_cycle < scheduler.deadline:
+                instr = fetch_word()
+                execute(instr)
+                counts[instr] += 1
+                executed += 1
+            return executed
+        executed = 0
+        while executed < steps and self.clock_cycle < scheduler.deadline:
+            instr = fetch_word()
+            execute(instr)
+            counts[instr] += 1
+            executed += 1
+        return executed
+
+    def run_uncounted(self, steps=-1): # Same loops without the per instruction count, see Counters.enabled
+        execute = self.execute
+        fetch_word = self.fetch_word
+        scheduler = self.scheduler
+        executed = 0
+        if steps < 0:
+            while self.clock_cycle < scheduler.deadline:
+                execute(fetch_word())
+                executed += 1
+            return executed
+        while executed < steps and self.clock_cycle < scheduler.deadline:
+            execute(fetch_word())
+            executed += 1
+        return executed
 
     def decode_execute(self, instr):
         instr_type = (instr >> 14) & 0b11
@@ -78,7 +304,15 @@ class CPU:
                 self.update_program_counter(return_addr)
             elif opcode == 0b0011: # MOV
                 b = self.apply_addressing_mode(addressing_mode, operand)
-                self.write_register(reg, b)
+                self.set_register(reg, b)
+            elif opcode == 0b0100: # EI
+                self.enable_interrupts()
+            elif opcode == 0b0101: # DI
+                self.disable_interrupts()
+            elif opcode == 0b0110: # RETI
+                self.return_from_interrupt()
+            elif opcode == 0b0111: # WAIT
+                self.wait()
         elif instr_type == 0b01: # ALU operations
             self.exec_alu(opcode, reg, operand, addressing_mode)
         elif instr_type == 0b10 and (opcode & 0b1000) == 0: # Jump operations
@@ -89,107 +323,111 @@ class CPU:
             self.exec_mem_stack(opcode, reg, operand, addressing_mode)
 
     def exec_alu(self, opcode, rA, b, addressing_mode):
-        a = self.read_register(rA)
+        a = self.reg[rA]
         b = self.apply_addressing_mode(addressing_mode, b)
 
         if opcode == 0x0: # ADD
             res = a + b
-            self.flags["C"] = int(res > 0xFFFF)
-            self.write_register(rA, res)
+            self.set_carry(res > 0xFFFF)
+            self.set_register(rA, res)
         elif opcode == 0x1: # SUB
             res = a - b
-            self.flags["C"] = int(a < b)
-            self.write_register(rA, res)
+            self.set_carry(a < b)
+            self.set_register(rA, res)
         elif opcode == 0x2: # MUL
             res = a * b
-            self.flags["C"] = int(res > 0xFFFF)
-            self.write_register(rA, res)
+            self.set_carry(res > 0xFFFF)
+            self.set_register(rA, res)
         elif opcode == 0x3: # MULH
             res = (a * b) >> 16
-            self.write_register(rA, res)
+            self.set_register(rA, res)
         elif opcode == 0x4: # AND
             res = a & b
-            self.write_register(rA, res)
+            self.set_register(rA, res)
         elif opcode == 0x5: # OR
             res = a | b
-            self.write_register(rA, res)
+            self.set_register(rA, res)
         elif opcode == 0x6: # XOR
             res = a ^ b
-            self.write_register(rA, res)
+            self.set_register(rA, res)
         elif opcode == 0x7: # SHL
             shift = b & 0xF # Limit shifts to 0-15
             res = a << shift
-            self.flags["C"] = (a >> (16 - shift)) & 1
-            self.write_register(rA, res)
+            self.set_carry((a >> (16 - shift)) & 1)
+            self.set_register(rA, res)
         elif opcode == 0x8: # ROL
             shift = b & 0xF # Limit shifts to 0-15
             res = (a << shift) | (a >> (16 - shift))
-            self.flags["C"] = res & 1
-            self.write_register(rA, res)
+            self.set_carry(res & 1)
+            self.set_register(rA, res)
         elif opcode == 0x9: # SHR
             shift = b & 0xF # Limit shifts to 0-15
             res = a >> shift
-            self.flags["C"] = (a >> (shift - 1)) & 1
-            self.write_register(rA, res)
+            self.set_carry((a >> (shift - 1)) & 1)
+            self.set_register(rA, res)
         elif opcode == 0xA: # ASR
             shift = b & 0xF # Limit shifts to 0-15
             sign = (a >> 15) & 1
             res = (a >> shift) | ((0xFFFF << (16 - shift)) if sign else 0)
-            self.flags["C"] = (a >> (shift - 1)) & 1
-            self.write_register(rA, res)
+            self.set_carry((a >> (shift - 1)) & 1)
+            self.set_register(rA, res)
         elif opcode == 0xB: # ROR
             shift = b & 0xF # Limit shifts to 0-15
             res = (a >> shift) | (a << (16 - shift))
-            self.flags["C"] = (res >> 15) & 1
-            self.write_register(rA, res)
+            self.set_carry((res >> 15) & 1)
+            self.set_register(rA, res)
         elif opcode == 0xC: # CMP
             res = a - b
             self.update_status_flags(res)
         elif opcode == 0xD: # NOT
             res = ~a
-            self.write_register(rA, res)
+            self.set_register(rA, res)
         elif opcode == 0xE: # NEG
             res = -a
-            self.write_register(rA, res)
+            self.set_register(rA, res)
 
     def exec_jump(self, opcode, operand, addressing_mode):
         addr = self.apply_addressing_mode(addressing_mode, operand, fetch_addr=True)
 
         if opcode == 0x0: # JMP
+            taken = True
+        elif opcode == 0x1: # JZ/JEQ
+            taken = self.status & FLAG_Z
+        elif opcode == 0x2: # JNZ/JNE
+            taken = not self.status & FLAG_Z
+        elif opcode == 0x3: # JLT
+            taken = self.status & FLAG_N
+        elif opcode == 0x4: # JGT
+            taken = not self.status & (FLAG_N | FLAG_Z)
+        elif opcode == 0x5: # JC
+            taken = self.status & FLAG_C
+        elif opcode == 0x6: # JNC
+            taken = not self.status & FLAG_C
+        else: # CALL
+            self.push_word(self.reg[8])
+            taken = True
+
+        if taken:
             self.update_program_counter(addr)
-        elif opcode == 0x1 and self.flags["Z"]: # JZ/JEQ
-            self.update_program_counter(addr)
-        elif opcode == 0x2 and not self.flags["Z"]: # JNZ/JNE
-            self.update_program_counter(addr)
-        elif opcode == 0x3 and self.flags["N"]: # JLT
-            self.update_program_counter(addr)
-        elif opcode == 0x4 and not self.flags["N"] and not self.flags["Z"]: # JGT
-            self.update_program_counter(addr)
-        elif opcode == 0x5 and self.flags["C"]: # JC
-            self.update_program_counter(addr)
-        elif opcode == 0x6 and not self.flags["C"]: # JNC
-            self.update_program_counter(addr)
-        elif opcode == 0x7: # CALL
-            self.push_word(self.pc)
-            self.update_program_counter(addr)
+            self.counters.taken[opcode] += 1
 
     def exec_mem_stack(self, opcode, rA, operand, addressing_mode):
         if opcode == 0x0: # LOADB
             addr = self.apply_addressing_mode(addressing_mode, operand, fetch_addr=True)
-            self.write_register(rA, self.bus.read_byte(addr))
+            self.set_register(rA, self.bus.read_byte(addr))
         elif opcode == 0x1: # LOAD
             addr = self.apply_addressing_mode(addressing_mode, operand, fetch_addr=True)
-            self.write_register(rA, self.bus.read_word(addr))
+            self.set_register(rA, self.bus.read_word(addr))
         elif opcode == 0x2: # STOREB
             addr = self.apply_addressing_mode(addressing_mode, operand, fetch_addr=True)
-            self.bus.write_byte(addr, self.read_register(rA))
+            self.bus.write_byte(addr, self.reg[rA])
         elif opcode == 0x3: # STORE
             addr = self.apply_addressing_mode(addressing_mode, operand, fetch_addr=True)
-            self.bus.write_word(addr, self.read_register(rA))
+            self.bus.write_word(addr, self.reg[rA])
         elif opcode == 0x4: # POPB
-            self.write_register(rA, self.pop_byte())
+            self.set_register(rA, self.pop_byte())
         elif opcode == 0x5: # POP
-            self.write_register(rA, self.pop_word())
+            self.set_register(rA, self.pop_word())
         elif opcode == 0x6: # PUSHB
             value = self.apply_addressing_mode(addressing_mode, operand)
             self.push_byte(value)
@@ -229,48 +467,55 @@ class CPU:
     def write_register(self, rN, value):
         if (rN > 0b111):
             raise ValueError(f"Can't write to register: {rN}")
+        self.set_register(rN, value)
+
+    def set_register(self, rN, value): # Unchecked version of write_register for decoded register fields
         value &= 0xFFFF
-        self.update_status_flags(value)
+        self.status = (self.status & ~(FLAG_Z | FLAG_N)) | (FLAG_Z if value == 0 else 0) | ((value >> 14) & FLAG_N)
         self.reg[rN] = value
 
     def update_status_flags(self, value):
         value &= 0xFFFF
-        self.flags["Z"] = int(value == 0)
-        self.flags["N"] = int(value >= 0x8000)
+        self.status = (self.status & ~(FLAG_Z | FLAG_N)) | (FLAG_Z if value == 0 else 0) | ((value >> 14) & FLAG_N)
+
+    def set_carry(self, carry):
+        self.status = (self.status & ~FLAG_C) | (FLAG_C if carry else 0)
 
     def update_program_counter(self, addr):
-        self.pc = addr & 0xFFFF
+        self.reg[8] = addr & 0xFFFF
 
     def fetch_byte(self):
-        value = self.bus.read_byte(self.pc)
-        self.update_program_counter(self.pc + 1)
+        reg = self.reg
+        value = self.bus.read_byte(reg[8])
+        reg[8] = (reg[8] + 1) & 0xFFFF
         self.clock_cycle += 1
         return value
 
     def fetch_word(self):
-        value = self.bus.read_word(self.pc)
-        self.update_program_counter(self.pc + 2)
+        reg = self.reg
+        value = self.bus.read_word(reg[8])
+        reg[8] = (reg[8] + 2) & 0xFFFF
         self.clock_cycle += 1
         return value
 
     def update_stack_addr(self, offset):
-        return (self.sp + offset) | 0xE000
+        return ((self.reg[7] + offset) | 0xE000) & 0xFFFF
 
     def pop_byte(self):
-        self.sp = self.update_stack_addr(offset=1)
-        return self.bus.read_byte(self.sp)
+        sp = self.reg[7] = self.update_stack_addr(offset=1)
+        return self.bus.read_byte(sp)
 
     def pop_word(self):
-        self.sp = self.update_stack_addr(offset=2)
-        return self.bus.read_word(self.sp-1)
+        sp = self.reg[7] = self.update_stack_addr(offset=2)
+        return self.bus.read_word(sp-1)
 
     def push_byte(self, byte):
-        self.bus.write_byte(self.sp, byte)
-        self.sp = self.update_stack_addr(offset=-1)
+        self.bus.write_byte(self.reg[7], byte)
+        self.reg[7] = self.update_stack_addr(offset=-1)
 
     def push_word(self, word):
-        self.bus.write_word(self.sp-1, word)
-        self.sp = self.update_stack_addr(offset=-2)
+        self.bus.write_word(self.reg[7]-1, word)
+        self.reg[7] = self.update_stack_addr(offset=-2)
 
     @property
     def sp(self):
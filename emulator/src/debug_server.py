@@ -0,0 +1,288 @@
+# Debug server. Exposes a CPU over a local TCP or Unix socket with asyncio, so tools can drive the emulator
+# instead of the F3 - F6 keys. The protocol is line based JSON. Every request gets one response with the
+# same "id", and a "stopped" event is sent to all clients whenever the CPU stops running:
+#   {"id": 1, "cmd": "break", "addr": 256, "condition": "r0 == 5"} -> {"id": 1, "ok": true, "point": 0}
+#   {"id": 2, "cmd": "continue"} -> {"id": 2, "ok": true} ... {"event": "stopped", "reason": "breakpoint", ...}
+# While running, the CPU executes CPU.run at full speed in a worker thread and the event loop thread only
+# services the sockets. Commands that change the machine need it paused. Memory moves as hex strings of
+# whole RAM ranges, one message per batch of ranges.
+
+from argparse import ArgumentParser
+import asyncio
+import json
+import socket
+import threading
+from .cpu import CPU, ENGINES, get_reg_name
+from .debugger import Breakpoint
+
+REGISTERS = {get_reg_name(rN).lower(): rN for rN in range(9)}
+
+class DebugError(Exception):
+    pass
+
+def parse_address(address): # "tcp:HOST:PORT", "HOST:PORT" or "unix:PATH"
+    if address.startswith("unix:"):
+        return "unix", address[5:]
+    host, _, port = address.removeprefix("tcp:").rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+class DebugServer():
+    def __init__(self, cpu, address="tcp:127.0.0.1:0"):
+        self.cpu = cpu
+        self.kind, self.address = parse_address(address)
+        self.points = {} # Id -> breakpoint or watchpoint
+        self.next_point = 0
+        self.clients = set()
+        self.running = None # Task that waits for the worker thread while the CPU runs
+        self.server = None
+        self.done = None
+        cpu.paused = True # Nothing runs until a client says so
+        cpu.debugger.action = "pause"
+
+    async def serve(self):
+        self.done = asyncio.Event()
+        if self.kind == "unix":
+            self.server = await asyncio.start_unix_server(self.handle_client, self.address)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, *self.address)
+            self.address = self.server.sockets[0].getsockname()[:2] # Resolves port 0
+        async with self.server:
+            await self.done.wait()
+        if self.running:
+            await self.running
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    def start(self): # Serves from a background thread, returns once the server is listening
+        listening = threading.Event()
+        async def serve():
+            task = asyncio.create_task(self.serve())
+            while self.server is None or not self.server.is_serving():
+                await asyncio.sleep(0.001)
+            listening.set()
+            await task
+        self.thread = threading.Thread(target=lambda: asyncio.run(serve()), daemon=True)
+        self.thread.start()
+        listening.wait()
+        return self.address
+
+    async def handle_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while line := await reader.readline():
+                request = None
+                try:
+                    request = json.loads(line)
+                    response = await self.dispatch(request)
+                    response["ok"] = True
+                except (DebugError, ValueError, KeyError, TypeError) as e:
+                    request = request if isinstance(request, dict) else {}
+                    response = {"ok": False, "error": str(e)}
+                if "id" in request:
+                    response["id"] = request["id"]
+                self.send(writer, response)
+                await writer.drain()
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def send(self, writer, message):
+        writer.write(json.dumps(message).encode() + b"\n")
+
+    async def dispatch(self, request):
+        if not isinstance(request, dict):
+            raise DebugError("Requests must be JSON objects")
+        cmd = request.get("cmd")
+        handler = getattr(self, f"cmd_{cmd}", None)
+        if handler is None:
+            raise DebugError(f"Unknown command: {cmd}")
+        if self.running and cmd not in ("status", "pause", "read_memory", "points", "quit"):
+            raise DebugError("CPU is running, pause it first")
+        return await handler(request) or {}
+
+    # Running
+
+    def start_run(self, run):
+        cpu = self.cpu
+        if cpu.stop:
+            raise DebugError("CPU has halted")
+        hits = len(cpu.debugger.hits)
+        cpu.paused = False
+        work = asyncio.get_running_loop().run_in_executor(None, self.run_cpu, run)
+        async def finished():
+            error = await work
+            cpu.paused = True
+            self.running = None
+            event = {"event": "stopped", "reason": self.stop_reason(hits, error)}
+            if error:
+                event["error"] = error
+            event.update(self.state())
+            for writer in list(self.clients):
+                self.send(writer, event)
+        self.running = asyncio.ensure_future(finished())
+        return self.running
+
+    def run_cpu(self, run):
+        try:
+            run()
+        except Exception as e: # Ends the run like a halt, the client gets the message
+            return str(e)
+        return None
+
+    def stop_reason(self, hits, error):
+        cpu = self.cpu
+        if error:
+            return "max_cycles" if error == "Max cycles exceeded!" else "error"
+        if len(cpu.debugger.hits) > hits:
+            _, _, point, _ = cpu.debugger.hits[-1]
+            return "breakpoint" if isinstance(point, Breakpoint) else "watchpoint"
+        if cpu.stop:
+            return "halted"
+        return "paused" if cpu.paused else "steps"
+
+    def state(self):
+        cpu = self.cpu
+        return {
+            "running": self.running is not None,
+            "halted": cpu.stop,
+            "clock_cycle": cpu.clock_cycle,
+            "registers": {name: cpu.reg[rN] for name, rN in REGISTERS.items()},
+            "flags": dict(cpu.flags),
+        }
+
+    async def cmd_status(self, request):
+        return self.state()
+
+    async def cmd_continue(self, request):
+        cycles = request.get("cycles")
+        max_cycles = self.cpu.clock_cycle + cycles if cycles else -1
+        self.start_run(lambda: self.cpu.run(max_cycles=max_cycles, return_paused=True))
+
+    async def cmd_step(self, request):
+        count = request.get("count", 1)
+        if count < 1:
+            raise DebugError(f"Invalid step count: {count}")
+        await self.start_run(lambda: self.cpu.run(steps=count, return_paused=True))
+        return self.state()
+
+    async def cmd_pause(self, request):
+        self.cpu.paused = True
+        if self.running:
+            await asyncio.shield(self.running)
+        return self.state()
+
+    async def cmd_quit(self, request):
+        await self.cmd_pause(request)
+        self.done.set()
+
+    # Registers and memory
+
+    async def cmd_set_registers(self, request):
+        for name, value in request["values"].items():
+            if name.lower() not in REGISTERS:
+                raise DebugError(f"Unknown register: {name}")
+            self.cpu.reg[REGISTERS[name.lower()]] = value & 0xFFFF
+        return self.state()
+
+    def memory_range(self, addr, length):
+        memory = self.cpu.bus.memory
+        if length < 0 or addr < memory.min_address or addr + length - 1 > memory.max_address:
+            raise DebugError(f"Range {addr:04X}+{length} is outside of RAM")
+        return addr - memory.min_address
+
+    async def cmd_read_memory(self, request): # "ranges": [[addr, length], ...]
+        data = self.cpu.bus.memory.data
+        chunks = []
+        for addr, length in request["ranges"]:
+            index = self.memory_range(addr, length)
+            chunks.append(data[index : index + length].hex())
+        return {"data": chunks}
+
+    async def cmd_write_memory(self, request): # "writes": [[addr, hex], ...]
+        writes = [(addr, bytes.fromhex(data)) for addr, data in request["writes"]]
+        for addr, data in writes: # Validated before anything is written
+            self.memory_range(addr, len(data))
+        for addr, data in writes:
+            self.cpu.bus.memory.write_bytes(addr, data) # Invalidates translated blocks
+        return {}
+
+    # Breakpoints and watchpoints
+
+    def add_point(self, point):
+        self.points[self.next_point] = point
+        self.next_point += 1
+        return {"point": self.next_point - 1}
+
+    async def cmd_break(self, request):
+        return self.add_point(self.cpu.debugger.add_breakpoint(request["addr"], request.get("condition")))
+
+    async def cmd_watch(self, request):
+        return self.add_point(self.cpu.debugger.add_watchpoint(request["start"], request.get("end"), request.get("access", "rw")))
+
+    async def cmd_delete(self, request):
+        point = self.points.pop(request["point"], None)
+        if point is None:
+            raise DebugError(f"Unknown point: {request['point']}")
+        if isinstance(point, Breakpoint):
+            self.cpu.debugger.remove_breakpoint(point)
+        else:
+            self.cpu.debugger.remove_watchpoint(point)
+
+    async def cmd_points(self, request):
+        return {"points": {point_id: {"description": str(point), "hits": point.hits} for point_id, point in self.points.items()}}
+
+class DebugClient():
+    # Blocking client for scripts and tests, events that arrive before a response are kept in events
+    def __init__(self, address):
+        kind, address = parse_address(address) if isinstance(address, str) else ("tcp", address)
+        self.socket = socket.socket(socket.AF_UNIX if kind == "unix" else socket.AF_INET)
+        self.socket.connect(address)
+        self.file = self.socket.makefile("rwb")
+        self.next_id = 0
+        self.events = []
+
+    def request(self, cmd, **args):
+        self.next_id += 1
+        self.file.write(json.dumps({"id": self.next_id, "cmd": cmd, **args}).encode() + b"\n")
+        self.file.flush()
+        while True:
+            message = self.receive()
+            if "event" in message:
+                self.events.append(message)
+            elif message.get("id") == self.next_id:
+                if not message["ok"]:
+                    raise DebugError(message["error"])
+                return message
+
+    def wait_event(self):
+        return self.events.pop(0) if self.events else self.receive()
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Debug server closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+def main():
+    parser = ArgumentParser(prog="YR-µ16 Debug Server")
+    parser.add_argument("filename", help="program binary to debug")
+    parser.add_argument("--listen", default="tcp:127.0.0.1:6016", help="address to listen on (tcp:HOST:PORT or unix:PATH)")
+    parser.add_argument("--engine", choices=ENGINES, default="interpreter", help="instruction execution engine")
+    args = parser.parse_args()
+
+    cpu = CPU(engine=args.engine)
+    cpu.bus.memory.load_file(args.filename)
+    server = DebugServer(cpu, args.listen)
+    print(f"Debugging '{args.filename}' on {args.listen}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# Breakpoints and watchpoints. While none are set nothing in here runs. Breakpoints replace CPU.run_chunk
+# with a loop that looks the PC up in a set before every instruction. Watchpoints put a WatchedPage overlay
+# on the bus pages they cover, so only accesses to those pages leave the RAM fast path, and also use the
+# debugger loop so instruction fetches are told apart from data accesses in every engine.
+# Breakpoints hit before the instruction executes, watchpoints after the accessing instruction. A hit
+# pauses the CPU like F4 does (or stops it, for headless runs), continuing resumes past the breakpoint.
+
+import operator
+import re
+from .engines.translator import operand_length
+
+REGISTERS = {"r0": 0, "r1": 1, "r2": 2, "r3": 3, "r4": 4, "r5": 5, "r6": 6, "sp": 7, "pc": 8}
+OPERATORS = {"==": operator.eq, "!=": operator.ne, "<=": operator.le, ">=": operator.ge, "<": operator.lt, ">": operator.gt}
+CONDITION = re.compile(r"^\s*(r[0-6]|sp|pc)\s*(==|!=|<=|>=|<|>)\s*(\w+)\s*$", re.IGNORECASE)
+
+def parse_condition(text): # "r0 == 0x10" -> function(reg) -> bool
+    match = CONDITION.match(text)
+    if not match:
+        raise ValueError(f"Invalid breakpoint condition: {text!r}")
+    rN = REGISTERS[match[1].lower()]
+    compare = OPERATORS[match[2]]
+    value = int(match[3], 0)
+    return lambda reg: compare(reg[rN], value)
+
+class Breakpoint():
+    def __init__(self, addr, condition=None):
+        self.addr = addr & 0xFFFF
+        self.condition = condition
+        self.test = parse_condition(condition) if condition else None
+        self.hits = 0
+
+    def __str__(self):
+        return f"breakpoint {self.addr:04X}" + (f" if {self.condition}" if self.condition else "")
+
+class Watchpoint():
+    def __init__(self, start, end=None, access="rw"):
+        if not access or set(access) - set("rw"):
+            raise ValueError(f"Invalid watchpoint access: {access!r}")
+        self.start = start & 0xFFFF
+        self.end = self.start if end is None else end & 0xFFFF # Inclusive
+        if self.end < self.start:
+            raise ValueError(f"Invalid watchpoint range: {start:04X}-{end:04X}")
+        self.access = access
+        self.hits = 0
+
+    def __str__(self):
+        return f"watchpoint {self.start:04X}-{self.end:04X} ({self.access})"
+
+    @property
+    def pages(self):
+        return range(self.start >> 8, (self.end >> 8) + 1)
+
+class WatchedPage():
+    # Stands in for all devices of a page in the bus page map, accesses are forwarded to the real device
+    io_type = "rw" # Checked against the real device below
+    reads = writes = 0 # Bus traffic is counted on the real device
+
+    def __init__(self, debugger, watchpoints):
+        self.debugger = debugger
+        self.bus = debugger.cpu.bus
+        self.watchpoints = watchpoints
+        self.name = "watched page"
+
+    def is_pollable(self, addr):
+        return self.bus.find_device(addr).is_pollable(addr) and not self.watched(addr, "r")
+
+    def watched(self, addr, access):
+        return any(watchpoint.start <= addr <= watchpoint.end and access in watchpoint.access for watchpoint in self.watchpoints)
+
+    def read_byte(self, addr):
+        device = self.bus.find_device(addr)
+        if device.io_type == "wo":
+            raise RuntimeError(f"Can't read from write-only device '{device.name} at address: {addr:04X}")
+        device.reads += 1
+        value = device.read_byte(addr)
+        if not self.debugger.fetch_start <= addr < self.debugger.fetch_end:
+            self.debugger.access(self.watchpoints, addr, "r")
+        return value
+
+    def write_byte(self, addr, value):
+        device = self.bus.find_device(addr)
+        if device.io_type == "ro":
+            raise RuntimeError(f"Can't write to read-only device '{device.name} at address: {addr:04X}")
+        device.writes += 1
+        device.write_byte(addr, value)
+        self.debugger.access(self.watchpoints, addr, "w")
+
+class Debugger():
+    def __init__(self, cpu, action="pause"):
+        self.cpu = cpu
+        self.action = action # "pause" like F4, or "stop"
+        self.breakpoints = {} # Address -> list of breakpoints
+        self.watchpoints = []
+        self.hits = [] # (clock_cycle, instruction address, breakpoint or watchpoint, accessed address) per hit
+        self.resume_cycle = None # Breakpoints don't hit again right after continuing from a hit at this cycle
+        self.fetch_start = self.fetch_end = 0 # Bytes of the executing instruction, reads there are fetches
+        self.installed = False
+
+    def add_breakpoint(self, addr, condition=None):
+        breakpoint = Breakpoint(addr, condition)
+        self.breakpoints.setdefault(breakpoint.addr, []).append(breakpoint)
+        self.update()
+        return breakpoint
+
+    def remove_breakpoint(self, breakpoint):
+        breakpoints = self.breakpoints.get(breakpoint.addr, [])
+        if breakpoint in breakpoints:
+            breakpoints.remove(breakpoint)
+            if not breakpoints:
+                del self.breakpoints[breakpoint.addr]
+        self.update()
+
+    def add_watchpoint(self, start, end=None, access="rw"):
+        watchpoint = Watchpoint(start, end, access)
+        self.watchpoints.append(watchpoint)
+        self.update_pages(watchpoint.pages)
+        self.update()
+        return watchpoint
+
+    def remove_watchpoint(self, watchpoint):
+        if watchpoint in self.watchpoints:
+            self.watchpoints.remove(watchpoint)
+            self.update_pages(watchpoint.pages)
+        self.update()
+
+    def clear(self):
+        for watchpoint in list(self.watchpoints):
+            self.remove_watchpoint(watchpoint)
+        self.breakpoints.clear()
+        self.update()
+
+    def update_pages(self, pages):
+        bus = self.cpu.bus
+        for page in pages:
+            watchpoints = [watchpoint for watchpoint in self.watchpoints if page in watchpoint.pages]
+            bus.set_overlay(page, WatchedPage(self, watchpoints) if watchpoints else None)
+
+    def update(self): # Routes CPU.run through the debugger loop only while something is set
+        cpu = self.cpu
+        active = bool(self.breakpoints or self.watchpoints)
+        if active and not self.installed:
+            self.run_chunk_unchecked = cpu.run_chunk
+            cpu.run_chunk = self.run_chunk
+            self.idle_enabled = cpu.idle.enabled
+            cpu.idle.enabled = False # Fast-forwarded idle loops would skip over hits
+            cpu.idle.due = False
+        elif not active and self.installed:
+            cpu.run_chunk = self.run_chunk_unchecked
+            cpu.idle.enabled = self.idle_enabled
+        self.installed = active
+
+    def run_chunk(self, steps=-1):
+        cpu = self.cpu
+        reg = cpu.reg
+        scheduler = cpu.scheduler
+        execute = cpu.execute
+        fetch_word = cpu.fetch_word
+        counts = cpu.counters.instructions
+        breakpoints = self.breakpoints
+        executed = 0
+        try:
+            while executed != steps and cpu.clock_cycle < scheduler.deadline:
+                pc = reg[8]
+                if pc in breakpoints and cpu.clock_cycle != self.resume_cycle and self.check_breakpoints(pc):
+                    break
+                self.fetch_start, self.fetch_end = pc, pc + 4 # Narrowed once the instruction word is known
+                instr = fetch_word()
+                self.fetch_end = pc + 2 + operand_length(instr)
+                execute(instr)
+                counts[instr] += 1
+                executed += 1
+        finally:
+            self.fetch_start = self.fetch_end = 0
+        return executed
+
+    def check_breakpoints(self, pc):
+        for breakpoint in self.breakpoints[pc]:
+            if breakpoint.test is None or breakpoint.test(self.cpu.reg):
+                self.resume_cycle = self.cpu.clock_cycle
+                self.hit(breakpoint, pc, pc)
+                return True
+        return False
+
+    def access(self, watchpoints, addr, access):
+        for watchpoint in watchpoints:
+            if watchpoint.start <= addr <= watchpoint.end and access in watchpoint.access:
+                self.hit(watchpoint, self.fetch_start, addr)
+                return
+
+    def hit(self, point, pc, addr):
+        cpu = self.cpu
+        if self.hits and self.hits[-1][:3] == (cpu.clock_cycle, pc, point):
+            return # Second byte of a word access
+        point.hits += 1
+        self.hits.append((cpu.clock_cycle, pc, point, addr))
+        if self.action == "stop":
+            cpu.stop = True
+        else:
+            cpu.paused = True
+
+def parse_breakpoint(text): # "0x0100" or "0x0100:r0 == 5"
+    addr, _, condition = text.partition(":")
+    return int(addr, 0), condition or None
+
+def parse_watchpoint(text): # "0xC000", "0xC000-0xC7FF" or with an access suffix, "0xF005:r"
+    addresses, _, access = text.partition(":")
+    start, _, end = addresses.partition("-")
+    return int(start, 0), int(end, 0) if end else None, access or "rw"
@@ -1,11 +1,32 @@
+# Text console, the screen is WIDTH x HEIGHT bytes of RAM starting at the base address. The registers after
+# the other devices (ConsoleFrameRegisters) let the guest commit a finished frame: each commit increments
+# the frame counter and runs on_commit at the end of the instruction (CPU.call_soon), so a UI that only
+# draws committed frames never shows a half drawn one and every engine commits at the same clock cycle.
+
 from .device import Device
 
+# Internal registers of the frame window
+FRAME_COMMIT = 0 # Write: commit the frame on screen
+FRAME_COUNT_HI = 1 # Committed frames, read only
+FRAME_COUNT_LO = 2
+
 class ConsoleDevice(Device):
     def __init__(self, name, min_address, max_address, width=80, height=24):
         super().__init__(name, min_address, max_address, io_type="rw")
         self.base_addr = 0x0000
         self.width = width
         self.height = height
+        self.frames = 0 # Committed frames (16-bit)
+        self.on_commit = None # Called after each commit, set by the UI
+        self.defer = None # Runs a callback between two instructions, set by the CPU
+
+    def commit(self):
+        self.frames = (self.frames + 1) & 0xFFFF
+        if self.on_commit:
+            if self.defer:
+                self.defer(self.on_commit)
+            else:
+                self.on_commit()
 
     def write_byte(self, addr, value):
         index = addr - self.min_address
@@ -14,9 +35,45 @@ class ConsoleDevice(Device):
         elif index == 1:
             self.base_addr = (self.base_addr & 0xFF00) | value
 
+    def save_state(self):
+        return self.base_addr.to_bytes(2, "big") + self.frames.to_bytes(2, "big")
+
+    def load_state(self, data):
+        self.base_addr = int.from_bytes(data[0:2], "big")
+        self.frames = int.from_bytes(data[2:4], "big") # Older save states end after the base address
+
+    def is_pollable(self, addr):
+        return True
+
     def read_byte(self, addr):
         index = addr - self.min_address
-        if index == 2:
+        if index == 0:
+            return self.base_addr >> 8
+        elif index == 1:
+            return self.base_addr & 0xFF
+        elif index == 2:
             return self.width
         elif index == 3:
-            return self.height
\ No newline at end of file
+            return self.height
+
+class ConsoleFrameRegisters(Device):
+    # Second register window of the console, its state is saved with the console
+    def __init__(self, name, min_address, max_address, console):
+        super().__init__(name, min_address, max_address, io_type="rw")
+        self.console = console
+
+    def is_pollable(self, addr):
+        return True
+
+    def read_byte(self, addr):
+        index = addr - self.min_address
+        if index == FRAME_COMMIT:
+            return 0
+        elif index == FRAME_COUNT_HI:
+            return self.console.frames >> 8
+        elif index == FRAME_COUNT_LO:
+            return self.console.frames & 0xFF
+
+    def write_byte(self, addr, value):
+        if addr - self.min_address == FRAME_COMMIT: # Any value, the counter can't be written
+            self.console.commit()
@@ -1,10 +1,23 @@
 class Device():
+    tick_rate = None # Cycles between tick() calls, devices that need ticking set this
+
     def __init__(self, name, min_address, max_address, io_type):
         self.name = name
         self.min_address = min_address
         self.max_address = max_address
         self.io_type = io_type
         self.clock_cycle = 0
+        self.reads = 0 # Bytes, counted by the bus for devices outside the RAM fast path
+        self.writes = 0
+
+    def is_pollable(self, addr): # Reading addr has no side effects, so idle loops may poll it
+        return False
+
+    def save_state(self): # Bytes for save states, None if the device has no state
+        return None
+
+    def load_state(self, data):
+        pass
 
     def tick(self):
         self.clock_cycle += 1
@@ -0,0 +1,122 @@
+# DMA controller for block copies and fills in RAM. The guest sets source, destination and length (and the
+# fill byte), writing the control register starts the transfer. It runs at once as a slice operation on the
+# RAM bytearray while the CPU is stalled for the transfer's cycle cost (see CPU.stall), so the status register
+# already shows the result when the next instruction runs. Copies behave like memmove for overlapping ranges.
+
+from .device import Device
+
+# Internal registers
+DMA_SOURCE_HI = 0
+DMA_SOURCE_LO = 1
+DMA_DEST_HI = 2
+DMA_DEST_LO = 3
+DMA_LENGTH_HI = 4
+DMA_LENGTH_LO = 5
+DMA_FILL_BYTE = 6 # Byte written by fills
+DMA_CONTROL = 7 # Write: start a transfer in this mode, read: mode of the last transfer
+DMA_STATUS = 8 # Read only
+# Modes
+DMA_COPY = 1
+DMA_FILL = 2
+# Status bits
+DMA_DONE = 0b01
+DMA_ERROR = 0b10 # Unknown mode or a range outside of RAM, nothing was transferred
+
+SETUP_CYCLES = 4
+BYTES_PER_CYCLE = 8
+
+class DMAController(Device):
+    def __init__(self, name, min_address, max_address, memory, setup_cycles=SETUP_CYCLES, bytes_per_cycle=BYTES_PER_CYCLE):
+        super().__init__(name, min_address, max_address, io_type="rw")
+        self.memory = memory
+        self.setup_cycles = setup_cycles
+        self.bytes_per_cycle = bytes_per_cycle
+        self.source = 0
+        self.destination = 0
+        self.length = 0
+        self.fill = 0
+        self.mode = 0
+        self.status = 0
+        self.stall = None # Charges the transfer's cycles to the CPU, set by the CPU
+        self.traffic = None # Counts the RAM bytes read and written by a transfer, set by the CPU
+
+    def cost(self, length):
+        return self.setup_cycles + -(-length // self.bytes_per_cycle)
+
+    def start(self, mode):
+        self.mode = mode
+        memory = self.memory
+        try:
+            destination = memory.index_range(self.destination, self.length)
+            if mode == DMA_COPY:
+                source = memory.index_range(self.source, self.length)
+                memory.store(destination, bytes(memory.data[source : source + self.length]))
+            elif mode == DMA_FILL:
+                memory.store(destination, bytes([self.fill]) * self.length)
+            else:
+                raise ValueError(f"Unknown DMA mode: {mode}")
+        except ValueError:
+            self.status = DMA_DONE | DMA_ERROR
+            return
+        self.status = DMA_DONE
+        if self.traffic:
+            self.traffic(self.length if mode == DMA_COPY else 0, self.length)
+        if self.stall:
+            self.stall(self.cost(self.length))
+
+    def save_state(self):
+        return b"".join([
+            self.source.to_bytes(2, "big"),
+            self.destination.to_bytes(2, "big"),
+            self.length.to_bytes(2, "big"),
+            bytes([self.fill, self.mode, self.status]),
+        ])
+
+    def load_state(self, data):
+        self.source = int.from_bytes(data[0:2], "big")
+        self.destination = int.from_bytes(data[2:4], "big")
+        self.length = int.from_bytes(data[4:6], "big")
+        self.fill, self.mode, self.status = data[6], data[7], data[8]
+
+    def is_pollable(self, addr):
+        return True
+
+    def read_byte(self, addr):
+        index = addr - self.min_address
+        if index == DMA_SOURCE_HI:
+            return self.source >> 8
+        elif index == DMA_SOURCE_LO:
+            return self.source & 0xFF
+        elif index == DMA_DEST_HI:
+            return self.destination >> 8
+        elif index == DMA_DEST_LO:
+            return self.destination & 0xFF
+        elif index == DMA_LENGTH_HI:
+            return self.length >> 8
+        elif index == DMA_LENGTH_LO:
+            return self.length & 0xFF
+        elif index == DMA_FILL_BYTE:
+            return self.fill
+        elif index == DMA_CONTROL:
+            return self.mode
+        elif index == DMA_STATUS:
+            return self.status
+
+    def write_byte(self, addr, value):
+        index = addr - self.min_address
+        if index == DMA_SOURCE_HI:
+            self.source = (self.source & 0x00FF) | (value << 8)
+        elif index == DMA_SOURCE_LO:
+            self.source = (self.source & 0xFF00) | value
+        elif index == DMA_DEST_HI:
+            self.destination = (self.destination & 0x00FF) | (value << 8)
+        elif index == DMA_DEST_LO:
+            self.destination = (self.destination & 0xFF00) | value
+        elif index == DMA_LENGTH_HI:
+            self.length = (self.length & 0x00FF) | (value << 8)
+        elif index == DMA_LENGTH_LO:
+            self.length = (self.length & 0xFF00) | value
+        elif index == DMA_FILL_BYTE:
+            self.fill = value
+        elif index == DMA_CONTROL:
+            self.start(value)
@@ -0,0 +1,87 @@
+# Maskable interrupts. Devices raise one of 8 lines, which stays pending until the CPU takes it or the
+# guest acknowledges it. Between two instructions the CPU takes the lowest pending line that is unmasked,
+# if the I flag is set (EI/DI): it pushes PC and the status register, clears I and jumps to the handler
+# address in the vector table (one word per line). RETI pops both again.
+
+from threading import Lock
+from .device import Device
+
+# Internal registers
+IRQ_PENDING = 0 # Read: pending lines, write: 1 bits acknowledge (clear) lines
+IRQ_MASK = 1 # Enabled lines
+VECTOR_HI = 2 # Address of the vector table
+VECTOR_LO = 3
+# Lines
+IRQ_KEYBOARD = 0
+IRQ_TIMER = 1
+IRQ_LINES = 8
+
+DEFAULT_VECTOR_BASE = 0xDFF0 # Right below the stack area
+
+class InterruptController(Device):
+    def __init__(self, name, min_address, max_address):
+        super().__init__(name, min_address, max_address, io_type="rw")
+        self.pending = 0
+        self.mask = 0
+        self.vector_base = DEFAULT_VECTOR_BASE
+        self.lock = Lock() # Lines are also raised from the input thread
+        self.notify = None # Called when an unmasked line is pending, set by the CPU
+
+    def raise_irq(self, line):
+        with self.lock:
+            self.pending |= 1 << line
+        self.check()
+
+    def check(self):
+        if self.pending & self.mask and self.notify:
+            self.notify()
+
+    def acknowledge(self): # Lowest pending unmasked line, cleared, or None
+        with self.lock:
+            active = self.pending & self.mask
+            if not active:
+                return None
+            line = (active & -active).bit_length() - 1
+            self.pending &= ~(1 << line)
+        return line
+
+    def vector(self, line):
+        return (self.vector_base + 2 * line) & 0xFFFF
+
+    def save_state(self):
+        with self.lock:
+            return bytes([self.pending, self.mask]) + self.vector_base.to_bytes(2, "big")
+
+    def load_state(self, data):
+        with self.lock:
+            self.pending, self.mask = data[0], data[1]
+            self.vector_base = int.from_bytes(data[2:4], "big")
+        self.check()
+
+    def is_pollable(self, addr):
+        return True
+
+    def read_byte(self, addr):
+        index = addr - self.min_address
+        if index == IRQ_PENDING:
+            with self.lock:
+                return self.pending
+        elif index == IRQ_MASK:
+            return self.mask
+        elif index == VECTOR_HI:
+            return self.vector_base >> 8
+        elif index == VECTOR_LO:
+            return self.vector_base & 0xFF
+
+    def write_byte(self, addr, value):
+        index = addr - self.min_address
+        if index == IRQ_PENDING:
+            with self.lock:
+                self.pending &= ~value
+        elif index == IRQ_MASK:
+            self.mask = value
+        elif index == VECTOR_HI:
+            self.vector_base = (self.vector_base & 0x00FF) | (value << 8)
+        elif index == VECTOR_LO:
+            self.vector_base = (self.vector_base & 0xFF00) | value
+        self.check()
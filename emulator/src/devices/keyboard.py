@@ -14,6 +14,28 @@ class KeyboardDevice(Device):
         self.input_buffer = Queue()
         self.status = 0  # Status register
         self.lock = threading.Lock()
+        self.irq = None # Raises the keyboard interrupt line, set by the CPU
+
+    def save_state(self):
+        with self.lock:
+            return bytes([self.status, *self.input_buffer.queue])
+
+    def load_state(self, data):
+        with self.lock:
+            self.status = data[0]
+            self.input_buffer.queue.clear()
+            self.input_buffer.queue.extend(data[1:])
+
+    def put_input(self, data): # Queues key codes from the input thread or a headless key script
+        with self.lock:
+            for byte in data:
+                self.input_buffer.put(byte)
+            self.status |= DATA_READY
+        if self.irq:
+            self.irq()
+
+    def is_pollable(self, addr):
+        return addr - self.min_address == KEYBRD_STATUS # Reading the data register consumes input
 
     def read_byte(self, addr):
         index = addr - self.min_address
@@ -1,27 +1,99 @@
+import mmap
+import os
 from .device import Device
 
+WATCH_MASK = bytes([0x00] + [0xFF] * 255) # Turns watch_map entries into byte masks
+
 class MemoryDevice(Device):
     def __init__(self, name, min_address, max_address, io_type="rw"):
         super().__init__(name, min_address, max_address, io_type)
         self.size = self.max_address - self.min_address + 1
         self.data = bytearray(self.size)
         self.io_type = io_type
+        self.watch_map = None # Optional bytearray, non-zero entries call watch_callback(start, end) when written
+        self.watch_callback = None
 
     def read_byte(self, addr):
         return self.data[addr - self.min_address]
 
+    def is_pollable(self, addr):
+        return True
+
     def write_byte(self, addr, value):
         if self.io_type != "ro":
-            self.data[addr - self.min_address] = value & 0xFF
+            index = addr - self.min_address
+            self.data[index] = value & 0xFF
+            if self.watch_map is not None and self.watch_map[index]:
+                self.watch_callback(addr, addr + 1)
+
+    def save_state(self):
+        return bytes(self.data)
+
+    def load_state(self, data):
+        if len(data) != self.size:
+            raise ValueError(f"Save state for '{self.name}' has {len(data)} bytes, expected {self.size}")
+        code_changed = self.watch_map is not None and self.watched_bytes_differ(data)
+        self.data[:] = data
+        if code_changed:
+            self.watch_callback(self.min_address, self.max_address + 1)
+
+    def watched_bytes_differ(self, data):
+        changed = int.from_bytes(self.data, "big") ^ int.from_bytes(data, "big")
+        return changed & int.from_bytes(self.watch_map.translate(WATCH_MASK), "big") != 0
+
+    def load_program(self, program, base_addr=0x0000): # Also loads into read-only memory
+        program = bytes(program)
+        self.store(self.index_range(base_addr, len(program)), program)
+
+    def load_file(self, filename, base_addr=0x0000): # Reads straight into RAM, without an intermediate copy
+        with open(filename, "rb") as program:
+            length = os.fstat(program.fileno()).st_size
+            index = self.index_range(base_addr, length)
+            with memoryview(self.data) as view:
+                program.readinto(view[index : index + length])
+        self.changed(index, length)
+        return length
+
+    def map_image(self, filename, shared=True):
+        # Backs the RAM with a memory image file instead of a bytearray. Shared mappings write through to the
+        # file (created or extended to the RAM size if needed) and are visible to other processes at once,
+        # private mappings are copy-on-write and leave the file as it is.
+        flags = os.O_RDWR | os.O_CREAT if shared else os.O_RDONLY
+        fd = os.open(filename, flags, 0o644)
+        try:
+            length = os.fstat(fd).st_size
+            if shared and length < self.size:
+                os.ftruncate(fd, self.size)
+            elif length < self.size:
+                raise ValueError(f"Memory image '{filename}' has {length} bytes, expected {self.size}")
+            self.data = mmap.mmap(fd, self.size, access=mmap.ACCESS_WRITE if shared else mmap.ACCESS_COPY)
+        finally:
+            os.close(fd)
+        self.changed(0, self.size)
+
+    def use_buffer(self, buffer): # Backs the RAM with a writable buffer, e.g. shared memory, keeping its contents
+        if len(buffer) != self.size:
+            raise ValueError(f"Buffer for '{self.name}' has {len(buffer)} bytes, expected {self.size}")
+        self.data = buffer
+        self.changed(0, self.size)
+
+    def index_range(self, addr, length):
+        if addr < self.min_address or addr + length - 1 > self.max_address:
+            raise ValueError(f"{length} bytes at {addr:04X} don't fit into '{self.name}' ({self.min_address:04X} - {self.max_address:04X})")
+        return addr - self.min_address
+
+    def store(self, index, data):
+        self.data[index : index + len(data)] = data
+        self.changed(index, len(data))
 
-    def load_program(self, program, base_addr=0x0000):
-        for i, byte in enumerate(program):
-            addr = base_addr + i
-            self.write_byte(addr, byte)
+    def changed(self, index, length): # Notifies the watcher (cached code) about bulk changes
+        if self.watch_map is not None and any(self.watch_map[index : index + length]):
+            addr = self.min_address + index
+            self.watch_callback(addr, addr + length)
 
     def write_bytes(self, addr, data: bytes):
         if self.io_type != "ro":
-            self.data[addr : addr + len(data)] = data
+            self.store(addr - self.min_address, data)
 
     def dump(self, start=0, end=None):
         if end is None:
@@ -0,0 +1,129 @@
+# Programmable interval timer, driven by the CPU clock. While enabled it expires every RELOAD << PRESCALE
+# cycles (a reload of 0 counts as 0x10000) and each expiry increments COUNT. When COUNT reaches COMPARE the
+# timer sets the match flag, raises its interrupt line and COUNT restarts at 0, so it interrupts every
+# COMPARE periods (every period for 0 and 1). A new reload value is used from the next expiry on.
+# Expiries are scheduler events and the registers only change there, nothing runs per cycle. Writing the
+# control register (re)starts the timer at the end of the instruction (CPU.call_soon), so the period starts
+# at the same clock cycle on every engine. A CPU waiting in WAIT skips straight to the next expiry.
+
+from .device import Device
+
+# Internal registers
+TIMER_RELOAD_HI = 0 # Period in ticks
+TIMER_RELOAD_LO = 1
+TIMER_COMPARE_HI = 2 # Expiries between interrupts
+TIMER_COMPARE_LO = 3
+TIMER_COUNT_HI = 4 # Expiries since the last match
+TIMER_COUNT_LO = 5
+TIMER_CONTROL = 6 # Bit 0: enable, bits 4 - 7: prescaler, a tick is 2^n cycles
+TIMER_STATUS = 7 # Bit 0: match, write 1 bits to clear
+# Control and status bits
+TIMER_ENABLE = 0b1
+TIMER_MATCH = 0b1
+
+class TimerDevice(Device):
+    def __init__(self, name, min_address, max_address, scheduler, clock):
+        super().__init__(name, min_address, max_address, io_type="rw")
+        self.scheduler = scheduler
+        self.clock = clock # Returns the current clock cycle
+        self.defer = None # Runs a callback between two instructions, set by the CPU
+        self.irq = None # Raises the timer interrupt line, set by the CPU
+        self.reload = 0
+        self.compare = 0
+        self.count = 0
+        self.control = 0
+        self.status = 0
+        self.event = None # Next expiry
+
+    @property
+    def period(self):
+        return (self.reload or 0x10000) << (self.control >> 4)
+
+    @property
+    def running(self):
+        return self.event is not None
+
+    def restart(self):
+        self.cancel()
+        if self.control & TIMER_ENABLE:
+            self.event = self.scheduler.schedule(self.clock() + self.period, self.expire)
+
+    def cancel(self):
+        if self.event:
+            self.scheduler.cancel(self.event)
+            self.event = None
+
+    def expire(self):
+        self.count = (self.count + 1) & 0xFFFF
+        if self.count >= self.compare:
+            self.count = 0
+            self.status |= TIMER_MATCH
+            if self.irq:
+                self.irq()
+        # From the scheduled cycle, not the current one, so late events (multi-cycle instructions) don't drift
+        self.event = self.scheduler.schedule(self.event.cycle + self.period, self.expire)
+
+    def save_state(self):
+        remaining = self.event.cycle - self.clock() if self.event else -1
+        return b"".join([
+            self.reload.to_bytes(2, "big"),
+            self.compare.to_bytes(2, "big"),
+            self.count.to_bytes(2, "big"),
+            bytes([self.control, self.status]),
+            remaining.to_bytes(8, "big", signed=True),
+        ])
+
+    def load_state(self, data):
+        self.reload = int.from_bytes(data[0:2], "big")
+        self.compare = int.from_bytes(data[2:4], "big")
+        self.count = int.from_bytes(data[4:6], "big")
+        self.control, self.status = data[6], data[7]
+        remaining = int.from_bytes(data[8:16], "big", signed=True)
+        self.cancel()
+        if remaining >= 0: # Relative to the current clock, restore_state moves it along with the other events
+            self.event = self.scheduler.schedule(self.clock() + remaining, self.expire)
+
+    def is_pollable(self, addr):
+        return True
+
+    def read_byte(self, addr):
+        index = addr - self.min_address
+        if index == TIMER_RELOAD_HI:
+            return self.reload >> 8
+        elif index == TIMER_RELOAD_LO:
+            return self.reload & 0xFF
+        elif index == TIMER_COMPARE_HI:
+            return self.compare >> 8
+        elif index == TIMER_COMPARE_LO:
+            return self.compare & 0xFF
+        elif index == TIMER_COUNT_HI:
+            return self.count >> 8
+        elif index == TIMER_COUNT_LO:
+            return self.count & 0xFF
+        elif index == TIMER_CONTROL:
+            return self.control
+        elif index == TIMER_STATUS:
+            return self.status
+
+    def write_byte(self, addr, value):
+        index = addr - self.min_address
+        if index == TIMER_RELOAD_HI:
+            self.reload = (self.reload & 0x00FF) | (value << 8)
+        elif index == TIMER_RELOAD_LO:
+            self.reload = (self.reload & 0xFF00) | value
+        elif index == TIMER_COMPARE_HI:
+            self.compare = (self.compare & 0x00FF) | (value << 8)
+        elif index == TIMER_COMPARE_LO:
+            self.compare = (self.compare & 0xFF00) | value
+        elif index == TIMER_COUNT_HI:
+            self.count = (self.count & 0x00FF) | (value << 8)
+        elif index == TIMER_COUNT_LO:
+            self.count = (self.count & 0xFF00) | value
+        elif index == TIMER_CONTROL:
+            self.control = value
+            if self.defer:
+                self.defer(self.restart)
+            else:
+                self.restart()
+        elif index == TIMER_STATUS:
+            self.status &= ~value
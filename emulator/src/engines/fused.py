@@ -0,0 +1,203 @@
+# Execution engine with superinstructions. Handlers are cached per address instead of per instruction word,
+# so the instruction word is never fetched through the bus, and common sequences run as one handler:
+#   CMP + conditional jump, LOADB/LOAD + conditional jump, ADD + CMP + conditional jump,
+#   CALL imm16 + the first instruction of the subroutine
+# Each instruction of a sequence still runs its predecoded handler and advances PC and clock_cycle exactly
+# like a fetch would. A sequence ends early when PC doesn't continue where expected, at the scheduler
+# deadline, or when a store invalidated cached handlers. Writes to cached instruction words invalidate them.
+# Sequences count how many of their instructions each run completed (exits, like translated blocks), so
+# the performance counters cost one increment per handler run.
+
+from .translator import operand_length
+
+CMP = 0b01_1100
+ADD = 0b01_0000
+LOADB = 0b10_1000
+LOAD = 0b10_1001
+CALL = 0b10_0111
+
+def is_conditional_jump(instr):
+    return 0b10_0001 <= instr >> 10 <= 0b10_0110
+
+class FusedEngine():
+    def __init__(self, cpu, predecoded):
+        self.cpu = cpu
+        self.handlers = predecoded.handlers
+        self.memory = cpu.bus.memory
+        self.code = [None] * 0x10000 # Handler per address, can cover several instructions
+        self.singles = [None] * 0x10000 # Single instruction handlers, used when the step limit is close
+        self.dependents = {} # Instruction word address -> addresses of handlers that contain it
+        self.watched = {} # Handler address -> instruction word addresses its handlers contain
+        self.sequences = {} # Address -> cached handler of several instructions, counted by Counters
+        self.dirty = False # Set when handlers are invalidated, so a running sequence can bail out
+        self.memory.watch_map = bytearray(self.memory.size)
+        self.memory.watch_callback = self.invalidate
+
+    def run_chunk(self, steps=-1):
+        cpu = self.cpu
+        reg = cpu.reg
+        scheduler = cpu.scheduler
+        code = self.code
+        executed = 0
+        if steps < 0:
+            while cpu.clock_cycle < scheduler.deadline:
+                pc = reg[8]
+                executed += (code[pc] or self.compile(pc))()
+            return executed
+        while executed < steps and cpu.clock_cycle < scheduler.deadline:
+            pc = reg[8]
+            handler = code[pc] or self.compile(pc)
+            if handler.length > steps - executed:
+                handler = self.singles[pc] or self.compile_single(pc)
+            executed += handler()
+        return executed
+
+    def invalidate(self, start, end):
+        for addr in range(start - 1, end): # Words starting one byte before the write overlap it
+            for pc in self.dependents.pop(addr, ()):
+                self.drop(pc)
+
+    def drop(self, pc): # Removes the handlers at pc and their other dependents entries
+        self.code[pc] = self.singles[pc] = None
+        if pc in self.sequences:
+            self.cpu.counters.fold_block(self.sequences.pop(pc))
+        dependents = self.dependents
+        for addr in self.watched.pop(pc, ()):
+            pcs = dependents.get(addr)
+            if pcs is not None:
+                pcs.discard(pc)
+                if not pcs:
+                    del dependents[addr]
+        self.dirty = True
+
+    def read_instr(self, addr): # None if the word isn't in RAM
+        memory = self.memory
+        if not (memory.min_address <= addr and addr + 1 <= memory.max_address):
+            return None
+        index = addr - memory.min_address
+        return (memory.data[index] << 8) | memory.data[index + 1]
+
+    def watch(self, pc, addrs):
+        memory = self.memory
+        self.watched.setdefault(pc, set()).update(addrs)
+        for addr in addrs:
+            self.dependents.setdefault(addr, set()).add(pc)
+            index = addr - memory.min_address
+            memory.watch_map[index : index + 2] = b"\x01\x01"
+
+    def sequence(self, pc):
+        # Addresses of the instructions to run as one handler starting at pc
+        instr = self.read_instr(pc)
+        if instr is None:
+            return []
+        pcs = [pc]
+        opcode = instr >> 10
+        next_pc = (pc + 2 + operand_length(instr)) & 0xFFFF
+        if opcode == CALL and instr & 0b111 == 0b010: # CALL imm16, the target follows the operand
+            target = self.read_instr(pc + 2)
+            if target is not None and self.read_instr(target) is not None:
+                pcs.append(target)
+            return pcs
+        if opcode not in (CMP, ADD, LOADB, LOAD):
+            return pcs
+        second = self.read_instr(next_pc)
+        if second is None:
+            return pcs
+        if opcode == ADD and second >> 10 == CMP:
+            third_pc = (next_pc + 2 + operand_length(second)) & 0xFFFF
+            third = self.read_instr(third_pc)
+            if third is not None and is_conditional_jump(third):
+                return pcs + [next_pc, third_pc]
+        elif opcode != ADD and is_conditional_jump(second):
+            pcs.append(next_pc)
+        return pcs
+
+    def compile(self, pc):
+        pcs = self.sequence(pc)
+        if len(pcs) < 2:
+            return self.compile_single(pc, self.code)
+        cpu = self.cpu
+        reg = cpu.reg
+        scheduler = cpu.scheduler
+        engine = self
+        instrs = [self.read_instr(addr) for addr in pcs]
+        handlers = [self.handlers[instr] for instr in instrs]
+        exits = [0] * (len(pcs) + 1) # Runs per number of completed instructions, see Counters.fold_block
+        if len(pcs) == 2:
+            pc1, pc2 = pcs
+            h1, h2 = handlers
+            next1, next2 = (pc1 + 2) & 0xFFFF, (pc2 + 2) & 0xFFFF
+            def pair():
+                engine.dirty = False
+                reg[8] = next1
+                cpu.clock_cycle += 1
+                h1()
+                if reg[8] != pc2 or engine.dirty or cpu.clock_cycle >= scheduler.deadline:
+                    exits[1] += 1
+                    return 1
+                reg[8] = next2
+                cpu.clock_cycle += 1
+                h2()
+                exits[2] += 1
+                return 2
+            handler = pair
+        else:
+            pc1, pc2, pc3 = pcs
+            h1, h2, h3 = handlers
+            next1, next2, next3 = (pc1 + 2) & 0xFFFF, (pc2 + 2) & 0xFFFF, (pc3 + 2) & 0xFFFF
+            def triple():
+                engine.dirty = False
+                reg[8] = next1
+                cpu.clock_cycle += 1
+                h1()
+                if reg[8] != pc2 or engine.dirty or cpu.clock_cycle >= scheduler.deadline:
+                    exits[1] += 1
+                    return 1
+                reg[8] = next2
+                cpu.clock_cycle += 1
+                h2()
+                if reg[8] != pc3 or engine.dirty or cpu.clock_cycle >= scheduler.deadline:
+                    exits[2] += 1
+                    return 2
+                reg[8] = next3
+                cpu.clock_cycle += 1
+                h3()
+                exits[3] += 1
+                return 3
+            handler = triple
+        handler.length = len(pcs)
+        handler.instrs = instrs
+        handler.exits = exits
+        self.code[pc] = handler
+        self.sequences[pc] = handler
+        self.watch(pc, pcs)
+        return handler
+
+    def compile_single(self, pc, table=None):
+        table = self.singles if table is None else table
+        cpu = self.cpu
+        counts = cpu.counters.instructions
+        instr = self.read_instr(pc)
+        if instr is None: # Outside of RAM, fetched through the bus every time
+            fetch_word = cpu.fetch_word
+            handlers = self.handlers
+            def fetch_execute():
+                instr = fetch_word()
+                handlers[instr]()
+                counts[instr] += 1
+                return 1
+            fetch_execute.length = 1
+            return fetch_execute
+        reg = cpu.reg
+        run = self.handlers[instr]
+        next_pc = (pc + 2) & 0xFFFF
+        def single():
+            reg[8] = next_pc
+            cpu.clock_cycle += 1
+            run()
+            counts[instr] += 1
+            return 1
+        single.length = 1
+        table[pc] = single
+        self.watch(pc, [pc])
+        return single
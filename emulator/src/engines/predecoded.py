@@ -0,0 +1,321 @@
+# Execution engine that decodes every 16-bit instruction word only once. The decoded handler has all
+# bit fields already bound, so executing an instruction again is a single dictionary lookup and call.
+# Instruction words don't contain any address dependent data (immediates are fetched at runtime),
+# so the cache never has to be invalidated.
+
+from ..status import FLAG_Z, FLAG_N, FLAG_C
+
+CLEAR_ZN = ~(FLAG_Z | FLAG_N)
+CLEAR_C = ~FLAG_C
+
+class DecodeCache(dict):
+    def __init__(self, decode):
+        super().__init__()
+        self.decode = decode
+
+    def __missing__(self, instr):
+        handler = self[instr] = self.decode(instr)
+        return handler
+
+class PredecodedEngine():
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.handlers = DecodeCache(self.decode)
+
+    def execute(self, instr):
+        self.handlers[instr]()
+
+    def decode(self, instr):
+        instr_type = (instr >> 14) & 0b11
+        opcode = (instr >> 10) & 0b1111
+        reg = (instr >> 7) & 0b111
+        operand = (instr >> 3) & 0b1111
+        addressing_mode = instr & 0b111
+
+        if addressing_mode == 0b111 or (addressing_mode in (0x3, 0x4, 0x5) and operand > 8):
+            return self.fallback(instr) # Invalid encodings raise the same errors as the interpreter
+
+        if instr_type == 0b00: # General instructions
+            return self.decode_general(instr, opcode, reg, operand, addressing_mode)
+        elif instr_type == 0b01: # ALU operations
+            return self.decode_alu(instr, opcode, reg, operand, addressing_mode)
+        elif instr_type == 0b10 and (opcode & 0b1000) == 0: # Jump operations
+            return self.decode_jump(opcode & 0b111, operand, addressing_mode)
+        elif instr_type == 0b10 and (opcode & 0b1000) != 0: # Memory/stack operations
+            return self.decode_mem_stack(opcode & 0b111, reg, operand, addressing_mode)
+        return self.nop
+
+    def nop(self):
+        pass
+
+    def fallback(self, instr):
+        decode_execute = self.cpu.decode_execute
+        return lambda: decode_execute(instr)
+
+    def decode_general(self, instr, opcode, rA, operand, addressing_mode):
+        cpu = self.cpu
+        if opcode == 0b0001: # HALT
+            def halt():
+                cpu.stop = True
+            return halt
+        elif opcode == 0b0010: # RET
+            reg = cpu.reg
+            pop_word = cpu.pop_word
+            def ret():
+                reg[8] = pop_word() & 0xFFFF
+            return ret
+        elif opcode == 0b0011: # MOV
+            return self.bind_write(rA, self.operand_reader(addressing_mode, operand))
+        elif opcode == 0b0100: # EI
+            return cpu.enable_interrupts
+        elif opcode == 0b0101: # DI
+            return cpu.disable_interrupts
+        elif opcode == 0b0110: # RETI
+            return cpu.return_from_interrupt
+        elif opcode == 0b0111: # WAIT
+            return cpu.wait
+        return self.nop
+
+    def decode_alu(self, instr, opcode, rA, operand, addressing_mode):
+        op = ALU_OPS[opcode]
+        if op is None:
+            return self.fallback(instr)
+        cpu = self.cpu
+        reg = cpu.reg
+
+        if opcode == 0xC: # CMP only updates the status flags
+            read = self.operand_reader(addressing_mode, operand)
+            def compare():
+                res = (reg[rA] - read()) & 0xFFFF
+                cpu.status = (cpu.status & CLEAR_ZN) | (FLAG_Z if res == 0 else 0) | ((res >> 14) & FLAG_N)
+            return compare
+
+        if addressing_mode == 0x0: # Imm4
+            def alu_imm4():
+                res = op(cpu, reg[rA], operand) & 0xFFFF
+                reg[rA] = res
+                cpu.status = (cpu.status & CLEAR_ZN) | (FLAG_Z if res == 0 else 0) | ((res >> 14) & FLAG_N)
+            return alu_imm4
+        elif addressing_mode == 0x3: # Reg
+            def alu_reg():
+                res = op(cpu, reg[rA], reg[operand]) & 0xFFFF
+                reg[rA] = res
+                cpu.status = (cpu.status & CLEAR_ZN) | (FLAG_Z if res == 0 else 0) | ((res >> 14) & FLAG_N)
+            return alu_reg
+        read = self.operand_reader(addressing_mode, operand)
+        def alu():
+            res = op(cpu, reg[rA], read()) & 0xFFFF
+            reg[rA] = res
+            cpu.status = (cpu.status & CLEAR_ZN) | (FLAG_Z if res == 0 else 0) | ((res >> 14) & FLAG_N)
+        return alu
+
+    def decode_jump(self, opcode, operand, addressing_mode):
+        cpu = self.cpu
+        reg = cpu.reg
+        taken = cpu.counters.taken
+        read_addr = self.address_reader(addressing_mode, operand)
+
+        if opcode == 0x0: # JMP
+            def jmp():
+                reg[8] = read_addr() & 0xFFFF
+                taken[0] += 1
+            return jmp
+        elif opcode == 0x1: # JZ/JEQ
+            def jz():
+                addr = read_addr()
+                if cpu.status & FLAG_Z:
+                    reg[8] = addr & 0xFFFF
+                    taken[1] += 1
+            return jz
+        elif opcode == 0x2: # JNZ/JNE
+            def jnz():
+                addr = read_addr()
+                if not cpu.status & FLAG_Z:
+                    reg[8] = addr & 0xFFFF
+                    taken[2] += 1
+            return jnz
+        elif opcode == 0x3: # JLT
+            def jlt():
+                addr = read_addr()
+                if cpu.status & FLAG_N:
+                    reg[8] = addr & 0xFFFF
+                    taken[3] += 1
+            return jlt
+        elif opcode == 0x4: # JGT
+            def jgt():
+                addr = read_addr()
+                if not cpu.status & (FLAG_N | FLAG_Z):
+                    reg[8] = addr & 0xFFFF
+                    taken[4] += 1
+            return jgt
+        elif opcode == 0x5: # JC
+            def jc():
+                addr = read_addr()
+                if cpu.status & FLAG_C:
+                    reg[8] = addr & 0xFFFF
+                    taken[5] += 1
+            return jc
+        elif opcode == 0x6: # JNC
+            def jnc():
+                addr = read_addr()
+                if not cpu.status & FLAG_C:
+                    reg[8] = addr & 0xFFFF
+                    taken[6] += 1
+            return jnc
+        else: # CALL
+            push_word = self.cpu.push_word
+            def call():
+                addr = read_addr()
+                push_word(reg[8])
+                reg[8] = addr & 0xFFFF
+                taken[7] += 1
+            return call
+
+    def decode_mem_stack(self, opcode, rA, operand, addressing_mode):
+        cpu = self.cpu
+        bus = cpu.bus
+        reg = cpu.reg
+        if opcode == 0x0: # LOADB
+            read_addr = self.address_reader(addressing_mode, operand)
+            return self.bind_write(rA, lambda: bus.read_byte(read_addr()))
+        elif opcode == 0x1: # LOAD
+            read_addr = self.address_reader(addressing_mode, operand)
+            return self.bind_write(rA, lambda: bus.read_word(read_addr()))
+        elif opcode == 0x2: # STOREB
+            read_addr = self.address_reader(addressing_mode, operand)
+            return lambda: bus.write_byte(read_addr(), reg[rA])
+        elif opcode == 0x3: # STORE
+            read_addr = self.address_reader(addressing_mode, operand)
+            return lambda: bus.write_word(read_addr(), reg[rA])
+        elif opcode == 0x4: # POPB
+            return self.bind_write(rA, cpu.pop_byte)
+        elif opcode == 0x5: # POP
+            return self.bind_write(rA, cpu.pop_word)
+        elif opcode == 0x6: # PUSHB
+            read = self.operand_reader(addressing_mode, operand)
+            push_byte = cpu.push_byte
+            return lambda: push_byte(read())
+        else: # PUSH
+            read = self.operand_reader(addressing_mode, operand)
+            push_word = cpu.push_word
+            return lambda: push_word(read())
+
+    def bind_write(self, rN, read):
+        cpu = self.cpu
+        reg = cpu.reg
+        def write():
+            value = read() & 0xFFFF
+            cpu.status = (cpu.status & CLEAR_ZN) | (FLAG_Z if value == 0 else 0) | ((value >> 14) & FLAG_N)
+            reg[rN] = value
+        return write
+
+    def operand_reader(self, addressing_mode, operand):
+        cpu = self.cpu
+        bus = cpu.bus
+        reg = cpu.reg
+        if addressing_mode == 0x0: # Imm4
+            return lambda: operand
+        elif addressing_mode == 0x1: # Imm8
+            return cpu.fetch_byte
+        elif addressing_mode == 0x2: # Imm16
+            return cpu.fetch_word
+        elif addressing_mode == 0x3: # Reg
+            return lambda: reg[operand]
+        elif addressing_mode == 0x4: # Indirect Reg
+            return lambda: bus.read_word(reg[operand])
+        elif addressing_mode == 0x5: # Indirect Reg + Imm16(signed)
+            read_addr = self.address_reader(addressing_mode, operand)
+            return lambda: bus.read_word(read_addr())
+        else: # Indirect Imm16
+            fetch_word = cpu.fetch_word
+            return lambda: bus.read_word(fetch_word())
+
+    def address_reader(self, addressing_mode, operand):
+        cpu = self.cpu
+        reg = cpu.reg
+        if addressing_mode == 0x0: # Imm4
+            return lambda: operand
+        elif addressing_mode == 0x1: # Imm8
+            return cpu.fetch_byte
+        elif addressing_mode in (0x2, 0x6): # Imm16, Indirect Imm16
+            return cpu.fetch_word
+        elif addressing_mode in (0x3, 0x4): # Reg, Indirect Reg
+            return lambda: reg[operand]
+        else: # Indirect Reg + Imm16(signed)
+            fetch_word = cpu.fetch_word
+            def indirect_offset():
+                offset = fetch_word()
+                return reg[operand] + ((offset ^ 0x8000) - 0x8000)
+            return indirect_offset
+
+# ALU operations return the unmasked result and update the carry flag exactly like CPU.exec_alu
+def alu_add(cpu, a, b):
+    res = a + b
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if res > 0xFFFF else 0)
+    return res
+
+def alu_sub(cpu, a, b):
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if a < b else 0)
+    return a - b
+
+def alu_mul(cpu, a, b):
+    res = a * b
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if res > 0xFFFF else 0)
+    return res
+
+def alu_mulh(cpu, a, b):
+    return (a * b) >> 16
+
+def alu_and(cpu, a, b):
+    return a & b
+
+def alu_or(cpu, a, b):
+    return a | b
+
+def alu_xor(cpu, a, b):
+    return a ^ b
+
+def alu_shl(cpu, a, b):
+    shift = b & 0xF
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if (a >> (16 - shift)) & 1 else 0)
+    return a << shift
+
+def alu_rol(cpu, a, b):
+    shift = b & 0xF
+    res = (a << shift) | (a >> (16 - shift))
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if res & 1 else 0)
+    return res
+
+def alu_shr(cpu, a, b):
+    shift = b & 0xF
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if (a >> (shift - 1)) & 1 else 0)
+    return a >> shift
+
+def alu_asr(cpu, a, b):
+    shift = b & 0xF
+    sign = (a >> 15) & 1
+    res = (a >> shift) | ((0xFFFF << (16 - shift)) if sign else 0)
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if (a >> (shift - 1)) & 1 else 0)
+    return res
+
+def alu_ror(cpu, a, b):
+    shift = b & 0xF
+    res = (a >> shift) | (a << (16 - shift))
+    cpu.status = (cpu.status & CLEAR_C) | (FLAG_C if (res >> 15) & 1 else 0)
+    return res
+
+def alu_cmp(cpu, a, b):
+    return a - b
+
+def alu_not(cpu, a, b):
+    return ~a
+
+def alu_neg(cpu, a, b):
+    return -a
+
+ALU_OPS = [
+    alu_add, alu_sub, alu_mul, alu_mulh,
+    alu_and, alu_or, alu_xor, alu_shl,
+    alu_rol, alu_shr, alu_asr, alu_ror,
+    alu_cmp, alu_not, alu_neg, None,
+]
@@ -0,0 +1,315 @@
+# Execution engine that translates straight-line basic blocks of guest code into Python functions.
+# A block starts at the current PC and ends after the next jump, CALL, RET or HALT. Each block is
+# compiled once, cached by its start address and invalidated when the memory holding it is written.
+# Addresses whose first instruction can't be translated are cached too, so they go straight to the
+# interpreter until their instruction word is written. Cached ranges are indexed by 256 byte page, a write
+# only looks at the entries on its pages.
+# Blocks that would cross the next scheduler event, max cycles or step limit are interpreted one
+# instruction at a time instead, so the observable clock cycle behaviour is identical.
+
+from ..status import FLAG_Z, FLAG_N, FLAG_C
+
+MAX_BLOCK_LENGTH = 64
+
+# Generated code keeps the status register in a local variable, these lines update it
+UPDATE_ZN = f"status = (status & {~(FLAG_Z | FLAG_N)}) | ({FLAG_Z} if v == 0 else 0) | ((v >> 14) & {FLAG_N})"
+UPDATE_C = f"status = (status & {~FLAG_C}) | ({FLAG_C} if carry else 0)"
+
+ALU_TEMPLATES = [
+    ["res = a + b", "carry = res > 0xFFFF", UPDATE_C], # ADD
+    ["res = a - b", "carry = a < b", UPDATE_C], # SUB
+    ["res = a * b", "carry = res > 0xFFFF", UPDATE_C], # MUL
+    ["res = (a * b) >> 16"], # MULH
+    ["res = a & b"], # AND
+    ["res = a | b"], # OR
+    ["res = a ^ b"], # XOR
+    ["shift = b & 0xF", "res = a << shift", "carry = (a >> (16 - shift)) & 1", UPDATE_C], # SHL
+    ["shift = b & 0xF", "res = (a << shift) | (a >> (16 - shift))", "carry = res & 1", UPDATE_C], # ROL
+    ["shift = b & 0xF", "res = a >> shift", "carry = (a >> (shift - 1)) & 1", UPDATE_C], # SHR
+    ["shift = b & 0xF", "sign = (a >> 15) & 1", "res = (a >> shift) | ((0xFFFF << (16 - shift)) if sign else 0)", "carry = (a >> (shift - 1)) & 1", UPDATE_C], # ASR
+    ["shift = b & 0xF", "res = (a >> shift) | (a << (16 - shift))", "carry = (res >> 15) & 1", UPDATE_C], # ROR
+    ["res = a - b"], # CMP
+    ["res = ~a"], # NOT
+    ["res = -a"], # NEG
+    [], # Unused
+]
+
+JUMP_CONDITIONS = [
+    None, # JMP
+    f"status & {FLAG_Z}", # JZ/JEQ
+    f"not status & {FLAG_Z}", # JNZ/JNE
+    f"status & {FLAG_N}", # JLT
+    f"not status & {FLAG_N | FLAG_Z}", # JGT
+    f"status & {FLAG_C}", # JC
+    f"not status & {FLAG_C}", # JNC
+    None, # CALL
+]
+
+class Block():
+    def __init__(self, addr, end_addr, function, ends, instrs, exits):
+        self.addr = addr
+        self.end_addr = end_addr # Exclusive
+        self.function = function
+        self.instrs = instrs
+        self.exits = exits # Number of runs per count of completed instructions, see Counters.fold_block
+        self.length = len(ends)
+        self.cycles = ends[-1]
+        self.last_start = ends[-2] if len(ends) > 1 else 0 # Clock cycle offset before the last instruction
+
+class BlockTranslator():
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.memory = cpu.bus.memory
+        self.blocks = {}
+        self.untranslatable = set() # Start addresses that fall back to the interpreter
+        self.watched = {} # Start address -> end of the watched range (exclusive), of blocks and untranslatable addresses
+        self.pages = {} # Page -> start addresses of the watched ranges on it
+        self.dirty = False # Set when a block is invalidated, so the running block can bail out
+        self.memory.watch_map = bytearray(self.memory.size)
+        self.memory.watch_callback = self.invalidate
+
+    def run_chunk(self, steps=-1):
+        cpu = self.cpu
+        reg = cpu.reg
+        scheduler = cpu.scheduler
+        blocks = self.blocks
+        executed = 0
+        while steps != 0 and cpu.clock_cycle < scheduler.deadline:
+            pc = reg[8]
+            block = blocks.get(pc)
+            if block is None and pc not in self.untranslatable:
+                block = self.translate(pc)
+            if block is None or 0 < steps < block.length or cpu.clock_cycle + block.last_start >= scheduler.deadline:
+                count = block.length if block else 1
+                if steps > 0:
+                    count = min(count, steps)
+                count = cpu.run_instructions(count)
+            else:
+                self.dirty = False
+                count = block.function()
+            executed += count
+            if steps > 0:
+                steps -= count
+        return executed
+
+    def invalidate(self, start, end):
+        watched = self.watched
+        stale = {addr for page in self.pages_of(start, end) for addr in self.pages.get(page, ())
+                 if addr < end and start < watched[addr]}
+        if not stale:
+            return
+        cleared = set()
+        for addr in stale:
+            if addr in self.blocks:
+                self.cpu.counters.fold_block(self.blocks.pop(addr))
+            else:
+                self.untranslatable.discard(addr)
+            cleared.update(self.unwatch(addr))
+        for page in cleared: # Other ranges on these pages might overlap the cleared bytes
+            for addr in self.pages.get(page, ()):
+                self.mark(addr, watched[addr])
+        self.dirty = True
+
+    def pages_of(self, start, end):
+        return range(start >> 8, ((end - 1) >> 8) + 1)
+
+    def watch(self, start, end):
+        self.watched[start] = end
+        for page in self.pages_of(start, end):
+            self.pages.setdefault(page, set()).add(start)
+        self.mark(start, end)
+
+    def unwatch(self, start): # Returns the pages of the range
+        end = self.watched.pop(start)
+        pages = self.pages_of(start, end)
+        for page in pages:
+            addrs = self.pages[page]
+            addrs.discard(start)
+            if not addrs:
+                del self.pages[page]
+        base = self.memory.min_address
+        self.memory.watch_map[start - base : end - base] = bytes(end - start)
+        return pages
+
+    def mark(self, start, end):
+        base = self.memory.min_address
+        self.memory.watch_map[start - base : end - base] = b"\x01" * (end - start)
+
+    def translate(self, addr):
+        memory = self.memory
+        data = memory.data
+        lines = []
+        pcs = []
+        ends = []
+        instrs = []
+        pc = addr
+        cycles = 0
+        is_terminator = False
+        has_store = False
+        while len(pcs) < MAX_BLOCK_LENGTH:
+            if not (memory.min_address <= pc and pc + 1 <= memory.max_address):
+                break
+            index = pc - memory.min_address
+            instr = (data[index] << 8) | data[index + 1]
+            if not can_translate(instr):
+                break
+            length = operand_length(instr)
+            if pc + 1 + length > memory.max_address:
+                break
+            imm = int.from_bytes(data[index + 2 : index + 2 + length], "big") if length else None
+            next_pc = pc + 2 + length
+            cycles += 2 if length else 1
+            body, is_store, is_terminator = translate_instruction(instr, imm, next_pc)
+
+            lines += [f"        i = {len(pcs)}"] + ["        " + line for line in body]
+            pcs.append(next_pc)
+            instrs.append(instr)
+            ends.append(cycles)
+            pc = next_pc
+            if is_terminator:
+                break
+            if is_store: # The store might have overwritten the rest of this block, stalled the CPU (DMA) or interrupted it
+                has_store = True
+                lines += [
+                    "        if engine.dirty or cpu.clock_cycle != clock or scheduler.deadline == 0:",
+                    "            cpu.status = status",
+                    f"            reg[8] = {next_pc}",
+                    f"            cpu.clock_cycle += {cycles}",
+                    f"            exits[{len(pcs)}] += 1",
+                    f"            return {len(pcs)}",
+                ]
+
+        if not pcs:
+            self.untranslatable.add(addr)
+            if memory.min_address <= addr and addr + 1 <= memory.max_address: # Outside of RAM it stays untranslatable
+                self.watch(addr, addr + 2)
+            return None
+        if not is_terminator:
+            lines.append(f"        reg[8] = {pc}")
+        source = "\n".join([
+            "def block(cpu=cpu, reg=reg, bus=bus, scheduler=scheduler, engine=engine, taken=taken, exits=exits):",
+            "    status = cpu.status",
+            *(["    clock = cpu.clock_cycle"] if has_store else []),
+            "    try:",
+            *lines,
+            "        cpu.status = status",
+            f"        cpu.clock_cycle += {cycles}",
+            f"        exits[{len(pcs)}] += 1",
+            f"        return {len(pcs)}",
+            "    except BaseException:", # Leave the CPU state where the interpreter would have
+            "        cpu.status = status",
+            "        exits[i] += 1",
+            f"        reg[8] = {tuple(pcs)}[i]",
+            f"        cpu.clock_cycle += {tuple(ends)}[i]",
+            "        raise",
+        ])
+        exits = [0] * (len(pcs) + 1)
+        namespace = {"cpu": self.cpu, "reg": self.cpu.reg, "bus": self.cpu.bus, "scheduler": self.cpu.scheduler, "engine": self, "taken": self.cpu.counters.taken, "exits": exits}
+        exec(compile(source, f"<block {addr:04X}>", "exec"), namespace)
+
+        block = Block(addr, pc, namespace["block"], ends, instrs, exits)
+        self.blocks[addr] = block
+        self.watch(addr, pc)
+        return block
+
+def can_translate(instr):
+    operand = (instr >> 3) & 0b1111
+    addressing_mode = instr & 0b111
+    if instr >> 10 in (0b00_0100, 0b00_0101, 0b00_0110): # EI, DI and RETI change the status register behind the block's back
+        return False
+    if instr >> 10 == 0b00_0111: # WAIT ends the running chunk
+        return False
+    return addressing_mode != 0b111 and not (addressing_mode in (0x3, 0x4, 0x5) and operand > 8)
+
+def operand_length(instr):
+    instr_type = (instr >> 14) & 0b11
+    opcode = (instr >> 10) & 0b1111
+    addressing_mode = instr & 0b111
+    if instr_type == 0b11 or (instr_type == 0b00 and opcode != 0b0011): # Only MOV fetches an operand
+        return 0
+    if instr_type == 0b10 and opcode in (0b1100, 0b1101): # POPB, POP
+        return 0
+    if addressing_mode == 0x1: # Imm8
+        return 1
+    if addressing_mode in (0x2, 0x5, 0x6): # Imm16, Indirect Reg + Imm16(signed), Indirect Imm16
+        return 2
+    return 0
+
+def translate_instruction(instr, imm, next_pc):
+    instr_type = (instr >> 14) & 0b11
+    opcode = (instr >> 10) & 0b1111
+    reg = (instr >> 7) & 0b111
+    operand = (instr >> 3) & 0b1111
+    addressing_mode = instr & 0b111
+
+    if instr_type == 0b00: # General instructions
+        if opcode == 0b0001: # HALT
+            return ["cpu.stop = True", f"reg[8] = {next_pc}"], False, True
+        elif opcode == 0b0010: # RET
+            return [f"reg[8] = {next_pc}", "reg[8] = cpu.pop_word() & 0xFFFF"], False, True
+        elif opcode == 0b0011: # MOV
+            return write_register(reg, value_expr(addressing_mode, operand, imm, next_pc)), False, False
+    elif instr_type == 0b01: # ALU operations
+        lines = [f"a = {register_expr(reg, next_pc)}", f"b = {value_expr(addressing_mode, operand, imm, next_pc)}"]
+        lines += ALU_TEMPLATES[opcode]
+        if opcode == 0xC: # CMP
+            lines += ["v = res & 0xFFFF", UPDATE_ZN]
+        elif opcode != 0xF:
+            lines += write_register(reg, "res")
+        return lines, False, False
+    elif instr_type == 0b10 and (opcode & 0b1000) == 0: # Jump operations
+        opcode &= 0b111
+        lines = [f"addr = {address_expr(addressing_mode, operand, imm, next_pc)}", f"reg[8] = {next_pc}"]
+        if opcode == 0x7: # CALL
+            lines += [f"cpu.push_word({next_pc})", "reg[8] = addr & 0xFFFF", "taken[7] += 1"]
+        elif JUMP_CONDITIONS[opcode] is None: # JMP
+            lines += ["reg[8] = addr & 0xFFFF", "taken[0] += 1"]
+        else:
+            lines += [f"if {JUMP_CONDITIONS[opcode]}:", "    reg[8] = addr & 0xFFFF", f"    taken[{opcode}] += 1"]
+        return lines, False, True
+    elif instr_type == 0b10: # Memory/stack operations
+        opcode &= 0b111
+        if opcode == 0x0: # LOADB
+            return write_register(reg, f"bus.read_byte({address_expr(addressing_mode, operand, imm, next_pc)})"), False, False
+        elif opcode == 0x1: # LOAD
+            return write_register(reg, f"bus.read_word({address_expr(addressing_mode, operand, imm, next_pc)})"), False, False
+        elif opcode == 0x2: # STOREB
+            return [f"bus.write_byte({address_expr(addressing_mode, operand, imm, next_pc)}, reg[{reg}])"], True, False
+        elif opcode == 0x3: # STORE
+            return [f"bus.write_word({address_expr(addressing_mode, operand, imm, next_pc)}, reg[{reg}])"], True, False
+        elif opcode == 0x4: # POPB
+            return write_register(reg, "cpu.pop_byte()"), False, False
+        elif opcode == 0x5: # POP
+            return write_register(reg, "cpu.pop_word()"), False, False
+        elif opcode == 0x6: # PUSHB
+            return [f"cpu.push_byte({value_expr(addressing_mode, operand, imm, next_pc)})"], True, False
+        elif opcode == 0x7: # PUSH
+            return [f"cpu.push_word({value_expr(addressing_mode, operand, imm, next_pc)})"], True, False
+    return ["pass"], False, False
+
+def write_register(rN, expr):
+    return [f"v = ({expr}) & 0xFFFF", UPDATE_ZN, f"reg[{rN}] = v"]
+
+def register_expr(rN, next_pc):
+    return str(next_pc) if rN == 8 else f"reg[{rN}]" # The PC isn't updated while a block runs
+
+def value_expr(addressing_mode, operand, imm, next_pc):
+    if addressing_mode == 0x0: # Imm4
+        return str(operand)
+    elif addressing_mode in (0x1, 0x2): # Imm8, Imm16
+        return str(imm)
+    elif addressing_mode == 0x3: # Reg
+        return register_expr(operand, next_pc)
+    else: # Indirect Reg, Indirect Reg + Imm16(signed), Indirect Imm16
+        return f"bus.read_word({address_expr(addressing_mode, operand, imm, next_pc)})"
+
+def address_expr(addressing_mode, operand, imm, next_pc):
+    if addressing_mode == 0x0: # Imm4
+        return str(operand)
+    elif addressing_mode in (0x1, 0x2, 0x6): # Imm8, Imm16, Indirect Imm16
+        return str(imm)
+    elif addressing_mode in (0x3, 0x4): # Reg, Indirect Reg
+        return register_expr(operand, next_pc)
+    else: # Indirect Reg + Imm16(signed)
+        offset = (imm ^ 0x8000) - 0x8000
+        return f"({register_expr(operand, next_pc)} + {offset})"
@@ -0,0 +1,512 @@
+# Lockstep engine that runs many independent machines at once with NumPy. Every step, each running
+# machine executes one instruction. Machines are grouped by the instruction word at their PC, so each
+# distinct instruction is executed once as vectorized operations over all machines in its group.
+# The machines mirror a headless CPU: RAM at 0x0000 - 0xEFFF, the console registers at 0xF000 - 0xF003 and
+# a keyboard that never receives input at 0xF004 - 0xF005, the interrupt controller at 0xF006 - 0xF009, DMA
+# at 0xF00A - 0xF012, the timer at 0xF013 - 0xF01A and the console frame registers at 0xF01B - 0xF01D. DMA
+# transfers are rare, they run one machine at a time.
+# Timer expiries are handled after each step and pending interrupts are taken before the next one, which is
+# where CPU runs its scheduler events and takes interrupts. Waiting machines (WAIT) skip to their next expiry.
+# Accesses that would raise an exception in CPU (unmapped addresses, invalid registers or addressing
+# modes, shifts by zero) mark the machine as faulted instead, leaving it in the state CPU would have.
+
+import numpy as np
+from array import array
+from ..cpu import CPU
+from ..devices.interrupts import DEFAULT_VECTOR_BASE, IRQ_TIMER
+from ..devices.dma import DMA_FILL_BYTE, DMA_CONTROL, DMA_STATUS, DMA_COPY, DMA_FILL, DMA_DONE, DMA_ERROR, SETUP_CYCLES, BYTES_PER_CYCLE
+from ..devices.timer import TIMER_CONTROL, TIMER_STATUS, TIMER_ENABLE, TIMER_MATCH
+from ..devices.console import FRAME_COUNT_HI, FRAME_COUNT_LO
+from ..status import FLAG_Z, FLAG_N, FLAG_C, FLAG_I
+
+RAM_END = 0xF000 # Exclusive
+CONSOLE_BASE_HI = 0xF000
+CONSOLE_BASE_LO = 0xF001
+CONSOLE_WIDTH_REG = 0xF002
+CONSOLE_HEIGHT_REG = 0xF003
+CONSOLE_WIDTH = 80
+CONSOLE_HEIGHT = 24
+KEYBRD_STATUS = 0xF005
+IRQ_PENDING = 0xF006
+IRQ_MASK = 0xF007
+IRQ_VECTOR_HI = 0xF008
+IRQ_VECTOR_LO = 0xF009
+DMA_START = 0xF00A # Registers in the order of DMAController.save_state
+DMA_END = DMA_START + DMA_STATUS
+TIMER_START = 0xF013 # Registers in the order of TimerDevice.save_state
+TIMER_END = TIMER_START + TIMER_STATUS
+FRAME_COMMIT_REG = 0xF01B
+FRAME_END = FRAME_COMMIT_REG + FRAME_COUNT_LO
+
+class VectorMachine():
+    def __init__(self, count):
+        self.count = count
+        self.reg = np.zeros((count, 9), dtype=np.int64) # R0 - R6, SP, PC (16-bit)
+        self.reg[:, 7] = 0xEFFF
+        self.status = np.zeros(count, dtype=np.int64)
+        self.clock_cycle = np.zeros(count, dtype=np.int64)
+        self.memory = np.zeros((count, 0x10000), dtype=np.uint8) # Only 0x0000 - 0xEFFF is used as RAM
+        self.console_base = np.zeros(count, dtype=np.int64)
+        self.frames = np.zeros(count, dtype=np.int64) # Committed console frames
+        self.irq_pending = np.zeros(count, dtype=np.int64)
+        self.irq_mask = np.zeros(count, dtype=np.int64)
+        self.vector_base = np.full(count, DEFAULT_VECTOR_BASE, dtype=np.int64)
+        self.dma = np.zeros((count, DMA_STATUS + 1), dtype=np.uint8)
+        self.timer = np.zeros((count, TIMER_STATUS + 1), dtype=np.uint8)
+        self.timer_expiry = np.full(count, -1, dtype=np.int64) # Clock cycle of the next expiry, -1 while stopped
+        self.timer_restart = np.zeros(count, dtype=bool) # Control register written, restarts after the instruction
+        self.waiting = np.zeros(count, dtype=bool) # Executed WAIT
+        self.stopped = np.zeros(count, dtype=bool) # Executed HALT
+        self.faulted = np.zeros(count, dtype=bool) # Would have raised an exception in CPU
+        self.timed_out = np.zeros(count, dtype=bool) # Reached max_cycles
+
+    def load_program(self, program, base_addr=0x0000):
+        program = np.frombuffer(bytes(program), dtype=np.uint8)
+        self.memory[:, base_addr : base_addr + len(program)] = program
+
+    def run(self, steps=-1, max_cycles=-1):
+        executed = 0
+        while steps != 0:
+            count = self.step(max_cycles)
+            if count == 0:
+                break
+            executed += count
+            if steps > 0:
+                steps -= 1
+        return executed
+
+    def step(self, max_cycles=-1):
+        running = ~(self.stopped | self.faulted | self.timed_out)
+        self.skip_waits(np.flatnonzero(running & self.waiting), max_cycles)
+        if max_cycles >= 0:
+            self.timed_out |= running & (self.clock_cycle >= max_cycles)
+            running &= ~self.timed_out
+        rows = np.flatnonzero(running & ~self.waiting)
+        if rows.size == 0:
+            return 0
+        self.take_interrupts(rows)
+        rows = rows[~self.faulted[rows]]
+
+        ok = np.ones(rows.size, dtype=bool)
+        instr = self.fetch_word(rows, ok)
+        self.faulted[rows[~ok]] = True
+        rows = rows[ok]
+        instr = instr[ok]
+
+        words, inverse, counts = np.unique(instr, return_inverse=True, return_counts=True)
+        groups = np.split(rows[np.argsort(inverse, kind="stable")], np.cumsum(counts)[:-1])
+        for word, group in zip(words, groups):
+            self.execute(int(word), group)
+        self.run_timers(rows[~(self.stopped[rows] | self.faulted[rows])])
+        return rows.size
+
+    def skip_waits(self, rows, max_cycles):
+        # Jumps to the next expiry, or to max_cycles if nothing could end the wait
+        target = np.where(self.timer_expiry[rows] >= 0, self.timer_expiry[rows], np.iinfo(np.int64).max)
+        if max_cycles >= 0:
+            target = np.minimum(target, max_cycles)
+        rows = rows[target != np.iinfo(np.int64).max]
+        self.clock_cycle[rows] = np.maximum(self.clock_cycle[rows], target[target != np.iinfo(np.int64).max])
+        self.run_timers(rows)
+
+    def run_timers(self, rows):
+        due = rows
+        while True:
+            due = due[(self.timer_expiry[due] >= 0) & (self.clock_cycle[due] >= self.timer_expiry[due])]
+            if due.size == 0:
+                break
+            for row in due:
+                self.expire_timer(row)
+        for row in rows[self.timer_restart[rows]]:
+            self.timer_restart[row] = False
+            enabled = self.timer[row, TIMER_CONTROL] & TIMER_ENABLE
+            self.timer_expiry[row] = self.clock_cycle[row] + self.timer_period(row) if enabled else -1
+
+    def timer_period(self, row):
+        reload = int(self.timer[row, 0]) << 8 | int(self.timer[row, 1])
+        return (reload or 0x10000) << (int(self.timer[row, TIMER_CONTROL]) >> 4)
+
+    def expire_timer(self, row):
+        count = ((int(self.timer[row, 4]) << 8 | int(self.timer[row, 5])) + 1) & 0xFFFF
+        if count >= int(self.timer[row, 2]) << 8 | int(self.timer[row, 3]):
+            count = 0
+            self.timer[row, TIMER_STATUS] |= TIMER_MATCH
+            self.irq_pending[row] |= 1 << IRQ_TIMER
+            if self.irq_mask[row] & (1 << IRQ_TIMER):
+                self.waiting[row] = False
+        self.timer[row, 4:6] = [count >> 8, count & 0xFF]
+        self.timer_expiry[row] += self.timer_period(row)
+
+    def take_interrupts(self, rows):
+        active = self.irq_pending[rows] & self.irq_mask[rows]
+        rows = rows[(active != 0) & ((self.status[rows] & FLAG_I) != 0)]
+        if rows.size == 0:
+            return
+        active = self.irq_pending[rows] & self.irq_mask[rows]
+        line = np.log2(active & -active).astype(np.int64) # Lowest active line
+        self.irq_pending[rows] &= ~(1 << line)
+        ok = np.ones(rows.size, dtype=bool)
+        self.push_word(rows, self.reg[rows, 8], ok)
+        self.push_word(rows, self.status[rows], ok)
+        self.status[rows[ok]] &= ~FLAG_I
+        handler = self.read_word(rows, self.vector_base[rows] + 2 * line, ok)
+        self.reg[rows[ok], 8] = handler[ok]
+        self.faulted[rows[~ok]] = True
+
+    def execute(self, instr, rows):
+        ok = np.ones(rows.size, dtype=bool)
+        instr_type = (instr >> 14) & 0b11
+        opcode = (instr >> 10) & 0b1111
+        reg = (instr >> 7) & 0b111
+        operand = (instr >> 3) & 0b1111
+        addressing_mode = instr & 0b111
+
+        if instr_type == 0b00: # General instructions
+            if opcode == 0b0001: # HALT
+                self.stopped[rows] = True
+            elif opcode == 0b0010: # RET
+                return_addr = self.pop_word(rows, ok)
+                self.reg[rows[ok], 8] = return_addr[ok] & 0xFFFF
+            elif opcode == 0b0011: # MOV
+                b = self.apply_addressing_mode(rows, addressing_mode, operand, ok)
+                self.write_register(rows, reg, b, ok)
+            elif opcode == 0b0100: # EI
+                self.status[rows] |= FLAG_I
+            elif opcode == 0b0101: # DI
+                self.status[rows] &= ~FLAG_I
+            elif opcode == 0b0110: # RETI
+                status = self.pop_word(rows, ok)
+                self.status[rows[ok]] = status[ok]
+                return_addr = self.pop_word(rows, ok)
+                self.reg[rows[ok], 8] = return_addr[ok] & 0xFFFF
+            elif opcode == 0b0111: # WAIT
+                mask = self.irq_mask[rows]
+                self.waiting[rows[(mask != 0) & (self.irq_pending[rows] & mask == 0)]] = True
+        elif instr_type == 0b01: # ALU operations
+            self.exec_alu(rows, opcode, reg, operand, addressing_mode, ok)
+        elif instr_type == 0b10 and (opcode & 0b1000) == 0: # Jump operations
+            self.exec_jump(rows, opcode & 0b111, operand, addressing_mode, ok)
+        elif instr_type == 0b10 and (opcode & 0b1000) != 0: # Memory/stack operations
+            self.exec_mem_stack(rows, opcode & 0b111, reg, operand, addressing_mode, ok)
+
+        self.faulted[rows[~ok]] = True
+
+    def exec_alu(self, rows, opcode, rA, b, addressing_mode, ok):
+        a = self.reg[rows, rA]
+        b = self.apply_addressing_mode(rows, addressing_mode, b, ok)
+        carry = None
+
+        if opcode == 0x0: # ADD
+            res = a + b
+            carry = res > 0xFFFF
+        elif opcode == 0x1: # SUB
+            res = a - b
+            carry = a < b
+        elif opcode == 0x2: # MUL
+            res = a * b
+            carry = res > 0xFFFF
+        elif opcode == 0x3: # MULH
+            res = (a * b) >> 16
+        elif opcode == 0x4: # AND
+            res = a & b
+        elif opcode == 0x5: # OR
+            res = a | b
+        elif opcode == 0x6: # XOR
+            res = a ^ b
+        elif opcode == 0x7: # SHL
+            shift = b & 0xF
+            res = a << shift
+            carry = (a >> (16 - shift)) & 1
+        elif opcode == 0x8: # ROL
+            shift = b & 0xF
+            res = (a << shift) | (a >> (16 - shift))
+            carry = res & 1
+        elif opcode == 0x9: # SHR
+            shift = b & 0xF
+            ok &= shift != 0 # Negative shift count
+            res = a >> shift
+            carry = (a >> np.maximum(shift - 1, 0)) & 1
+        elif opcode == 0xA: # ASR
+            shift = b & 0xF
+            ok &= shift != 0 # Negative shift count
+            res = (a >> shift) | np.where((a >> 15) & 1, 0xFFFF << (16 - shift), 0)
+            carry = (a >> np.maximum(shift - 1, 0)) & 1
+        elif opcode == 0xB: # ROR
+            shift = b & 0xF
+            res = (a >> shift) | (a << (16 - shift))
+            carry = (res >> 15) & 1
+        elif opcode == 0xC: # CMP
+            self.update_status_flags(rows, a - b, ok)
+            return
+        elif opcode == 0xD: # NOT
+            res = ~a
+        elif opcode == 0xE: # NEG
+            res = -a
+        else:
+            return
+
+        if carry is not None:
+            status = self.status[rows[ok]]
+            self.status[rows[ok]] = (status & ~FLAG_C) | np.where(carry[ok] != 0, FLAG_C, 0)
+        self.write_register(rows, rA, res, ok)
+
+    def exec_jump(self, rows, opcode, operand, addressing_mode, ok):
+        addr = self.apply_addressing_mode(rows, addressing_mode, operand, ok, fetch_addr=True)
+        status = self.status[rows]
+
+        if opcode == 0x0: # JMP
+            taken = np.ones(rows.size, dtype=bool)
+        elif opcode == 0x1: # JZ/JEQ
+            taken = (status & FLAG_Z) != 0
+        elif opcode == 0x2: # JNZ/JNE
+            taken = (status & FLAG_Z) == 0
+        elif opcode == 0x3: # JLT
+            taken = (status & FLAG_N) != 0
+        elif opcode == 0x4: # JGT
+            taken = (status & (FLAG_N | FLAG_Z)) == 0
+        elif opcode == 0x5: # JC
+            taken = (status & FLAG_C) != 0
+        elif opcode == 0x6: # JNC
+            taken = (status & FLAG_C) == 0
+        else: # CALL
+            self.push_word(rows, self.reg[rows, 8], ok)
+            taken = np.ones(rows.size, dtype=bool)
+
+        taken &= ok
+        self.reg[rows[taken], 8] = addr[taken] & 0xFFFF
+
+    def exec_mem_stack(self, rows, opcode, rA, operand, addressing_mode, ok):
+        if opcode == 0x0: # LOADB
+            addr = self.apply_addressing_mode(rows, addressing_mode, operand, ok, fetch_addr=True)
+            self.write_register(rows, rA, self.read_byte(rows, addr, ok), ok)
+        elif opcode == 0x1: # LOAD
+            addr = self.apply_addressing_mode(rows, addressing_mode, operand, ok, fetch_addr=True)
+            self.write_register(rows, rA, self.read_word(rows, addr, ok), ok)
+        elif opcode == 0x2: # STOREB
+            addr = self.apply_addressing_mode(rows, addressing_mode, operand, ok, fetch_addr=True)
+            self.write_byte(rows, addr, self.reg[rows, rA], ok)
+        elif opcode == 0x3: # STORE
+            addr = self.apply_addressing_mode(rows, addressing_mode, operand, ok, fetch_addr=True)
+            self.write_word(rows, addr, self.reg[rows, rA], ok)
+        elif opcode == 0x4: # POPB
+            self.write_register(rows, rA, self.pop_byte(rows, ok), ok)
+        elif opcode == 0x5: # POP
+            self.write_register(rows, rA, self.pop_word(rows, ok), ok)
+        elif opcode == 0x6: # PUSHB
+            value = self.apply_addressing_mode(rows, addressing_mode, operand, ok)
+            self.push_byte(rows, value, ok)
+        else: # PUSH
+            value = self.apply_addressing_mode(rows, addressing_mode, operand, ok)
+            self.push_word(rows, value, ok)
+
+    def apply_addressing_mode(self, rows, addressing_mode, operand, ok, fetch_addr=False):
+        if addressing_mode == 0x0: # Imm4
+            return np.full(rows.size, operand, dtype=np.int64)
+        elif addressing_mode == 0x1: # Imm8
+            return self.fetch_byte(rows, ok)
+        elif addressing_mode == 0x2: # Imm16
+            return self.fetch_word(rows, ok)
+        elif addressing_mode == 0x3: # Reg
+            return self.read_register(rows, operand, ok)
+        elif addressing_mode == 0x4: # Indirect Reg
+            addr = self.read_register(rows, operand, ok)
+            return self.read_word(rows, addr, ok) if not fetch_addr else addr
+        elif addressing_mode == 0x5: # Indirect Reg + Imm16(signed)
+            offset = self.fetch_word(rows, ok)
+            addr = self.read_register(rows, operand, ok) + ((offset ^ 0x8000) - 0x8000)
+            return self.read_word(rows, addr, ok) if not fetch_addr else addr
+        elif addressing_mode == 0x6: # Indirect Imm16
+            addr = self.fetch_word(rows, ok)
+            return self.read_word(rows, addr, ok) if not fetch_addr else addr
+        else: # Not implemented
+            ok[:] = False
+            return np.zeros(rows.size, dtype=np.int64)
+
+    def read_register(self, rows, rN, ok):
+        if rN > 8:
+            ok[:] = False
+            return np.zeros(rows.size, dtype=np.int64)
+        return self.reg[rows, rN]
+
+    def write_register(self, rows, rN, value, ok):
+        value = value[ok] & 0xFFFF
+        self.reg[rows[ok], rN] = value
+        self.set_status_flags(rows[ok], value)
+
+    def update_status_flags(self, rows, value, ok):
+        self.set_status_flags(rows[ok], value[ok] & 0xFFFF)
+
+    def set_status_flags(self, rows, value):
+        status = self.status[rows] & ~(FLAG_Z | FLAG_N)
+        self.status[rows] = status | np.where(value == 0, FLAG_Z, 0) | ((value >> 14) & FLAG_N)
+
+    def fetch_byte(self, rows, ok):
+        value = self.read_byte(rows, self.reg[rows, 8], ok)
+        self.advance_program_counter(rows[ok], 1)
+        return value
+
+    def fetch_word(self, rows, ok):
+        value = self.read_word(rows, self.reg[rows, 8], ok)
+        self.advance_program_counter(rows[ok], 2)
+        return value
+
+    def advance_program_counter(self, rows, length):
+        self.reg[rows, 8] = (self.reg[rows, 8] + length) & 0xFFFF
+        self.clock_cycle[rows] += 1
+
+    def read_byte(self, rows, addr, ok):
+        addr = addr & 0xFFFF
+        value = self.memory[rows, addr].astype(np.int64)
+        mmio = addr >= RAM_END
+        if mmio.any():
+            base = self.console_base[rows]
+            value = np.where(addr == CONSOLE_BASE_HI, base >> 8, value)
+            value = np.where(addr == CONSOLE_BASE_LO, base & 0xFF, value)
+            value = np.where(addr == CONSOLE_WIDTH_REG, CONSOLE_WIDTH, value)
+            value = np.where(addr == CONSOLE_HEIGHT_REG, CONSOLE_HEIGHT, value)
+            value = np.where(addr == KEYBRD_STATUS, 0, value)
+            value = np.where(addr == IRQ_PENDING, self.irq_pending[rows], value)
+            value = np.where(addr == IRQ_MASK, self.irq_mask[rows], value)
+            value = np.where(addr == IRQ_VECTOR_HI, self.vector_base[rows] >> 8, value)
+            value = np.where(addr == IRQ_VECTOR_LO, self.vector_base[rows] & 0xFF, value)
+            dma = (addr >= DMA_START) & (addr <= DMA_END)
+            value = np.where(dma, self.dma[rows, np.where(dma, addr - DMA_START, 0)], value)
+            timer = (addr >= TIMER_START) & (addr <= TIMER_END)
+            value = np.where(timer, self.timer[rows, np.where(timer, addr - TIMER_START, 0)], value)
+            value = np.where(addr == FRAME_COMMIT_REG, 0, value)
+            value = np.where(addr == FRAME_COMMIT_REG + FRAME_COUNT_HI, self.frames[rows] >> 8, value)
+            value = np.where(addr == FRAME_COMMIT_REG + FRAME_COUNT_LO, self.frames[rows] & 0xFF, value)
+            # Reading the empty keyboard data register fails too
+            ok &= (addr <= CONSOLE_HEIGHT_REG) | ((addr >= KEYBRD_STATUS) & (addr <= FRAME_END))
+        return value
+
+    def read_word(self, rows, addr, ok):
+        hi = self.read_byte(rows, addr, ok)
+        lo = self.read_byte(rows, addr + 1, ok)
+        return (hi << 8) | lo
+
+    def write_byte(self, rows, addr, value, ok):
+        addr = addr & 0xFFFF
+        value = value & 0xFF
+        ok &= (addr <= CONSOLE_HEIGHT_REG) | ((addr >= IRQ_PENDING) & (addr <= FRAME_END)) # No device mapped or the read-only keyboard
+        ram = ok & (addr < RAM_END)
+        self.memory[rows[ram], addr[ram]] = value[ram]
+        if not ram.all():
+            hi = ok & (addr == CONSOLE_BASE_HI)
+            self.console_base[rows[hi]] = (self.console_base[rows[hi]] & 0x00FF) | (value[hi] << 8)
+            lo = ok & (addr == CONSOLE_BASE_LO)
+            self.console_base[rows[lo]] = (self.console_base[rows[lo]] & 0xFF00) | value[lo]
+            pending = ok & (addr == IRQ_PENDING)
+            self.irq_pending[rows[pending]] &= ~value[pending]
+            mask = ok & (addr == IRQ_MASK)
+            self.irq_mask[rows[mask]] = value[mask]
+            hi = ok & (addr == IRQ_VECTOR_HI)
+            self.vector_base[rows[hi]] = (self.vector_base[rows[hi]] & 0x00FF) | (value[hi] << 8)
+            lo = ok & (addr == IRQ_VECTOR_LO)
+            self.vector_base[rows[lo]] = (self.vector_base[rows[lo]] & 0xFF00) | value[lo]
+            dma = ok & (addr >= DMA_START) & (addr < DMA_END) # The status register is read only
+            self.dma[rows[dma], addr[dma] - DMA_START] = value[dma]
+            for row in rows[ok & (addr == DMA_START + DMA_CONTROL)]:
+                self.dma_transfer(row)
+            timer = ok & (addr >= TIMER_START) & (addr < TIMER_END)
+            self.timer[rows[timer], addr[timer] - TIMER_START] = value[timer]
+            status = ok & (addr == TIMER_END)
+            self.timer[rows[status], TIMER_STATUS] &= ~value[status].astype(np.uint8)
+            self.timer_restart[rows[ok & (addr == TIMER_START + TIMER_CONTROL)]] = True
+            commit = rows[ok & (addr == FRAME_COMMIT_REG)]
+            self.frames[commit] = (self.frames[commit] + 1) & 0xFFFF
+
+    def dma_transfer(self, row):
+        source, destination, length = (int(self.dma[row, i]) << 8 | int(self.dma[row, i + 1]) for i in (0, 2, 4))
+        mode = self.dma[row, DMA_CONTROL]
+        if destination + length > RAM_END or mode not in (DMA_COPY, DMA_FILL) or (mode == DMA_COPY and source + length > RAM_END):
+            self.dma[row, DMA_STATUS] = DMA_DONE | DMA_ERROR
+            return
+        if mode == DMA_COPY:
+            self.memory[row, destination : destination + length] = self.memory[row, source : source + length].copy()
+        else:
+            self.memory[row, destination : destination + length] = self.dma[row, DMA_FILL_BYTE]
+        self.dma[row, DMA_STATUS] = DMA_DONE
+        self.clock_cycle[row] += SETUP_CYCLES + -(-length // BYTES_PER_CYCLE)
+
+    def write_word(self, rows, addr, value, ok):
+        self.write_byte(rows, addr, value >> 8, ok)
+        self.write_byte(rows, addr + 1, value, ok)
+
+    def update_stack_addr(self, rows, offset):
+        return ((self.reg[rows, 7] + offset) | 0xE000) & 0xFFFF
+
+    def pop_byte(self, rows, ok):
+        sp = self.update_stack_addr(rows, offset=1)
+        self.reg[rows[ok], 7] = sp[ok]
+        return self.read_byte(rows, sp, ok)
+
+    def pop_word(self, rows, ok):
+        sp = self.update_stack_addr(rows, offset=2)
+        self.reg[rows[ok], 7] = sp[ok]
+        return self.read_word(rows, sp - 1, ok)
+
+    def push_byte(self, rows, byte, ok):
+        self.write_byte(rows, self.reg[rows, 7], byte, ok)
+        sp = self.update_stack_addr(rows, offset=-1)
+        self.reg[rows[ok], 7] = sp[ok]
+
+    def push_word(self, rows, word, ok):
+        self.write_word(rows, self.reg[rows, 7] - 1, word, ok)
+        sp = self.update_stack_addr(rows, offset=-2)
+        self.reg[rows[ok], 7] = sp[ok]
+
+    def to_cpu(self, i, engine="interpreter"):
+        cpu = CPU(engine=engine)
+        cpu.reg[:] = array('H', self.reg[i].tolist())
+        cpu.status = int(self.status[i])
+        cpu.clock_cycle = int(self.clock_cycle[i])
+        cpu.stop = bool(self.stopped[i])
+        cpu.bus.memory.write_bytes(0x0000, self.memory[i, :RAM_END].tobytes())
+        cpu.bus.console.base_addr = int(self.console_base[i])
+        cpu.bus.console.frames = int(self.frames[i])
+        cpu.bus.interrupts.mask = int(self.irq_mask[i])
+        cpu.bus.interrupts.vector_base = int(self.vector_base[i])
+        cpu.bus.dma.load_state(self.dma[i].tobytes())
+        cpu.bus.timer.load_state(self.timer_state(i))
+        cpu.bus.interrupts.pending = int(self.irq_pending[i])
+        cpu.bus.interrupts.check()
+        cpu.waiting = bool(self.waiting[i])
+        return cpu
+
+    def timer_state(self, i): # Like TimerDevice.save_state
+        remaining = int(self.timer_expiry[i] - self.clock_cycle[i]) if self.timer_expiry[i] >= 0 else -1
+        return self.timer[i].tobytes() + remaining.to_bytes(8, "big", signed=True)
+
+    def matches_cpu(self, i, cpu):
+        return (
+            list(cpu.reg) == self.reg[i].tolist()
+            and cpu.status == self.status[i]
+            and cpu.clock_cycle == self.clock_cycle[i]
+            and cpu.stop == self.stopped[i]
+            and bytes(cpu.bus.memory.data) == self.memory[i, :RAM_END].tobytes()
+            and cpu.bus.console.base_addr == self.console_base[i]
+            and cpu.bus.console.frames == self.frames[i]
+            and cpu.bus.interrupts.mask == self.irq_mask[i]
+            and cpu.bus.interrupts.vector_base == self.vector_base[i]
+            and cpu.bus.dma.save_state() == self.dma[i].tobytes()
+            and cpu.bus.timer.save_state() == self.timer_state(i)
+            and cpu.bus.interrupts.pending == self.irq_pending[i]
+            and cpu.waiting == self.waiting[i]
+        )
+
+def cross_check(machine, indices, steps):
+    # Runs the selected machines on the scalar CPU next to the lockstep engine and returns mismatching ones
+    cpus = [machine.to_cpu(i) for i in indices]
+    finished = [machine.stopped[i] or machine.faulted[i] or machine.timed_out[i] for i in indices]
+    machine.run(steps)
+    mismatches = []
+    for i, cpu, is_finished in zip(indices, cpus, finished):
+        try:
+            if not is_finished:
+                cpu.run(steps)
+        except Exception:
+            pass # The vector engine marks the machine as faulted instead
+        if not machine.matches_cpu(i, cpu):
+            mismatches.append(i)
+    return mismatches
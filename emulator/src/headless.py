@@ -0,0 +1,89 @@
+# Headless I/O. Without a terminal the keyboard is fed from a key script and the console is only read from
+# memory when a frame is captured, both are scheduler events so the run loop never touches the host.
+# Key scripts have one entry per line, the clock cycle at which the keys arrive followed by a single space
+# and the keys, with Python escapes for control and extended keys. Lines starting with '#' are comments:
+#   200000 hello world\n
+#   350000 \xe0\x48
+# Keys arrive at the end of the instruction that crosses their cycle, like input from the input thread.
+# Frames can also be captured whenever the guest commits one (see ConsoleDevice), at the end of the
+# committing instruction.
+
+import codecs
+import json
+
+def parse_key_script(text):
+    events = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        cycle, _, keys = line.partition(" ")
+        try:
+            data = codecs.decode(keys, "unicode_escape").encode("latin-1")
+            events.append((int(cycle, 0), data))
+        except ValueError:
+            raise ValueError(f"Invalid key script line {number}: {line!r}")
+        if not data:
+            raise ValueError(f"Key script line {number} has no keys: {line!r}")
+    return sorted(events, key=lambda event: event[0]) # Stable, keys for the same cycle keep their order
+
+def read_key_script(filename):
+    with open(filename) as script_file:
+        return parse_key_script(script_file.read())
+
+def parse_cycles(text): # "100000,200000" -> [100000, 200000]
+    return [int(cycle, 0) for cycle in text.split(",") if cycle.strip()]
+
+def console_frame(cpu):
+    console = cpu.bus.console
+    memory = cpu.bus.memory
+    index = console.base_addr - memory.min_address
+    screen_data = memory.data[index : index + console.width * console.height]
+    lines = []
+    for i in range(0, len(screen_data), console.width):
+        lines.append(''.join(chr(c) if c >= 32 else ' ' for c in screen_data[i:i+console.width]))
+    return {"clock_cycle": cpu.clock_cycle, "frame": console.frames, "base_addr": console.base_addr, "width": console.width,
+            "height": console.height, "lines": lines}
+
+class HeadlessIO():
+    def __init__(self, keys=(), capture_cycles=(), capture_every=None, capture_commits=False):
+        self.keys = keys
+        self.capture_cycles = capture_cycles
+        self.capture_every = capture_every
+        self.capture_commits = capture_commits
+        self.frames = []
+        self.events = []
+        self.cpu = None
+
+    def attach(self, cpu):
+        self.cpu = cpu
+        scheduler = cpu.scheduler
+        for cycle, data in self.keys:
+            self.events.append(scheduler.schedule(cycle, lambda data=data: cpu.bus.keyboard.put_input(data)))
+        for cycle in self.capture_cycles:
+            self.events.append(scheduler.schedule(cycle, self.capture))
+        if self.capture_every:
+            self.events.append(scheduler.every(self.capture_every, self.capture, cpu.clock_cycle))
+        if self.capture_commits:
+            cpu.bus.console.on_commit = self.capture
+
+    def detach(self):
+        for event in self.events:
+            self.cpu.scheduler.cancel(event)
+        self.events = []
+        if self.capture_commits:
+            self.cpu.bus.console.on_commit = None
+
+    def capture(self):
+        if not self.frames or self.frames[-1]["clock_cycle"] != self.cpu.clock_cycle:
+            self.frames.append(console_frame(self.cpu))
+
+    def format_frames(self):
+        text = []
+        for frame in self.frames:
+            text.append(f"--- cycle {frame['clock_cycle']} ---")
+            text += [line.rstrip() for line in frame["lines"]]
+        return "\n".join(text)
+
+    def write_frames(self, filename):
+        with open(filename, "w") as frames_file:
+            json.dump(self.frames, frames_file, indent=2)
@@ -0,0 +1,104 @@
+# Idle loop detection. Every IDLE_CHECK_INTERVAL cycles one loop iteration is executed with a bus that
+# records what the guest touches. If the iteration returns to its start address with the same registers
+# and flags, without writing anything and only reading RAM or side effect free registers (like the
+# keyboard status), every further iteration is identical until a device or the host changes something.
+# The detector then fast-forwards the clock by whole iterations up to the next scheduler event that isn't
+# background work (like these checks), so the CPU state is exactly what executing them would give. With
+# nothing scheduled it blocks on a host event (key press, pause, stop) instead.
+
+from array import array
+
+IDLE_CHECK_INTERVAL = 4096 # Cycles between checks while the guest is busy
+MAX_LOOP_LENGTH = 16 # Instructions
+
+class PollingBus():
+    def __init__(self, bus):
+        self.bus = bus
+        self.pure = True # No writes and no reads with side effects
+
+    def __getattr__(self, name): # Devices by name, e.g. the interrupt controller for EI and RETI
+        return getattr(self.bus, name)
+
+    def read_byte(self, addr):
+        addr &= 0xFFFF
+        if self.bus.ram_pages[addr >> 8] is None and not self.bus.get_device(addr).is_pollable(addr):
+            self.pure = False
+        return self.bus.read_byte(addr)
+
+    def read_word(self, addr):
+        hi = self.read_byte(addr)
+        lo = self.read_byte(addr + 1)
+        return (hi << 8) | lo
+
+    def write_byte(self, addr, value):
+        self.pure = False
+        self.bus.write_byte(addr, value)
+
+    def write_word(self, addr, value):
+        self.pure = False
+        self.bus.write_word(addr, value)
+
+class IdleDetector():
+    def __init__(self, cpu, interval=IDLE_CHECK_INTERVAL):
+        self.cpu = cpu
+        self.interval = interval
+        self.enabled = True
+        self.due = False # Set by the scheduler, stays set while the guest is idle
+        self.skipped_cycles = 0
+        cpu.scheduler.every(interval, self.request_check, cpu.clock_cycle, background=True)
+
+    def request_check(self):
+        self.due = self.enabled
+
+    # Used by CPU.run instead of a normal chunk while a check is due, returns the number of executed instructions
+    def run(self, steps=-1, max_cycles=-1):
+        cpu = self.cpu
+        scheduler = cpu.scheduler
+        cpu.host_event.clear() # Anything happening from here on ends the fast-forward below
+        start_reg = array("H", cpu.reg) # A copy, also when cpu.reg is a view of shared memory
+        start_status = cpu.status
+        start_cycle = cpu.clock_cycle
+        counters = cpu.counters
+        checkpoint = counters.checkpoint()
+        instrs = []
+
+        limit = MAX_LOOP_LENGTH if steps < 0 else min(steps, MAX_LOOP_LENGTH)
+        executed = 0
+        bus = cpu.bus
+        probe = cpu.bus = PollingBus(bus)
+        try:
+            while executed < limit and cpu.clock_cycle < scheduler.deadline:
+                instr = cpu.fetch_word()
+                cpu.decode_execute(instr)
+                counters.instructions[instr] += 1
+                instrs.append(instr)
+                executed += 1
+                if cpu.reg[8] == start_reg[8]:
+                    break
+        finally:
+            cpu.bus = bus
+
+        if executed == 0 or cpu.reg[8] != start_reg[8]:
+            if executed == MAX_LOOP_LENGTH or cpu.stop: # Otherwise the check was cut short and is repeated
+                self.due = False
+            return executed
+        if not probe.pure or array("H", cpu.reg) != start_reg or cpu.status != start_status or cpu.stop:
+            self.due = False
+            return executed
+
+        wakeup = cpu.next_wakeup(max_cycles)
+        if wakeup == float("inf") and steps < 0:
+            cpu.publish_state()
+            cpu.host_event.wait()
+        if cpu.host_event.is_set(): # Woken up, the next check sees what changed
+            return executed
+        cycles = cpu.clock_cycle - start_cycle
+        # The trial iteration may have crossed the wakeup already
+        iterations = max(0, (wakeup - cpu.clock_cycle) // cycles)
+        if steps > 0:
+            iterations = min(iterations, (steps - executed) // executed)
+        iterations = int(iterations)
+        cpu.clock_cycle += iterations * cycles
+        counters.repeat(checkpoint, instrs, iterations)
+        self.skipped_cycles += iterations * cycles
+        return executed + iterations * executed
@@ -1,23 +1,135 @@
 from argparse import ArgumentParser
-from .cpu import CPU
-from .ui.ui import UI
+from .cpu import CPU, ENGINES, RAM_SIZE
+from .ui.frame import FrameThread
+from .ui.remote import UIProcess
+from .shared_state import SharedState
+from .pacing import ClockPacer
+from .snapshot import read_state_file, write_state_file
+from .trace import Tracer, DEFAULT_CAPACITY
+from .headless import HeadlessIO, read_key_script, parse_cycles
+from .debugger import parse_breakpoint, parse_watchpoint
 from time import perf_counter
 from blessed import Terminal
 
-def execute_program(filename, max_cycles, term=None):
-    with open(filename, "rb") as program:
-        cpu = CPU(term)
-        cpu.bus.memory.load_program(program.read())
-        ui = UI(filename, cpu) if term else None
-        start = perf_counter()
-        cpu.run(max_cycles=max_cycles, ui=ui)
-        print(f"Executed '{filename}' in {(perf_counter() - start):.05f}s")
+def load_program(filename, term=None, engine="interpreter", base_addr=0x0000, ram_image=None, shared_image=True, shared=None):
+    cpu = CPU(term, engine, shared)
+    if ram_image:
+        cpu.bus.memory.map_image(ram_image, shared_image)
+    cpu.bus.memory.load_file(filename, base_addr)
+    cpu.pc = base_addr # Programs start where they are loaded
+    return cpu
+
+def execute_program(filename, max_cycles, term=None, engine="interpreter", clock_hz=None, load_state=None, save_state=None,
+                    trace=None, trace_last=None, counters=None, counters_format="json", headless=None,
+                    breakpoints=(), watchpoints=(), base_addr=0x0000, ram_image=None, shared_image=True, ui_process=False,
+                    render_on_commit=False):
+    shared = SharedState(RAM_SIZE) if term and ui_process else None
+    cpu = load_program(filename, term, engine, base_addr, ram_image, shared_image, shared)
+    if load_state:
+        read_state_file(cpu, load_state)
+    if headless:
+        headless.attach(cpu)
+    cpu.debugger.action = "pause" if term else "stop" # Nothing could continue a paused headless run
+    for addr, condition in breakpoints:
+        cpu.debugger.add_breakpoint(addr, condition)
+    for start, end, access in watchpoints:
+        cpu.debugger.add_watchpoint(start, end, access)
+    frames = FrameThread(filename, cpu, render_on_commit=render_on_commit) if term and not shared else None
+    remote_ui = UIProcess(filename, shared, render_on_commit=render_on_commit) if shared else None
+    if remote_ui and render_on_commit: # The UI process sees new frames as soon as they are committed
+        cpu.bus.console.on_commit = lambda: shared.publish(cpu)
+    pacer = ClockPacer(cpu, clock_hz) if clock_hz else None
+    tracer = Tracer(cpu, trace, trace_last or DEFAULT_CAPACITY, keep_last=bool(trace_last)) if trace else None
+    start = perf_counter()
+    if frames:
+        frames.start()
+    if remote_ui:
+        remote_ui.start()
+    if pacer:
+        pacer.start()
+    if tracer:
+        tracer.start()
+    try:
+        cpu.run(max_cycles=max_cycles)
+    finally:
+        if headless:
+            headless.detach()
+        if tracer:
+            tracer.close()
+        if pacer:
+            pacer.stop()
+        if save_state:
+            write_state_file(cpu, save_state)
+        if counters:
+            cpu.counters.write(counters, counters_format)
+        if frames:
+            frames.stop()
+        if remote_ui:
+            remote_ui.stop()
+            shared.close()
+    print(f"Executed '{filename}' in {(perf_counter() - start):.05f}s")
+    for clock_cycle, pc, point, addr in cpu.debugger.hits:
+        print(f"Hit {point} at {pc:04X}, address {addr:04X}, cycle {clock_cycle}")
+    if pacer:
+        print(pacer.report())
+    return cpu
 
 def main():
     parser = ArgumentParser(prog="YR-µ16 Emulator")
     parser.add_argument("filename", help="program binary to execute")
     parser.add_argument("--max-cycles", type=int, default=-1, help="maximum CPU cycles to execute before exiting")
+    parser.add_argument("--engine", choices=ENGINES, default="interpreter", help="instruction execution engine")
+    parser.add_argument("--clock-hz", type=float, help="run at a fixed guest clock frequency instead of as fast as possible")
+    parser.add_argument("--load-state", help="save state file to resume from")
+    parser.add_argument("--save-state", help="file to write a save state to when execution ends")
+    parser.add_argument("--trace", help="record an execution trace to this file (inspect with emulator.src.trace)")
+    parser.add_argument("--trace-last", type=int, help="only keep the last N instructions in the trace")
+    parser.add_argument("--counters", help="file to write the performance counters to when execution ends")
+    parser.add_argument("--counters-format", choices=["json", "prometheus"], default="json", help="performance counter file format")
+    parser.add_argument("--break", dest="breakpoints", type=parse_breakpoint, action="append", default=[],
+                        help="pause at this address, optionally only if a condition holds (0x0100 or '0x0100:r0 == 5')")
+    parser.add_argument("--watch", dest="watchpoints", type=parse_watchpoint, action="append", default=[],
+                        help="pause after an access to an address range (0xC000-0xC7FF, with :r or :w for reads or writes only)")
+    parser.add_argument("--load-address", type=lambda text: int(text, 0), default=0x0000, help="address to load the program at and start from")
+    parser.add_argument("--ram-image", help="back RAM with this memory image file (mmap), changes are written to the file")
+    parser.add_argument("--private-image", action="store_true", help="map the RAM image copy-on-write instead, leaving the file unchanged")
+    parser.add_argument("--ui-process", action="store_true", help="draw the UI from a separate process that reads RAM and registers from shared memory")
+    parser.add_argument("--render-on-commit", action="store_true",
+                        help="only redraw the console when the program commits a frame (writes the frame register 0xF01B)")
+    parser.add_argument("--headless", action="store_true", help="run without a terminal, the console is only read for captured frames")
+    parser.add_argument("--keys", help="headless: key script with the keyboard input (lines of 'CYCLE KEYS')")
+    parser.add_argument("--capture", type=parse_cycles, default=[], help="headless: clock cycles to capture console frames at (comma separated)")
+    parser.add_argument("--capture-every", type=int, help="headless: capture a console frame every N clock cycles")
+    parser.add_argument("--capture-commits", action="store_true", help="headless: capture a console frame at every frame commit")
+    parser.add_argument("--frames", help="headless: JSON file to write the captured frames to (default: print them)")
     args = parser.parse_args()
+    if args.ui_process and args.ram_image:
+        parser.error("--ui-process can't be combined with --ram-image, RAM already lives in shared memory")
+    if args.headless:
+        run_headless(args)
+        return
     term = Terminal()
     with term.fullscreen(), term.hidden_cursor(), term.cbreak():
-        execute_program(args.filename, args.max_cycles, term)
\ No newline at end of file
+        execute_program(args.filename, args.max_cycles, term, args.engine, args.clock_hz, args.load_state, args.save_state,
+                        args.trace, args.trace_last, args.counters, args.counters_format, None, args.breakpoints, args.watchpoints,
+                        args.load_address, args.ram_image, not args.private_image, args.ui_process,
+                        args.render_on_commit)
+
+def run_headless(args):
+    keys = read_key_script(args.keys) if args.keys else []
+    headless = HeadlessIO(keys, args.capture, args.capture_every, args.capture_commits)
+    try:
+        execute_program(args.filename, args.max_cycles, None, args.engine, args.clock_hz, args.load_state, args.save_state,
+                        args.trace, args.trace_last, args.counters, args.counters_format, headless, args.breakpoints, args.watchpoints,
+                        args.load_address, args.ram_image, not args.private_image)
+    except RuntimeError:
+        if args.max_cycles < 0 or headless.cpu.clock_cycle < args.max_cycles:
+            raise
+        print(f"Stopped after {args.max_cycles} cycles") # Programs that never halt end at the cycle limit
+    finally:
+        if headless.cpu:
+            headless.capture() # Final frame, also after errors
+        if args.frames:
+            headless.write_frames(args.frames)
+        else:
+            print(headless.format_frames())
@@ -0,0 +1,48 @@
+from time import perf_counter, sleep
+
+BATCH_SECONDS = 0.01 # Guest time executed between two pacing sleeps
+MAX_LAG = 0.1 # Falling further behind (pauses, slow host) restarts the pace instead of catching up in a burst
+
+class ClockPacer():
+    def __init__(self, cpu, clock_hz, batch_seconds=BATCH_SECONDS):
+        if clock_hz <= 0:
+            raise ValueError(f"Invalid clock frequency: {clock_hz}")
+        self.cpu = cpu
+        self.clock_hz = clock_hz
+        self.batch_cycles = max(1, round(clock_hz * batch_seconds))
+        self.event = None
+
+    def start(self):
+        self.start_time = self.end_time = self.reference_time = perf_counter()
+        self.start_cycle = self.end_cycle = self.reference_cycle = self.cpu.clock_cycle
+        self.event = self.cpu.scheduler.every(self.batch_cycles, self.pace, self.cpu.clock_cycle)
+
+    def stop(self):
+        self.cpu.scheduler.cancel(self.event)
+        self.end_time = perf_counter()
+        self.end_cycle = self.cpu.clock_cycle
+
+    def pace(self):
+        # Sleep until the wall clock catches up with the guest clock, the target is absolute so oversleeping
+        # in one batch is made up in the next one
+        target = self.reference_time + (self.cpu.clock_cycle - self.reference_cycle) / self.clock_hz
+        delay = target - perf_counter()
+        if delay > 0:
+            sleep(delay)
+        elif delay < -MAX_LAG:
+            self.reference_time = perf_counter()
+            self.reference_cycle = self.cpu.clock_cycle
+
+    @property
+    def achieved_hz(self):
+        elapsed = self.end_time - self.start_time
+        return (self.end_cycle - self.start_cycle) / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        return f"Clock: {format_hz(self.achieved_hz)} achieved, {format_hz(self.clock_hz)} target"
+
+def format_hz(hz):
+    for unit, scale in (("MHz", 1e6), ("kHz", 1e3)):
+        if hz >= scale:
+            return f"{hz / scale:.3f} {unit}"
+    return f"{hz:.1f} Hz"
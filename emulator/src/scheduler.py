@@ -0,0 +1,58 @@
+from heapq import heappush, heappop
+from itertools import count
+
+class Event():
+    def __init__(self, cycle, callback, period=None, background=False):
+        self.cycle = cycle
+        self.callback = callback
+        self.period = period
+        self.cancelled = False
+        self.background = background # Can't change the guest (idle checks, publishing), idle guests skip past it
+
+class Scheduler():
+    def __init__(self):
+        self.events = [] # Heap of (cycle, sequence, event)
+        self.sequence = count() # Keeps events with the same cycle in scheduling order
+        self.deadline = 0 # Clock cycle at which the currently running chunk has to stop
+
+    def schedule(self, cycle, callback, background=False):
+        event = Event(cycle, callback, background=background)
+        heappush(self.events, (cycle, next(self.sequence), event))
+        return event
+
+    def every(self, period, callback, start=0, background=False):
+        event = Event(start + period, callback, period, background)
+        heappush(self.events, (event.cycle, next(self.sequence), event))
+        return event
+
+    def cancel(self, event):
+        event.cancelled = True
+
+    def rebase(self, offset): # Moves all pending events, e.g. after the clock was restored from a save state
+        self.events = [(cycle + offset, sequence, event) for cycle, sequence, event in self.events]
+        for _, _, event in self.events:
+            event.cycle += offset
+
+    def interrupt(self): # Makes the running chunk stop after the current instruction
+        self.deadline = 0
+
+    @property
+    def next_cycle(self):
+        while self.events and self.events[0][2].cancelled:
+            heappop(self.events)
+        return self.events[0][0] if self.events else float("inf")
+
+    @property
+    def next_wakeup(self): # First event that isn't background work, waiting guests can skip straight to it
+        return min((cycle for cycle, _, event in self.events if not (event.cancelled or event.background)), default=float("inf"))
+
+    def run_due(self, clock_cycle):
+        while self.events and self.events[0][0] <= clock_cycle:
+            _, _, event = heappop(self.events)
+            if event.cancelled:
+                continue
+            event.callback()
+            if event.period:
+                while event.cycle <= clock_cycle: # Skip periods that were missed by multi-cycle instructions
+                    event.cycle += event.period
+                heappush(self.events, (event.cycle, next(self.sequence), event))
@@ -0,0 +1,51 @@
+# Machine state in a multiprocessing.shared_memory block, so another process (the UI, see ui/remote.py) can
+# read it without going through the CPU. Layout of the block:
+#   reg[9]:u16 | status:u16 console_base:u16 run_flags:u8 clock_cycle:u64 console_frames:u16 | RAM (from RAM_OFFSET)
+# Registers and RAM are the live machine state, the CPU and its engines work on them directly. Status,
+# clock cycle, console base address and frame counter and the run flags stay plain attributes of the CPU
+# (they change on nearly every instruction), publish() copies them into the header every PUBLISH_RATE cycles.
+
+from multiprocessing import shared_memory
+import struct
+
+REGISTERS = struct.Struct("=9H")
+HEADER = struct.Struct("=HHBQH")
+HEADER_OFFSET = REGISTERS.size
+RAM_OFFSET = 64
+PUBLISH_RATE = 10_000
+
+# Run flags
+STOPPED = 0b01
+PAUSED = 0b10
+
+class SharedState():
+    def __init__(self, ram_size, name=None):
+        self.owner = name is None # The creating process unlinks the block when closing it
+        self.shm = shared_memory.SharedMemory(name, create=self.owner, size=RAM_OFFSET + ram_size if self.owner else 0)
+        self.name = self.shm.name
+        self.ram_size = ram_size
+        self.reg = self.shm.buf[:REGISTERS.size].cast("H")
+        self.ram = self.shm.buf[RAM_OFFSET : RAM_OFFSET + ram_size]
+
+    def publish(self, cpu):
+        run_flags = (STOPPED if cpu.stop else 0) | (PAUSED if cpu.paused else 0)
+        HEADER.pack_into(self.shm.buf, HEADER_OFFSET, cpu.status, cpu.bus.console.base_addr, run_flags, cpu.clock_cycle,
+                         cpu.bus.console.frames)
+
+    def header(self): # (status, console_base, run_flags, clock_cycle, console_frames)
+        return HEADER.unpack_from(self.shm.buf, HEADER_OFFSET)
+
+    def set_stopped(self): # Also for runs that end without a halt, e.g. at max cycles
+        self.shm.buf[HEADER_OFFSET + 4] |= STOPPED
+
+    @property
+    def stopped(self):
+        return bool(self.header()[2] & STOPPED)
+
+    def close(self):
+        # Releases the views handed out as cpu.reg and RAM, a CPU that uses them can't run afterwards
+        self.reg.release()
+        self.ram.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,80 @@
+# Versioned binary save states. A snapshot is a header, the CPU state and one section per device that
+# has state (see Device.save_state), tagged with the device name:
+#   "YRSS" version:u16 | reg[9]:u16 status:u16 clock_cycle:u64 stop:u8 run_flags:u8 | count:u16 | (name_len:u8 name data_len:u32 data)*
+# The run flags keep a CPU parked in WAIT waiting and an interrupt request that wasn't handled yet.
+# Restoring works in place, so engines that captured cpu.reg or the memory bytearray keep working.
+
+from array import array
+import struct
+
+MAGIC = b"YRSS"
+VERSION = 2
+
+HEADER = struct.Struct("<4sH")
+CPU_STATE = struct.Struct("<9HHQBB")
+SECTION_COUNT = struct.Struct("<H")
+SECTION = struct.Struct("<B")
+SECTION_LENGTH = struct.Struct("<I")
+
+# Run flags
+WAITING = 0b01
+IRQ_REQUESTED = 0b10
+
+def save_state(cpu):
+    sections = []
+    for device in cpu.bus.devices:
+        data = device.save_state()
+        if data is not None:
+            name = device.name.encode()
+            sections += [SECTION.pack(len(name)), name, SECTION_LENGTH.pack(len(data)), data]
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION),
+        CPU_STATE.pack(*cpu.reg, cpu.status, cpu.clock_cycle, cpu.stop,
+                       (WAITING if cpu.waiting else 0) | (IRQ_REQUESTED if cpu.irq_requested else 0)),
+        SECTION_COUNT.pack(len(sections) // 4),
+        *sections,
+    ])
+
+def restore_state(cpu, data):
+    data = memoryview(data)
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a save state")
+    if version != VERSION:
+        raise ValueError(f"Unsupported save state version: {version}")
+    offset = HEADER.size
+    *registers, status, clock_cycle, stop, run_flags = CPU_STATE.unpack_from(data, offset)
+    offset += CPU_STATE.size
+    (count,) = SECTION_COUNT.unpack_from(data, offset)
+    offset += SECTION_COUNT.size
+
+    devices = {device.name: device for device in cpu.bus.devices}
+    for _ in range(count):
+        (name_length,) = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        name = bytes(data[offset : offset + name_length]).decode()
+        offset += name_length
+        (length,) = SECTION_LENGTH.unpack_from(data, offset)
+        offset += SECTION_LENGTH.size
+        if name in devices: # Devices that aren't attached are skipped
+            devices[name].load_state(data[offset : offset + length])
+        offset += length
+
+    cpu.reg[:] = array("H", registers)
+    cpu.status = status
+    cpu.scheduler.rebase(clock_cycle - cpu.clock_cycle) # Keep pending events at the same distance
+    cpu.clock_cycle = clock_cycle
+    cpu.stop = bool(stop)
+    cpu.waiting = bool(run_flags & WAITING)
+    cpu.irq_requested = bool(run_flags & IRQ_REQUESTED)
+    if cpu.irq_requested:
+        cpu.scheduler.interrupt() # Checked before the next instruction
+    cpu.publish_state()
+
+def write_state_file(cpu, filename):
+    with open(filename, "wb") as state_file:
+        state_file.write(save_state(cpu))
+
+def read_state_file(cpu, filename):
+    with open(filename, "rb") as state_file:
+        restore_state(cpu, state_file.read())
@@ -0,0 +1,29 @@
+from collections.abc import Mapping
+
+# Status register flags
+FLAG_Z = 0b0001 # Zero
+FLAG_N = 0b0010 # Negative (has to be bit 1, so it can be copied from bit 15 with a single shift)
+FLAG_C = 0b0100 # Carry
+FLAG_V = 0b1000 # Overflow
+FLAG_I = 0b10000 # Interrupts enabled (EI/DI)
+FLAGS = {"Z": FLAG_Z, "N": FLAG_N, "C": FLAG_C, "V": FLAG_V, "I": FLAG_I}
+
+class StatusFlags(Mapping):
+    # Dictionary-like view of the packed status register, e.g. cpu.flags["Z"]
+    def __init__(self, cpu):
+        self.cpu = cpu
+
+    def __getitem__(self, flag):
+        return 1 if self.cpu.status & FLAGS[flag] else 0
+
+    def __setitem__(self, flag, value):
+        if value:
+            self.cpu.status |= FLAGS[flag]
+        else:
+            self.cpu.status &= ~FLAGS[flag]
+
+    def __iter__(self):
+        return iter(FLAGS)
+
+    def __len__(self):
+        return len(FLAGS)
@@ -0,0 +1,208 @@
+# Execution traces. While tracing, CPU.run executes instructions with the interpreter through a bus that
+# records memory writes, and packs one fixed size record per instruction into a preallocated buffer:
+#   clock_cycle:u64 pc:u16 instr:u16 reg[9]:u16 status:u16 write_length:u8 write_addr:u16 old:u16 new:u16
+# Registers are stored after the instruction, writes keep the overwritten value so a save state taken when
+# the trace ends can be rewound to any traced cycle. Full buffers are written to the file in one go, or with
+# keep_last the buffer is a ring holding only the most recent records.
+# File layout: "YRTR" version:u16 record_size:u16 | records | save state | state_length:u32 "YRTE"
+# When tracing is off none of this code runs.
+
+from argparse import ArgumentParser
+from array import array
+import struct
+from .cpu import CPU, get_reg_name
+from .snapshot import save_state
+
+MAGIC = b"YRTR"
+END_MAGIC = b"YRTE"
+VERSION = 1
+DEFAULT_CAPACITY = 65536 # Records
+
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<QHH9HHBHHH")
+TRAILER = struct.Struct("<I4s")
+
+class TracingBus():
+    def __init__(self, bus):
+        self.bus = bus
+        self.write = None # (length, addr, old, new) of the last write
+
+    def read_byte(self, addr):
+        return self.bus.read_byte(addr)
+
+    def read_word(self, addr):
+        return self.bus.read_word(addr)
+
+    def write_byte(self, addr, value):
+        addr &= 0xFFFF
+        old = self.bus.read_byte(addr) if self.bus.get_device(addr).io_type != "wo" else 0
+        self.bus.write_byte(addr, value)
+        self.write = (1, addr, old, value & 0xFF)
+
+    def write_word(self, addr, value):
+        addr &= 0xFFFF
+        old = self.bus.read_word(addr) if self.bus.get_device(addr).io_type != "wo" else 0
+        self.bus.write_word(addr, value)
+        self.write = (2, addr, old, value & 0xFFFF)
+
+class Tracer():
+    def __init__(self, cpu, filename, capacity=DEFAULT_CAPACITY, keep_last=False):
+        self.cpu = cpu
+        self.filename = filename
+        self.capacity = capacity
+        self.keep_last = keep_last
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.index = 0 # Next record slot
+        self.wrapped = False
+        self.recorded = 0
+        self.file = None
+
+    def start(self): # Routes CPU.run through the tracer until close()
+        self.file = open(self.filename, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.run_chunk_untraced = self.cpu.run_chunk
+        self.cpu.run_chunk = self.run_chunk
+        self.cpu.idle.enabled = False # Fast-forwarded idle loops would leave gaps in the trace
+
+    def run_chunk(self, steps=-1):
+        cpu = self.cpu
+        reg = cpu.reg
+        scheduler = cpu.scheduler
+        counts = cpu.counters.instructions
+        bus = cpu.bus
+        probe = cpu.bus = TracingBus(bus)
+        executed = 0
+        try:
+            while executed != steps and cpu.clock_cycle < scheduler.deadline:
+                pc = reg[8]
+                instr = cpu.fetch_word()
+                probe.write = None
+                cpu.decode_execute(instr)
+                counts[instr] += 1
+                self.record(pc, instr, probe.write)
+                executed += 1
+        finally:
+            cpu.bus = bus
+        return executed
+
+    def record(self, pc, instr, write):
+        cpu = self.cpu
+        length, addr, old, new = write or (0, 0, 0, 0)
+        RECORD.pack_into(self.buffer, self.index * RECORD.size, cpu.clock_cycle, pc, instr, *cpu.reg, cpu.status, length, addr, old, new)
+        self.recorded += 1
+        self.index += 1
+        if self.index == self.capacity:
+            self.index = 0
+            if self.keep_last:
+                self.wrapped = True
+            else:
+                self.file.write(self.buffer)
+
+    def close(self):
+        self.cpu.run_chunk = self.run_chunk_untraced
+        self.cpu.idle.enabled = True
+        if self.wrapped: # Oldest records start at the current index
+            self.file.write(memoryview(self.buffer)[self.index * RECORD.size :])
+        self.file.write(memoryview(self.buffer)[: self.index * RECORD.size])
+        state = save_state(self.cpu)
+        self.file.write(state)
+        self.file.write(TRAILER.pack(len(state), END_MAGIC))
+        self.file.close()
+
+class TraceRecord():
+    def __init__(self, fields):
+        self.clock_cycle, self.pc, self.instr = fields[0:3]
+        self.reg = fields[3:12]
+        self.status = fields[12]
+        self.write_length, self.write_addr, self.write_old, self.write_new = fields[13:17]
+
+class TraceReader():
+    def __init__(self, filename):
+        with open(filename, "rb") as trace_file:
+            data = trace_file.read()
+        magic, version, record_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a trace file")
+        if version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"Unsupported trace version: {version}")
+        state_length, end_magic = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if end_magic != END_MAGIC:
+            raise ValueError("Trace file is incomplete")
+        state_start = len(data) - TRAILER.size - state_length
+        self.records = memoryview(data)[HEADER.size : state_start]
+        self.end_state = data[state_start : len(data) - TRAILER.size]
+        self.count = len(self.records) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not -self.count <= i < self.count:
+            raise IndexError("Trace record out of range")
+        return TraceRecord(RECORD.unpack_from(self.records, (i % self.count) * RECORD.size))
+
+    def find(self, clock_cycle): # Index of the last record that ended at or before clock_cycle
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if RECORD.unpack_from(self.records, mid * RECORD.size)[0] <= clock_cycle:
+                low = mid + 1
+            else:
+                high = mid
+        if low == 0:
+            raise ValueError(f"Trace starts after cycle {clock_cycle}")
+        return low - 1
+
+    def seek(self, clock_cycle): # Headless CPU in the state after the last instruction ending by clock_cycle
+        index = self.find(clock_cycle)
+        cpu = CPU()
+        cpu.restore_state(self.end_state)
+        for i in range(self.count - 1, index, -1): # Undo the writes of all later instructions
+            record = self[i]
+            if record.write_length == 1:
+                cpu.bus.write_byte(record.write_addr, record.write_old)
+            elif record.write_length == 2:
+                cpu.bus.write_word(record.write_addr, record.write_old)
+        record = self[index]
+        cpu.reg[:] = array("H", record.reg)
+        cpu.status = record.status
+        cpu.clock_cycle = record.clock_cycle
+        cpu.stop = (record.instr >> 10) == 0b000001 # HALT
+        return cpu
+
+def format_record(record, previous):
+    changes = [f"{get_reg_name(rN)}={value:04X}" for rN, value in enumerate(record.reg[:8]) if previous is None or previous.reg[rN] != value]
+    if record.write_length:
+        digits = record.write_length * 2
+        changes.append(f"[{record.write_addr:04X}]={record.write_new:0{digits}X} (was {record.write_old:0{digits}X})")
+    return f"{record.clock_cycle:>10} {record.pc:04X}: {record.instr:04X}  {' '.join(changes)}"
+
+def main():
+    parser = ArgumentParser(prog="YR-µ16 Trace Viewer")
+    parser.add_argument("filename", help="trace file to inspect")
+    parser.add_argument("--seek", type=int, help="show the machine state at this clock cycle")
+    parser.add_argument("--dump", help="memory range to dump with --seek (START:END, hex)")
+    parser.add_argument("--count", type=int, default=20, help="number of records to list")
+    args = parser.parse_args()
+
+    trace = TraceReader(args.filename)
+    print(f"{len(trace)} records, cycles {trace[0].clock_cycle if len(trace) else 0} - {trace[-1].clock_cycle if len(trace) else 0}")
+    if args.seek is None:
+        previous = None
+        for i in range(min(args.count, len(trace))):
+            record = trace[i]
+            print(format_record(record, previous))
+            previous = record
+        return
+
+    index = trace.find(args.seek)
+    for i in range(max(0, index - args.count + 1), index + 1):
+        print(format_record(trace[i], trace[i - 1] if i else None))
+    cpu = trace.seek(args.seek)
+    print(" ".join(f"{get_reg_name(rN)}={value:04X}" for rN, value in enumerate(cpu.reg)), dict(cpu.flags))
+    if args.dump:
+        start, end = (int(part, 16) for part in args.dump.split(":"))
+        cpu.bus.memory.dump(start, end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Wall-clock frame thread. Repaints the UI at a fixed frame rate, independent of the emulation speed. Each
+# frame starts with a snapshot of the registers and memory, taken on the CPU thread between two instructions
+# (CPU.call_soon), and the windows draw from that copy while the CPU keeps running. The CPU loop itself
+# never calls into the UI. With render_on_commit the console is copied when the guest commits a frame
+# instead, and the console window is only redrawn for new commits.
+
+import threading
+from time import perf_counter
+from ..status import StatusFlags
+from .ui import UI
+
+FPS = 30
+
+class MemorySnapshot():
+    def __init__(self, memory):
+        self.min_address = memory.min_address
+        self.max_address = memory.max_address
+        self.data = b""
+
+class ConsoleSnapshot():
+    def __init__(self, console):
+        self.base_addr = console.base_addr
+        self.frames = console.frames
+        self.screen = b"" # Console contents at the last commit
+
+class BusSnapshot():
+    def __init__(self, bus):
+        self.memory = MemorySnapshot(bus.memory)
+        self.console = ConsoleSnapshot(bus.console)
+
+class MachineSnapshot():
+    # Copy of what the windows show, looks enough like a CPU for them
+    def __init__(self, cpu):
+        self.term = cpu.term
+        self.bus = BusSnapshot(cpu.bus)
+        self.flags = StatusFlags(self)
+        self.capture(cpu)
+
+    def capture(self, cpu):
+        self.reg = tuple(cpu.reg)
+        self.status = cpu.status
+        self.clock_cycle = cpu.clock_cycle
+        self.bus.console.base_addr = cpu.bus.console.base_addr
+        self.bus.memory.data = bytes(cpu.bus.memory.data)
+
+class FrameThread(threading.Thread):
+    def __init__(self, program_name, cpu, fps=FPS, render_on_commit=False):
+        super().__init__(daemon=True)
+        self.cpu = cpu
+        self.interval = 1 / fps
+        self.snapshot = MachineSnapshot(cpu)
+        self.ui = UI(program_name, self.snapshot, render_on_commit)
+        self.committed = (cpu.bus.console.frames, b"") # Frame number and screen of the last commit
+        if render_on_commit:
+            cpu.bus.console.on_commit = self.commit
+        self.captured = threading.Event()
+        self.pending = False # A capture is queued on the CPU thread
+        self.stopping = threading.Event()
+        self.frames = 0
+
+    def run(self):
+        next_frame = perf_counter()
+        while not self.stopping.is_set():
+            if not self.pending:
+                self.pending = True
+                self.captured.clear()
+                self.cpu.call_soon(self.capture)
+            # Without a capture the CPU isn't running (not started yet or sleeping), so nothing changed
+            if self.captured.wait(self.interval):
+                self.ui.refresh()
+                self.frames += 1
+            next_frame += self.interval
+            delay = next_frame - perf_counter()
+            if delay < 0: # Slow frame, don't try to catch up
+                next_frame = perf_counter()
+            self.stopping.wait(max(delay, 0))
+
+    def commit(self): # Runs on the CPU thread, in the store to the commit register
+        console = self.cpu.bus.console
+        memory = self.cpu.bus.memory
+        index = console.base_addr - memory.min_address
+        self.committed = (console.frames, bytes(memory.data[index : index + console.width * console.height]))
+
+    def capture(self): # Runs on the CPU thread
+        self.snapshot.capture(self.cpu)
+        self.snapshot.bus.console.frames, self.snapshot.bus.console.screen = self.committed
+        self.pending = False
+        self.captured.set()
+
+    def stop(self): # Called after the CPU stopped running, draws the final state
+        self.stopping.set()
+        self.join()
+        self.capture()
+        self.ui.refresh()
@@ -1,6 +1,6 @@
 import threading
 
-from ..devices.keyboard import get_key_code, DATA_READY
+from ..devices.keyboard import get_key_code
 
 class InputThread(threading.Thread):
     def __init__(self, cpu):
@@ -22,7 +22,5 @@ class InputThread(threading.Thread):
                 elif key.name == "KEY_F6" and self.cpu.paused:
                     self.cpu.step_once = True
                 else:
-                    with self.keyboard.lock:
-                        for byte in get_key_code(key):
-                            self.keyboard.input_buffer.put(byte)
-                        self.keyboard.status |= DATA_READY
\ No newline at end of file
+                    self.keyboard.put_input(get_key_code(key))
+                self.cpu.wake()
\ No newline at end of file
@@ -0,0 +1,90 @@
+# Runs the UI windows in a separate process. The windows read RAM and registers straight from the shared
+# memory block (see shared_state.py) through a MachineView and draw at their own frame rate on another core,
+# so the CPU never waits for terminal writes. Keyboard input stays with the InputThread of the emulator.
+# With render_on_commit the console window waits for a new frame counter in the header, the emulator
+# publishes the header at each commit. The screen is still read from the live RAM then.
+
+import multiprocessing
+from time import sleep
+from blessed import Terminal
+from ..shared_state import SharedState
+from ..status import StatusFlags
+from .ui import UI
+
+class MemoryView():
+    def __init__(self, shared, min_address=0x0000):
+        self.data = shared.ram
+        self.min_address = min_address
+        self.max_address = min_address + shared.ram_size - 1
+
+class ConsoleView():
+    def __init__(self, shared, width=80, height=24):
+        self.shared = shared
+        self.width = width
+        self.height = height
+
+    @property
+    def base_addr(self):
+        return self.shared.header()[1]
+
+    @property
+    def frames(self):
+        return self.shared.header()[4]
+
+    @property
+    def screen(self):
+        index = self.base_addr
+        return bytes(self.shared.ram[index : index + self.width * self.height])
+
+class BusView():
+    def __init__(self, shared):
+        self.memory = MemoryView(shared)
+        self.console = ConsoleView(shared)
+
+class MachineView():
+    # Looks enough like a CPU for the windows
+    def __init__(self, shared, term=None):
+        self.shared = shared
+        self.term = term
+        self.reg = shared.reg
+        self.flags = StatusFlags(self)
+        self.bus = BusView(shared)
+
+    @property
+    def status(self):
+        return self.shared.header()[0]
+
+    @property
+    def clock_cycle(self):
+        return self.shared.header()[3]
+
+    @property
+    def stop(self):
+        return self.shared.stopped
+
+def run_ui(program_name, name, ram_size, fps, render_on_commit):
+    shared = SharedState(ram_size, name)
+    view = MachineView(shared, Terminal())
+    ui = UI(program_name, view, render_on_commit)
+    try:
+        while not view.stop:
+            ui.refresh()
+            sleep(1 / fps)
+        ui.refresh() # Final state
+    finally:
+        shared.close()
+
+class UIProcess():
+    def __init__(self, program_name, shared, fps=30, render_on_commit=False):
+        self.shared = shared
+        context = multiprocessing.get_context("spawn") # Nothing of the running emulator is inherited
+        self.process = context.Process(target=run_ui, args=(program_name, shared.name, shared.ram_size, fps, render_on_commit), daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def stop(self, timeout=5): # Draws the final state and exits
+        self.shared.set_stopped()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
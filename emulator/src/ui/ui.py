@@ -23,10 +23,9 @@ ACTION_Y = MEMORY_Y + MEMORY_H
 ACTION_X = MEMORY_X
 
 class UI():
-    def __init__(self, program_name, cpu, refresh_rate=60):
+    def __init__(self, program_name, cpu, render_on_commit=False):
         self.term = cpu.term
-        self.refresh_rate = refresh_rate
-        self.console_win = ConsoleWindow(self.term, CONSOLE_H, CONSOLE_W, CONSOLE_Y, CONSOLE_X, program_name, cpu)
+        self.console_win = ConsoleWindow(self.term, CONSOLE_H, CONSOLE_W, CONSOLE_Y, CONSOLE_X, program_name, cpu, render_on_commit)
         self.status_win = StatusWindow(self.term, STATUS_H, STATUS_W, STATUS_Y, STATUS_X, cpu)
         self.memory_win = MemoryWindow(self.term, MEMORY_H, MEMORY_W, MEMORY_Y, MEMORY_X, cpu)
         self.action_win = ActionWindow(self.term, ACTION_H, ACTION_W, ACTION_Y, ACTION_X)
@@ -36,7 +35,10 @@ class UI():
             window.draw_border()
             window.flush()
 
-    def refresh(self):
+    def refresh(self): # Windows only draw what changed, the frame goes out in one write
         for window in self.windows:
             window.draw_contents()
-            window.flush()
\ No newline at end of file
+        frame = ''.join(window.render() for window in self.windows)
+        if frame:
+            sys.stdout.write(frame)
+            sys.stdout.flush()
\ No newline at end of file
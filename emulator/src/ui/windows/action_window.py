@@ -11,4 +11,4 @@ class ActionWindow(Window):
 
     def draw_contents(self):
         string = "Quit (F3) | Pause (F4) | Continue (F5) | Step (F6)"
-        self.print_str(1, (self.width - len(string))//2, string)
\ No newline at end of file
+        self.print_changed(1, (self.width - len(string))//2, string)
\ No newline at end of file
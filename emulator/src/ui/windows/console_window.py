@@ -2,9 +2,10 @@ from .window import Window
 
 SCREEN_HEIGHT = 24
 SCREEN_WIDTH = 80
+PRINTABLE = bytes(c if c >= 32 else 32 for c in range(256)) # Control characters show as spaces
 
 class ConsoleWindow(Window):
-    def __init__(self, term, height, width, y, x, program_name, cpu):
+    def __init__(self, term, height, width, y, x, program_name, cpu, render_on_commit=False):
         super().__init__(term, height, width, y, x, title=f"{program_name} (F1)")
         self.border = [
             '┌','─','┐',
@@ -13,12 +14,24 @@ class ConsoleWindow(Window):
         ]
         self.memory = cpu.bus.memory
         self.console = cpu.bus.console
+        self.screen_data = b"" # Last frame
+        self.render_on_commit = render_on_commit # Only draw frames the guest committed (see ConsoleDevice)
+        self.frame = 0 # Committed frame on screen
 
     def draw_contents(self):
-        index = self.console.base_addr - self.memory.min_address
-        screen_data = self.memory.data[index : index + SCREEN_WIDTH * SCREEN_HEIGHT]
-        line_num = 0
+        # Compares the raw screen rows with the last frame, only changed rows are decoded and drawn
+        if self.render_on_commit:
+            if self.console.frames == self.frame:
+                return
+            self.frame = self.console.frames
+            screen_data = self.console.screen # As it was at the commit
+        else:
+            index = self.console.base_addr - self.memory.min_address
+            screen_data = bytes(self.memory.data[index : index + SCREEN_WIDTH * SCREEN_HEIGHT])
+        if screen_data == self.screen_data:
+            return
         for i in range(0, len(screen_data), SCREEN_WIDTH):
-            line = ''.join(chr(c) if c >= 32 else ' ' for c in screen_data[i:i+SCREEN_WIDTH])
-            self.print_str(1 + line_num, 2, line)
-            line_num += 1
\ No newline at end of file
+            row = screen_data[i:i+SCREEN_WIDTH]
+            if row != self.screen_data[i:i+SCREEN_WIDTH]:
+                self.print_str(1 + i // SCREEN_WIDTH, 2, row.translate(PRINTABLE).decode("latin-1"))
+        self.screen_data = screen_data
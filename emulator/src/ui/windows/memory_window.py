@@ -11,14 +11,17 @@ class MemoryWindow(Window):
         self.memory = cpu.bus.memory
 
         self.observe_addr = 0xC000
+        self.chunks = {} # Line -> (address, bytes) of the last frame
 
     def draw_contents(self):
         start_addr = min(self.observe_addr, self.memory.max_address+1)
         end_addr = min(self.observe_addr + (self.height - 2) * 16, self.memory.max_address+1)
-        self.print_str(1, 2, f"Address: {start_addr:04X} - {end_addr-1:04X}")
+        self.print_changed(1, 2, f"Address: {start_addr:04X} - {end_addr-1:04X}")
         line_num = 0
         for addr in range(start_addr, end_addr, 16):
-            chunk = self.memory.data[addr:addr+16]
-            hex_bytes = ' '.join(f'{b:02X}' for b in chunk)
-            self.print_str(2 + line_num, 2, f"{addr:04X}: {hex_bytes}")
-            line_num += 1
\ No newline at end of file
+            chunk = bytes(self.memory.data[addr:addr+16])
+            if self.chunks.get(line_num) != (addr, chunk): # Only changed lines are formatted
+                self.chunks[line_num] = (addr, chunk)
+                hex_bytes = ' '.join(f'{b:02X}' for b in chunk)
+                self.print_str(2 + line_num, 2, f"{addr:04X}: {hex_bytes}")
+            line_num += 1
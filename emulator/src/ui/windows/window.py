@@ -9,6 +9,7 @@ class Window():
         self.x = x
         self.title = title
         self.buffer = []
+        self.rows = {} # (y, x) -> last string drawn there by print_changed
 
     def draw_contents(self):
         pass
@@ -48,7 +49,17 @@ class Window():
     def print_str(self, y, x, string):
         self.buffer.append(self.term.move_xy(self.x + x, self.y + y) + str(string))
 
+    def print_changed(self, y, x, string): # Skips strings that are already on screen
+        string = str(string)
+        if self.rows.get((y, x)) != string:
+            self.rows[(y, x)] = string
+            self.print_str(y, x, string)
+
+    def render(self): # Takes the pending output
+        output = ''.join(self.buffer)
+        self.buffer.clear()
+        return output
+
     def flush(self):
         if self.buffer:
-            sys.stdout.write(''.join(self.buffer))
-            self.buffer.clear()
\ No newline at end of file
+            sys.stdout.write(self.render())
\ No newline at end of file
@@ -0,0 +1,29 @@
+from emulator.src.batch import run_batch, parse_job
+
+def test_batch_results(tmp_path):
+    halting = tmp_path / "halt.bin"
+    halting.write_bytes(bytes([
+        0b00_0011_00, 0b1_0000_010, 0xC0, 0x00, # MOV r1, 0xC000
+        0b101_011_00, 0b1_0000_010, 0xF0, 0x00, # STORE r1, 0xF000 (console base address)
+        0b00_0011_00, 0b0_0000_001, 0x48, # MOV r0, 'H'
+        0b101_010_00, 0b0_0000_010, 0xC0, 0x00, # STOREB r0, 0xC000
+        0b00_0001_00, 0b00000000, # HALT
+    ]))
+    looping = tmp_path / "loop.bin"
+    looping.write_bytes(bytes([
+        0b100_000_00, 0b0_0000_000, # JMP 0
+    ]))
+
+    jobs = [parse_job(f"{halting}", 100, "interpreter"), parse_job(f"{looping}:50", 100, "translated")]
+    halted, timed_out = run_batch(jobs, workers=2)
+
+    assert halted["status"] == "halted"
+    assert halted["registers"]["R0"] == 0x48
+    assert halted["registers"]["PC"] == 17
+    assert halted["flags"]["Z"] == 0
+    assert halted["clock_cycle"] == 9
+    assert halted["console"]["base_addr"] == 0xC000
+    assert halted["console"]["lines"][0] == "H".ljust(80)
+    assert timed_out["status"] == "max_cycles"
+    assert timed_out["max_cycles"] == 50
+    assert timed_out["clock_cycle"] == 50
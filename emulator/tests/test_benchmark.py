@@ -0,0 +1,28 @@
+from emulator.src.benchmark import run_suite, compare, find_programs, measure_program, MICROBENCHMARKS
+
+import pytest
+
+def test_suite_runs_everything():
+    results = run_suite(cycles=2_000, instructions=500, assembler_lines=200, repeat=1, engines=["translated"])
+    names = results["results"].keys()
+    assert {path.stem for path in find_programs()} == {"game_of_life", "hello_world", "typing"}
+    assert "program/game_of_life/translated" in names
+    assert all(f"micro/{name}/translated" in names for name in MICROBENCHMARKS)
+    assert "assembler/synthetic_200" in names
+    assert all(result["value"] > 0 for result in results["results"].values())
+
+def test_compare_flags_slowdowns():
+    baseline = {"results": {"a": {"value": 100.0}, "b": {"value": 100.0}, "gone": {"value": 1.0}}}
+    results = {"results": {"a": {"value": 85.0}, "b": {"value": 95.0}, "new": {"value": 1.0}}}
+    assert compare(results, baseline, 0.10) == [("a", 100.0, 85.0, pytest.approx(-0.15))]
+
+def test_program_faults_fail():
+    measure_program(bytes([0b00_0001_00, 0b0_0000_000]), "interpreter", 1_000) # HALT ends early without an error
+    with pytest.raises(RuntimeError, match="No device"):
+        measure_program(bytes([0b10_1000_00, 0b0_0000_010, 0xF0, 0xFF]), "interpreter", 1_000) # LOADB r0, 0xF0FF
+    # Waiting for a key is fast-forwarded by idle detection, without it the budget measures the polling loop
+    typing = [
+        0b10_1000_00, 0b0_0000_010, 0xF0, 0x05, # LOADB r0, 0xF005 (keyboard status)
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+    ]
+    assert measure_program(bytes(typing), "interpreter", 100_000) < 20_000_000
@@ -0,0 +1,41 @@
+from emulator.src.bus import Bus
+from emulator.src.devices.memory import MemoryDevice
+from emulator.src.devices.console import ConsoleDevice
+from emulator.src.devices.keyboard import KeyboardDevice, DATA_READY
+
+import pytest
+
+@pytest.fixture
+def bus():
+    bus = Bus()
+    bus.attach_device(MemoryDevice("memory", 0x0000, 0xEFFF))
+    bus.attach_device(ConsoleDevice("console", 0xF000, 0xF003))
+    bus.attach_device(KeyboardDevice("keyboard", 0xF004, 0xF005))
+    return bus
+
+def test_page_map(bus):
+    assert bus.page_map[0x00] is bus.memory
+    assert bus.page_map[0xEF] is bus.memory
+    assert bus.ram_pages[0xEF] is bus.memory
+    assert bus.page_map[0xF0] is None # Shared by the console and keyboard
+    assert bus.ram_pages[0xF0] is None
+
+def test_word_access_across_pages(bus):
+    bus.write_word(0x12FF, 0xABCD)
+    assert bus.memory.data[0x12FF] == 0xAB
+    assert bus.memory.data[0x1300] == 0xCD
+    assert bus.read_word(0x12FF) == 0xABCD
+
+def test_mmio_access(bus):
+    bus.write_word(0xF000, 0xC000)
+    assert bus.console.base_addr == 0xC000
+    assert bus.read_byte(0xF002) == 80
+    bus.keyboard.input_buffer.put(0x41)
+    bus.keyboard.status |= DATA_READY
+    assert bus.read_word(0xF004) == (0x41 << 8) | 0 # Reading the data register clears the status
+
+def test_access_errors(bus):
+    with pytest.raises(RuntimeError, match="No device mapped"):
+        bus.read_byte(0xF100)
+    with pytest.raises(RuntimeError, match="read-only"):
+        bus.write_byte(0xF004, 0)
@@ -0,0 +1,58 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.headless import HeadlessIO
+from emulator.src.snapshot import save_state, restore_state
+
+import pytest
+
+COMMIT = [
+    0b00_0011_00, 0b1_0000_010, 0x41, 0x42, # MOV r1, 0x4142
+    0b101_011_00, 0b1_0000_010, 0xC0, 0x00, # STORE r1, 0xC000
+    0b101_010_00, 0b1_0000_010, 0xF0, 0x1B, # STOREB r1, 0xF01B (commit)
+    0b00_0011_00, 0b1_0000_010, 0x43, 0x44, # MOV r1, 0x4344
+    0b101_011_00, 0b1_0000_010, 0xC0, 0x02, # STORE r1, 0xC002
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x1B, # STORE r1, 0xF01B (commit, the counter can't be written)
+    0b101_001_01, 0b0_0000_010, 0xF0, 0x1C, # LOAD r2, 0xF01C (frame counter)
+    0b00_0001_00, 0b0_0000_000,             # HALT
+]
+
+def machine(engine="interpreter"):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(COMMIT)
+    cpu.bus.console.base_addr = 0xC000
+    return cpu
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_capture_commits(engine):
+    cpu = machine(engine)
+    headless = HeadlessIO(capture_commits=True)
+    headless.attach(cpu)
+    cpu.run()
+    headless.detach()
+    assert [(frame["clock_cycle"], frame["frame"], frame["lines"][0].rstrip()) for frame in headless.frames] == [
+        (6, 1, "AB"), (12, 2, "ABCD"), # At the end of the committing instructions
+    ]
+    assert cpu.reg[2] == 2 and cpu.bus.console.on_commit is None
+
+def test_frame_counter_in_snapshot():
+    cpu = machine()
+    cpu.bus.console.frames = 0xFFFF
+    cpu.bus.write_byte(0xF01B, 0) # Wraps around
+    assert cpu.bus.console.frames == 0 and cpu.bus.read_byte(0xF01B) == 0
+    cpu.run()
+    assert cpu.bus.read_word(0xF01C) == 2
+
+    other = CPU()
+    restore_state(other, save_state(cpu))
+    assert other.bus.console.frames == 2 and other.bus.console.base_addr == 0xC000
+    other.bus.console.load_state(b"\xC7\x80") # Save states from before the frame counter
+    assert other.bus.console.frames == 0 and other.bus.console.base_addr == 0xC780
+
+def test_vector_engine_matches():
+    pytest.importorskip("numpy")
+    from emulator.src.engines.vector import VectorMachine, cross_check
+    machine = VectorMachine(3)
+    machine.load_program(COMMIT)
+    machine.console_base[:] = 0xC000
+    machine.frames[:] = [0, 7, 0xFFFF]
+    assert cross_check(machine, range(3), steps=10) == []
+    assert (machine.reg[:, 2] == [2, 9, 1]).all()
@@ -0,0 +1,83 @@
+from emulator.src.cpu import CPU, ENGINES
+
+import json
+import pytest
+
+PROGRAM = [
+    0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+    0b101_011_00, 0b0_0000_010, 0x10, 0x00, # STORE r0, 0x1000
+    0b01_1100_00, 0b0_1010_000,             # CMP r0, 10
+    0b10_0010_00, 0b0_0000_010, 0x00, 0x00, # JNE 0x0000
+    0b101_011_00, 0b0_0000_010, 0xF0, 0x00, # STORE r0, 0xF000
+    0b10_1001_00, 0b1_0000_010, 0xF0, 0x02, # LOAD r1, 0xF002
+    0b00_0001_00, 0b00000000,               # HALT
+]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_counters(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(PROGRAM)
+    cpu.run()
+    counters = cpu.counters.snapshot()
+
+    assert counters["instructions"] == 43
+    assert counters["mnemonics"] == {"ADD": 10, "STORE": 11, "CMP": 10, "JNZ": 10, "LOAD": 1, "HALT": 1}
+    assert counters["opcode_classes"] == {"general": 1, "alu": 20, "jump": 10, "memory": 12, "stack": 0}
+    assert counters["branches"]["JNZ"] == {"taken": 9, "not_taken": 1}
+    assert counters["addressing_modes"]["imm4"] == 20
+    assert counters["addressing_modes"]["imm16"] == 22
+    assert counters["bus_bytes"]["console"] == {"reads": 2, "writes": 2}
+    assert counters["bus_bytes"]["memory"] == {"reads": 130, "writes": 20}
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_counters_include_fast_forwarded_idle_loops(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program([
+        0b10_1000_00, 0b0_0000_010, 0xF0, 0x02, # LOADB r0, 0xF002
+        0b10_0010_00, 0b0_0000_010, 0x00, 0x00, # JNE 0x0000
+    ])
+    cpu.run(steps=20_000)
+    counters = cpu.counters.snapshot()
+    assert cpu.idle.skipped_cycles > 0
+    assert counters["mnemonics"] == {"LOADB": 10_000, "JNZ": 10_000}
+    assert counters["branches"]["JNZ"] == {"taken": 10_000, "not_taken": 0}
+    assert counters["bus_bytes"]["console"]["reads"] == 10_000
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_ram_traffic_outside_of_instructions(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program([
+        0b00_0011_00, 0b1_0001_000,             # MOV r1, 1
+        0b101_010_00, 0b1_0000_010, 0xF0, 0x07, # STOREB r1, 0xF007 (unmask the keyboard line)
+        0b00_0100_00, 0b0_0000_000,             # EI
+        0b100_000_00, 0b0_0000_001, 0x08,       # 0x0008: JMP 0x0008
+        0b00_0000_00, 0b0_0000_000,             # NOP
+        0b00_0000_00, 0b0_0000_000,             # NOP
+        0b00_0110_00, 0b0_0000_000,             # 0x000F: RETI
+    ])
+    cpu.bus.write_word(0xDFF0, 0x000F) # Handler of line 0
+    cpu.run(steps=5)
+    cpu.bus.interrupts.raise_irq(0)
+    cpu.run(steps=2) # JMP, then the handler
+    counters = cpu.counters.snapshot()
+    assert counters["mnemonics"]["RETI"] == 1 and counters["stack"]["pop"] == 1
+    assert counters["bus_bytes"]["memory"]["writes"] == 4 # PC and status pushed by the interrupt entry
+    assert (cpu.counters.ram_reads, cpu.counters.ram_writes) == (2, 4) # And the vector
+
+    cpu.counters.reset()
+    for addr, value in [(0xF00A, 0x10), (0xF00C, 0x20), (0xF00F, 16), (0xF011, 1), (0xF011, 2)]: # Copy, fill
+        cpu.bus.dma.write_byte(addr, value) # Not through the bus, that would count as instruction traffic
+    assert cpu.counters.snapshot()["bus_bytes"]["memory"] == {"reads": 16, "writes": 32}
+
+def test_export():
+    cpu = CPU(engine="translated")
+    cpu.bus.memory.load_program(PROGRAM)
+    cpu.run()
+    assert json.loads(cpu.counters.to_json())["instructions"] == 43
+    prometheus = cpu.counters.to_prometheus()
+    assert 'yr_instructions_total{mnemonic="ADD"} 10' in prometheus
+    assert 'yr_branches_total{type="JNZ",outcome="not_taken"} 1' in prometheus
+    assert f"yr_clock_cycles_total {cpu.clock_cycle}" in prometheus
+
+    cpu.counters.reset()
+    assert cpu.counters.snapshot()["instructions"] == 0
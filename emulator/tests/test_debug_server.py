@@ -0,0 +1,79 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.debug_server import DebugServer, DebugClient, DebugError
+
+import pytest
+
+LOOP = [
+    0b01_0000_00, 0b0_0001_001, 0x01,       # ADD r0, 1 (imm8)
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+]
+
+@pytest.fixture(params=ENGINES)
+def client(request):
+    cpu = CPU(engine=request.param)
+    cpu.bus.memory.load_program(LOOP)
+    server = DebugServer(cpu)
+    client = DebugClient(server.start())
+    yield client
+    client.request("quit")
+    server.thread.join(5)
+    client.close()
+
+def test_breakpoints_and_stepping(client):
+    point = client.request("break", addr=0x0003, condition="r0 == 3")["point"]
+    client.request("continue")
+    event = client.wait_event()
+    assert event["reason"] == "breakpoint" and event["registers"]["r0"] == 3 and event["registers"]["pc"] == 3
+
+    state = client.request("step", count=2)
+    assert state["registers"]["r0"] == 4 and state["registers"]["pc"] == 3 and not state["running"]
+    assert client.request("points")["points"][str(point)]["hits"] == 1
+    client.request("delete", point=point)
+    with pytest.raises(DebugError, match="Unknown point"):
+        client.request("delete", point=point)
+
+def test_registers_and_memory(client):
+    client.request("set_registers", values={"r1": 0x1234, "PC": 0x0003})
+    client.request("write_memory", writes=[[0x2000, "cafe"], [0x2010, "00ff"]])
+    assert client.request("read_memory", ranges=[[0x0000, 7], [0x2000, 2], [0x2010, 2]])["data"] == [bytes(LOOP).hex(), "cafe", "00ff"]
+    state = client.request("step")
+    assert state["registers"]["r1"] == 0x1234 and state["registers"]["pc"] == 0x0000 # Executed the JMP
+    with pytest.raises(DebugError, match="outside of RAM"):
+        client.request("read_memory", ranges=[[0xEFFF, 2]])
+
+    client.request("write_memory", writes=[[0x0002, "02"]]) # ADD r0, 2 (also drops translated blocks)
+    assert client.request("step")["registers"]["r0"] == 2
+
+def test_pause_while_running(client):
+    client.request("continue")
+    with pytest.raises(DebugError, match="pause it first"):
+        client.request("step")
+    state = client.request("pause")
+    assert not state["running"] and state["clock_cycle"] > 0
+    assert client.wait_event()["reason"] == "paused"
+
+    client.request("continue", cycles=100)
+    event = client.wait_event()
+    assert event["reason"] == "max_cycles" and event["clock_cycle"] == state["clock_cycle"] + 100
+
+def test_requests_that_are_not_objects(client):
+    for line in [b"[]", b"1", b'"x"', b"null", b"{"]:
+        client.file.write(line + b"\n")
+        client.file.flush()
+        response = client.receive()
+        assert not response["ok"] and "id" not in response
+    assert client.request("status")["ok"] # Still connected
+
+def test_unix_socket(tmp_path):
+    cpu = CPU()
+    cpu.bus.memory.load_program([0b00_0001_00, 0b00000000]) # HALT
+    server = DebugServer(cpu, f"unix:{tmp_path / 'debug.sock'}")
+    server.start()
+    client = DebugClient(f"unix:{tmp_path / 'debug.sock'}")
+    client.request("continue")
+    assert client.wait_event()["reason"] == "halted"
+    with pytest.raises(DebugError, match="halted"):
+        client.request("continue")
+    client.request("quit")
+    server.thread.join(5)
+    client.close()
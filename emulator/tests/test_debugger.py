@@ -0,0 +1,89 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.debugger import parse_condition, parse_breakpoint, parse_watchpoint
+from threading import Thread
+from time import sleep
+
+import pytest
+
+LOOP = [
+    0b01_0000_00, 0b0_0001_001, 0x01,       # ADD r0, 1 (imm8)
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+]
+
+STORE_LOAD = [
+    0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+    0b101_011_00, 0b0_0000_010, 0x20, 0x00, # STORE r0, 0x2000
+    0b10_1001_00, 0b1_0000_010, 0x20, 0x00, # LOAD r1, 0x2000
+    0b10_1001_01, 0b0_0000_010, 0x00, 0x02, # LOAD r2, 0x0002 (reads the STORE instruction)
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+]
+
+@pytest.fixture(params=ENGINES)
+def cpu(request):
+    cpu = CPU(engine=request.param)
+    cpu.debugger.action = "stop"
+    return cpu
+
+def test_parsing():
+    assert parse_condition("R0 >= 0x10")([0x10] + [0] * 8)
+    assert not parse_condition("pc != 8")([0] * 8 + [8])
+    with pytest.raises(ValueError, match="Invalid breakpoint condition"):
+        parse_condition("r7 == 1")
+    assert parse_breakpoint("0x0100:r0 == 5") == (0x100, "r0 == 5")
+    assert parse_watchpoint("0xC000-0xC7FF:w") == (0xC000, 0xC7FF, "w")
+    assert parse_watchpoint("0xF005") == (0xF005, None, "rw")
+
+def test_nothing_installed_without_points():
+    cpu = CPU(engine="translated")
+    run_chunk = cpu.run_chunk
+    page_map = list(cpu.bus.page_map)
+    breakpoint = cpu.debugger.add_breakpoint(0x0003)
+    watchpoint = cpu.debugger.add_watchpoint(0x2000, 0x20FF)
+    assert cpu.run_chunk != run_chunk and cpu.bus.ram_pages[0x20] is None and not cpu.idle.enabled
+    cpu.debugger.remove_breakpoint(breakpoint)
+    cpu.debugger.remove_watchpoint(watchpoint)
+    assert cpu.run_chunk == run_chunk and cpu.bus.page_map == page_map and cpu.idle.enabled
+
+def test_breakpoint(cpu):
+    cpu.bus.memory.load_program(LOOP)
+    cpu.debugger.add_breakpoint(0x0003, "r0 == 3")
+    cpu.run()
+    assert cpu.stop and cpu.reg[0] == 3 and cpu.reg[8] == 0x0003
+    clock_cycle, pc, point, addr = cpu.debugger.hits[0]
+    assert (clock_cycle, pc, addr, point.hits) == (10, 0x0003, 0x0003, 1)
+
+def test_watchpoints(cpu):
+    cpu.bus.memory.load_program(STORE_LOAD)
+    cpu.debugger.add_watchpoint(0x2000, 0x2001, "w")
+    cpu.run()
+    assert cpu.reg[0] == 1 and cpu.reg[1] == 0 and cpu.reg[8] == 6 # Stopped after the STORE
+
+    cpu.stop = False
+    cpu.debugger.clear()
+    cpu.debugger.add_watchpoint(0x2001, access="r")
+    read = cpu.debugger.add_watchpoint(0x0002, 0x0005, access="r") # Only data reads, not instruction fetches
+    cpu.run()
+    assert cpu.reg[1] == 1 and cpu.reg[8] == 10
+    cpu.stop = False
+    cpu.run()
+    assert cpu.reg[2] == STORE_LOAD[2] << 8 | STORE_LOAD[3] and read.hits == 1
+    assert [pc for _, pc, _, _ in cpu.debugger.hits] == [2, 6, 10]
+
+def test_hits_pause_and_continue():
+    cpu = CPU()
+    cpu.bus.memory.load_program(LOOP)
+    cpu.debugger.add_breakpoint(0x0003)
+    thread = Thread(target=cpu.run, daemon=True)
+    thread.start()
+    try:
+        for hits in (1, 2):
+            for _ in range(500):
+                if len(cpu.debugger.hits) == hits and cpu.paused:
+                    break
+                sleep(0.01)
+            assert cpu.paused and cpu.reg[0] == hits and len(cpu.debugger.hits) == hits
+            cpu.paused = False # Continues past the breakpoint until it hits again
+    finally:
+        cpu.stop = True
+        thread.join(5)
+    assert not thread.is_alive()
@@ -0,0 +1,77 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.devices.dma import DMA_DONE, DMA_ERROR
+from emulator.src.snapshot import save_state, restore_state
+
+import pytest
+
+COPY = [
+    0b00_0011_00, 0b1_0000_010, 0x20, 0x00, # MOV r1, 0x2000
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x0A, # STORE r1, 0xF00A (source)
+    0b00_0011_00, 0b1_0000_010, 0x30, 0x00, # MOV r1, 0x3000
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x0C, # STORE r1, 0xF00C (destination)
+    0b00_0011_00, 0b1_0000_010, 0x00, 0x10, # MOV r1, 16
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x0E, # STORE r1, 0xF00E (length)
+    0b00_0011_00, 0b1_0000_010, 0x00, 0x01, # MOV r1, 0x0001
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x10, # STORE r1, 0xF010 (no fill byte, copy)
+    0b101_000_01, 0b0_0000_010, 0xF0, 0x12, # LOADB r2, 0xF012 (status)
+    0b00_0001_00, 0b0_0000_000,             # HALT
+]
+
+# Fills the two bytes after its last store with 0x04, which turns the ADD into a HALT
+OVERWRITE = [
+    0b00_0011_00, 0b1_0000_010, 0x00, 0x16, # MOV r1, 0x0016
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x0C, # STORE r1, 0xF00C (destination)
+    0b00_0011_00, 0b1_0010_000,             # MOV r1, 2
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x0E, # STORE r1, 0xF00E (length)
+    0b00_0011_00, 0b1_0000_010, 0x04, 0x02, # MOV r1, 0x0402
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x10, # STORE r1, 0xF010 (fill byte 0x04, fill)
+    0b01_0000_00, 0b0_0001_000,             # 0x0016: ADD r0, 1
+    0b00_0001_00, 0b0_0000_000,             # HALT
+]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_copy(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(COPY)
+    cpu.bus.memory.write_bytes(0x2000, bytes(range(1, 17)))
+    cpu.run()
+    assert bytes(cpu.bus.memory.data[0x3000 : 0x3011]) == bytes(range(1, 17)) + b"\x00"
+    assert cpu.reg[2] == DMA_DONE
+    assert cpu.clock_cycle == 19 + cpu.bus.dma.cost(16) == 25
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fill_invalidates_code(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(OVERWRITE)
+    cpu.run()
+    assert cpu.stop and cpu.reg[0] == 0 and cpu.reg[8] == 0x0018
+
+def test_overlapping_copy_and_errors():
+    cpu = CPU()
+    memory, dma = cpu.bus.memory, cpu.bus.dma
+    memory.write_bytes(0x1000, b"abcdef")
+    for addr, value in [(0xF00A, 0x10), (0xF00B, 0x00), (0xF00C, 0x10), (0xF00D, 0x02), (0xF00F, 4), (0xF011, 1)]:
+        cpu.bus.write_byte(addr, value)
+    assert bytes(memory.data[0x1000 : 0x1006]) == b"ababcd" # Like memmove
+    assert cpu.clock_cycle == dma.cost(4)
+
+    cpu.bus.write_byte(0xF00C, 0xEF) # 0xEF02 + 0x0104 bytes end past the RAM
+    cpu.bus.write_byte(0xF00E, 0x01)
+    cpu.bus.write_byte(0xF011, 2)
+    assert cpu.bus.read_byte(0xF012) == DMA_DONE | DMA_ERROR and memory.data[0xEF02] == 0
+    cpu.bus.write_byte(0xF011, 7) # Unknown mode
+    assert cpu.bus.read_byte(0xF012) == DMA_DONE | DMA_ERROR and cpu.clock_cycle == dma.cost(4)
+
+    other = CPU()
+    restore_state(other, save_state(cpu))
+    assert other.bus.dma.save_state() == dma.save_state() and other.bus.read_byte(0xF00C) == 0xEF
+
+def test_vector_engine_matches():
+    pytest.importorskip("numpy")
+    from emulator.src.engines.vector import VectorMachine, cross_check
+    machine = VectorMachine(4)
+    machine.load_program(COPY)
+    machine.memory[:, 0x2000 : 0x2010] = [[row * 16 + i for i in range(16)] for row in range(4)]
+    machine.memory[3, 2:4] = [0xEF, 0xF8] # Source 0xEFF8, the copy fails
+    assert cross_check(machine, range(4), steps=20) == []
+    assert (machine.reg[:, 2] == [DMA_DONE] * 3 + [DMA_DONE | DMA_ERROR]).all()
@@ -0,0 +1,134 @@
+from emulator.src.cpu import CPU, ENGINES
+
+from array import array
+import random
+import pytest
+
+def run_until_error(cpu, steps):
+    try:
+        cpu.run(steps)
+    except Exception as e:
+        return type(e), str(e)
+    return None
+
+def random_program(rng, length):
+    program = bytearray()
+    while len(program) < length:
+        instr = rng.getrandbits(16) & ~0b111 | rng.randrange(7) # Only valid addressing modes
+        if instr & 0b100 or (instr & 0b111) == 0b011: # Register operands
+            instr = instr & ~(0b1111 << 3) | (rng.randrange(7) << 3)
+        if instr >> 10 == 0b000001: # Keep HALT rare
+            continue
+        program += instr.to_bytes(2, "big")
+    return program
+
+def machine_state(cpu):
+    return list(cpu.reg), dict(cpu.flags), cpu.clock_cycle, cpu.stop, bytes(cpu.bus.memory.data), cpu.bus.memory.clock_cycle
+
+@pytest.mark.parametrize("engine", [engine for engine in ENGINES if engine != "interpreter"])
+@pytest.mark.parametrize("seed", range(50))
+def test_engine_matches_interpreter(engine, seed):
+    rng = random.Random(seed)
+    program = random_program(rng, 512)
+    registers = [rng.randrange(0xE000) for _ in range(7)]
+
+    cpus = [CPU(engine="interpreter"), CPU(engine=engine)]
+    results = []
+    for cpu in cpus:
+        cpu.bus.memory.load_program(program)
+        cpu.reg[:7] = array("H", registers)
+        results.append(run_until_error(cpu, 200))
+
+    assert results[0] == results[1]
+    assert machine_state(cpus[0]) == machine_state(cpus[1])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_self_modifying_code(engine):
+    cpu = CPU(engine=engine)
+    program = [
+        0b00_0011_00, 0b0_0000_010, 0b01_0000_00, 0b0_0001_000, # MOV r0, 0x4008 (ADD r0, 1)
+        0b101_011_00, 0b0_0000_001, 0x09,                       # STORE r0, 0x09
+        0b00_0000_00, 0b00000000,                               # NOP
+        0b01_0000_00, 0b0_1111_000,                             # ADD r0, 15 (overwritten by ADD r0, 1)
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00,                 # JMP 0x0000
+    ]
+    cpu.bus.memory.load_program(program)
+
+    cpu.run(5)
+    assert cpu.reg[0] == 0x4009
+    cpu.bus.memory.load_program([0b00_0001_00, 0b00000000]) # HALT
+    cpu.run(max_cycles=10)
+    assert cpu.stop
+    assert cpu.clock_cycle == 9
+
+FUSABLE = [
+    0b01_0000_00, 0b0_0001_000,             # 0x00: ADD r0, 1
+    0b01_1100_00, 0b0_0101_000,             # 0x02: CMP r0, 5
+    0b10_0010_00, 0b0_0000_010, 0x00, 0x00, # 0x04: JNE 0x0000
+    0b10_0111_00, 0b0_0000_010, 0x00, 0x16, # 0x08: CALL 0x0016
+    0b10_1000_00, 0b1_0000_010, 0x00, 0x30, # 0x0C: LOADB r1, 0x0030
+    0b10_0001_00, 0b0_0000_010, 0x00, 0x00, # 0x10: JZ 0x0000
+    0b00_0001_00, 0b00000000,               # 0x14: HALT
+    0b00_0011_01, 0b0_0111_000,             # 0x16: MOV r2, 7
+    0b00_0010_00, 0b00000000,               # 0x18: RET
+]
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("steps", [1, 2, 3, 7, 17, 18, 100])
+def test_fused_sequences_stop_exactly(engine, steps):
+    cpus = [CPU(engine="interpreter"), CPU(engine=engine)]
+    for cpu in cpus:
+        cpu.bus.memory.load_program(FUSABLE)
+        cpu.bus.memory.write_byte(0x30, 1)
+        cpu.run(steps)
+    assert machine_state(cpus[0]) == machine_state(cpus[1])
+    assert cpus[0].counters.snapshot() == cpus[1].counters.snapshot()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_overwritten_jump_in_sequence(engine):
+    cpus = [CPU(engine="interpreter"), CPU(engine=engine)]
+    for cpu in cpus:
+        cpu.bus.memory.load_program(FUSABLE)
+        cpu.bus.memory.write_byte(0x30, 1)
+        cpu.run(6) # Sequences are compiled
+        cpu.bus.memory.write_bytes(0x04, bytes([0b00_0000_00, 0b00000000, 0b00_0000_00, 0b00000000])) # NOP, NOP
+        cpu.run()
+        assert cpu.stop and cpu.reg[0] == 3 and cpu.reg[2] == 7
+    assert cpus[0].counters.snapshot() == cpus[1].counters.snapshot() # Including runs of dropped sequences
+
+def test_fused_dependents_are_dropped():
+    cpu = CPU(engine="fused")
+    cpu.bus.memory.load_program(FUSABLE)
+    cpu.run(6)
+    fused = cpu.fused
+    assert fused.dependents == {0x00: {0x00}, 0x02: {0x00}, 0x04: {0x00}} and fused.watched == {0x00: {0x00, 0x02, 0x04}}
+    for _ in range(100): # Rewriting the code again and again doesn't leave entries behind
+        cpu.bus.memory.write_bytes(0x02, bytes(FUSABLE[0x02:0x04])) # CMP, drops the ADD + CMP + JNE handler
+        assert 0x00 not in fused.watched and all(0x00 not in pcs for pcs in fused.dependents.values())
+        cpu.reg[8] = 0x0000
+        cpu.run(3)
+    entries = {(addr, pc) for addr, pcs in fused.dependents.items() for pc in pcs}
+    assert entries == {(addr, pc) for pc, addrs in fused.watched.items() for addr in addrs}
+    assert all(pcs for pcs in fused.dependents.values()) and len(entries) < 10
+
+def test_translator_caches_untranslatable_addresses(monkeypatch):
+    cpu = CPU(engine="translated")
+    cpu.bus.memory.load_program([
+        0b00_0100_00, 0b0_0000_000,       # 0x0000: EI (never translated)
+        0b01_0000_00, 0b0_0001_000,       # 0x0002: ADD r0, 1
+        0b100_000_00, 0b0_0000_001, 0x00, # JMP 0x0000
+    ])
+    translator = cpu.translator
+    translated = []
+    translate = translator.translate
+    monkeypatch.setattr(translator, "translate", lambda addr: translated.append(addr) or translate(addr))
+    cpu.run(steps=9)
+    assert cpu.reg[0] == 3 and translated == [0x0000, 0x0002]
+    assert translator.untranslatable == {0x0000} and translator.pages == {0: {0x0000, 0x0002}}
+
+    cpu.bus.memory.write_bytes(0x0000, bytes(2)) # NOP, only the entry of the written word is dropped
+    assert translator.untranslatable == set() and list(translator.blocks) == [0x0002]
+    assert bytes(cpu.bus.memory.watch_map[0:8]) == b"\x00\x00" + b"\x01" * 5 + b"\x00"
+    cpu.run(steps=6)
+    assert cpu.reg[0] == 5 and translated == [0x0000, 0x0002, 0x0000] and 0x0000 in translator.blocks
+
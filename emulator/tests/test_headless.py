@@ -0,0 +1,52 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.headless import HeadlessIO, parse_key_script, parse_cycles
+from emulator.src.batch import run_batch, parse_job
+
+import pytest
+
+ECHO = [
+    0b00_0011_01, 0b0_0000_010, 0xC0, 0x00, # MOV r2, 0xC000
+    0b101_011_01, 0b0_0000_010, 0xF0, 0x00, # STORE r2, 0xF000 (console base address)
+    0b10_1000_00, 0b0_0000_010, 0xF0, 0x05, # LOADB r0, 0xF005
+    0b01_0100_00, 0b0_0001_000,             # AND r0, 1
+    0b10_0001_00, 0b0_0000_010, 0x00, 0x08, # JZ 0x0008
+    0b10_1000_00, 0b1_0000_010, 0xF0, 0x04, # LOADB r1, 0xF004
+    0b10_1010_00, 0b1_0010_100,             # STOREB r1, [r2]
+    0b01_0000_01, 0b0_0001_000,             # ADD r2, 1
+    0b10_0000_00, 0b0_0000_010, 0x00, 0x08, # JMP 0x0008
+]
+
+def test_parse_key_script():
+    script = "# comment\n\n300 b\\n\n0x64 hello world\n300 c\\xe0\\x48\n"
+    assert parse_key_script(script) == [(100, b"hello world"), (300, b"b\n"), (300, b"c\xe0\x48")]
+    with pytest.raises(ValueError, match="line 1"):
+        parse_key_script("soon a")
+    with pytest.raises(ValueError, match="no keys"):
+        parse_key_script("100 ")
+    assert parse_cycles("100, 0x200,") == [100, 0x200]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_keys_arrive_at_their_cycle(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(ECHO)
+    headless = HeadlessIO(parse_key_script("1000 ab\n5000 c"), capture_cycles=[3000, 9000])
+    headless.attach(cpu)
+    with pytest.raises(RuntimeError, match="Max cycles exceeded!"):
+        cpu.run(max_cycles=10_000)
+    headless.detach()
+
+    first, second = headless.frames
+    assert 3000 <= first["clock_cycle"] < 3005 and first["base_addr"] == 0xC000
+    assert first["lines"][0] == "ab".ljust(80)
+    assert 9000 <= second["clock_cycle"] < 9005
+    assert second["lines"][0] == "abc".ljust(80)
+    assert cpu.scheduler.next_cycle > 10_000 # Only the idle check is left
+
+def test_batch_with_keys(tmp_path):
+    program = tmp_path / "echo.bin"
+    program.write_bytes(bytes(ECHO))
+    keys = parse_key_script("2000 hi")
+    result, = run_batch([parse_job(f"{program}:20000", 0, "translated", keys, [1000])], workers=1)
+    assert result["status"] == "max_cycles"
+    assert [frame["lines"][0].rstrip() for frame in result["frames"]] == [""]
+    assert result["console"]["lines"][0].rstrip() == "hi"
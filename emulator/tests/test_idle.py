@@ -0,0 +1,79 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.devices.keyboard import DATA_READY
+from emulator.src.idle import IDLE_CHECK_INTERVAL
+
+from threading import Timer
+import pytest
+
+POLL_KEYBOARD = [
+    0b10_1000_00, 0b0_0000_010, 0xF0, 0x05, # LOADB r0, 0xF005
+    0b01_0100_00, 0b0_0001_000,             # AND r0, 1
+    0b10_0001_00, 0b0_0000_010, 0x00, 0x00, # JZ 0x0000
+    0b10_1000_00, 0b1_0000_010, 0xF0, 0x04, # LOADB r1, 0xF004
+    0b00_0001_00, 0b00000000,               # HALT
+]
+
+@pytest.fixture(params=ENGINES)
+def cpu(request):
+    return CPU(engine=request.param)
+
+def test_self_jump_is_fast_forwarded(cpu):
+    cpu.bus.memory.load_program([0b100_000_00, 0b0_0000_010, 0x00, 0x00]) # JMP 0x0000
+    with pytest.raises(RuntimeError, match="Max cycles exceeded!"):
+        cpu.run(max_cycles=1_000_000)
+    assert cpu.clock_cycle == 1_000_000
+    assert cpu.idle.skipped_cycles > 900_000
+
+def test_polling_loop_matches_execution(cpu):
+    cpu.bus.memory.load_program(POLL_KEYBOARD)
+    cpu.run(steps=30_000)
+    assert cpu.clock_cycle == 50_000 # 10000 iterations of 5 cycles
+    assert cpu.pc == 0 and cpu.reg[0] == 0 and cpu.flags["Z"]
+    assert cpu.idle.skipped_cycles > 0
+
+    keyboard = cpu.bus.keyboard
+    keyboard.input_buffer.put(ord("a"))
+    keyboard.status |= DATA_READY
+    cpu.run()
+    assert cpu.stop and cpu.reg[1] == ord("a")
+
+def test_loop_with_writes_is_not_idle(cpu):
+    cpu.bus.memory.load_program([
+        0b101_011_00, 0b0_0000_010, 0x10, 0x00, # STORE r0, 0x1000
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+    ])
+    cpu.run(steps=10_000)
+    assert cpu.clock_cycle == 20_000
+    assert cpu.idle.skipped_cycles == 0
+
+def test_reading_keyboard_data_is_not_idle(cpu):
+    cpu.bus.memory.load_program([
+        0b10_1000_00, 0b0_0000_010, 0xF0, 0x04, # LOADB r0, 0xF004
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+    ])
+    for byte in range(5_000):
+        cpu.bus.keyboard.input_buffer.put(byte & 0xFF)
+    cpu.run(steps=10_000)
+    assert cpu.idle.skipped_cycles == 0
+
+def test_idle_guest_skips_to_the_next_event(cpu):
+    cpu.bus.memory.load_program([0b100_000_00, 0b0_0000_010, 0x00, 0x00]) # JMP 0x0000
+    wakeups = []
+    cpu.scheduler.schedule(1_000_000, lambda: wakeups.append(cpu.clock_cycle))
+    checks = []
+    run = cpu.idle.run
+    cpu.idle.run = lambda *args: checks.append(cpu.clock_cycle) or run(*args)
+    with pytest.raises(RuntimeError, match="Max cycles exceeded!"):
+        cpu.run(max_cycles=2_000_000)
+    assert wakeups == [1_000_000] and cpu.clock_cycle == 2_000_000
+    assert len(checks) <= 4 # Not one per IDLE_CHECK_INTERVAL
+
+def test_idle_guest_blocks_until_woken(cpu):
+    cpu.bus.memory.load_program(POLL_KEYBOARD)
+    def press():
+        cpu.bus.keyboard.put_input(ord("a"))
+        cpu.wake()
+    Timer(0.05, press).start()
+    cpu.run() # Nothing scheduled, only the key press ends the wait
+    assert cpu.stop and cpu.reg[1] == ord("a")
+    assert cpu.clock_cycle < 2 * IDLE_CHECK_INTERVAL
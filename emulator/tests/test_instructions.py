@@ -1,10 +1,10 @@
-from emulator.src.cpu import CPU
+from emulator.src.cpu import CPU, ENGINES
 
 import pytest
 
-@pytest.fixture
-def cpu():
-    return CPU()
+@pytest.fixture(params=ENGINES)
+def cpu(request):
+    return CPU(engine=request.param)
 
 def test_halt(cpu):
     program = [
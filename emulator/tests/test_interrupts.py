@@ -0,0 +1,90 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.devices.interrupts import IRQ_KEYBOARD
+from emulator.src.snapshot import save_state, restore_state
+
+import pytest
+
+# Echoes keys from an interrupt handler, the main loop only counts
+IRQ_ECHO = [
+    0b00_0011_00, 0b1_0000_010, 0x00, 0x1D, # MOV r1, 0x001D (handler)
+    0b101_011_00, 0b1_0000_010, 0x30, 0x00, # STORE r1, 0x3000 (vector of line 0)
+    0b00_0011_00, 0b1_0000_010, 0x30, 0x00, # MOV r1, 0x3000
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x08, # STORE r1, 0xF008 (vector table address)
+    0b00_0011_00, 0b1_0001_000,             # MOV r1, 1
+    0b101_010_00, 0b1_0000_010, 0xF0, 0x07, # STOREB r1, 0xF007 (unmask the keyboard line)
+    0b00_0100_00, 0b0_0000_000,             # EI
+    0b01_0000_01, 0b0_0001_000,             # 0x0018: ADD r2, 1
+    0b100_000_00, 0b0_0000_001, 0x18,       # JMP 0x0018
+    0b10_1000_00, 0b0_0000_010, 0xF0, 0x04, # 0x001D: LOADB r0, 0xF004
+    0b01_0000_01, 0b1_0001_000,             # ADD r3, 1
+    0b00_0110_00, 0b0_0000_000,             # RETI
+]
+
+def machine(engine="interpreter"):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(IRQ_ECHO)
+    cpu.run(steps=20)
+    return cpu
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_keyboard_interrupt(engine):
+    cpu = machine(engine)
+    assert cpu.flags["I"] == 1 and cpu.reg[3] == 0
+    cpu.bus.keyboard.put_input(b"A")
+    cpu.run(steps=20)
+    assert cpu.reg[0] == 0x41 and cpu.reg[3] == 1
+    assert cpu.flags["I"] == 1 and cpu.sp == 0xEFFF and 0x18 <= cpu.reg[8] < 0x1D
+    assert cpu.bus.read_byte(0xF006) == 0
+
+    cpu.bus.keyboard.put_input(b"BC") # One interrupt, the handler reads one key
+    cpu.run(steps=20)
+    assert cpu.reg[0] == 0x42 and cpu.reg[3] == 2
+
+def test_pending_until_enabled():
+    cpu = machine()
+    cpu.disable_interrupts()
+    cpu.bus.keyboard.put_input(b"A")
+    cpu.run(steps=20)
+    assert cpu.reg[3] == 0 and cpu.bus.read_byte(0xF006) == 1 << IRQ_KEYBOARD
+    cpu.enable_interrupts()
+    cpu.run(steps=20)
+    assert cpu.reg[3] == 1 and cpu.bus.read_byte(0xF006) == 0
+
+def test_masked_lines_and_acknowledge():
+    cpu = machine()
+    cpu.bus.write_byte(0xF007, 0) # Mask all lines
+    cpu.bus.keyboard.put_input(b"AB")
+    cpu.run(steps=20)
+    assert cpu.reg[3] == 0 and cpu.bus.read_byte(0xF006) == 1
+    cpu.bus.write_byte(0xF006, 1) # Acknowledged by the guest, never taken
+    cpu.bus.write_byte(0xF007, 1)
+    cpu.run(steps=20)
+    assert cpu.reg[3] == 0
+
+    cpu.bus.write_word(0x300A, 0x001D) # Same handler for line 5
+    cpu.bus.interrupts.raise_irq(5) # Masked
+    cpu.bus.interrupts.raise_irq(IRQ_KEYBOARD)
+    cpu.run(steps=20)
+    assert cpu.reg[3] == 1 and cpu.bus.read_byte(0xF006) == 1 << 5
+    cpu.bus.write_byte(0xF007, 0xFF)
+    cpu.run(steps=20)
+    assert (cpu.reg[0], cpu.reg[3]) == (0x42, 2) and cpu.bus.read_byte(0xF006) == 0
+
+def test_pending_line_in_snapshot():
+    cpu = machine()
+    cpu.disable_interrupts()
+    cpu.bus.keyboard.put_input(b"A")
+    other = CPU()
+    restore_state(other, save_state(cpu))
+    assert other.bus.interrupts.vector_base == 0x3000 and other.bus.read_byte(0xF006) == 1
+    other.enable_interrupts()
+    other.run(steps=10)
+    assert (other.reg[0], other.reg[3]) == (0x41, 1)
+
+def test_vector_engine_mirrors_controller():
+    pytest.importorskip("numpy")
+    from emulator.src.engines.vector import VectorMachine, cross_check
+    machine = VectorMachine(4)
+    machine.load_program(IRQ_ECHO)
+    assert cross_check(machine, range(4), steps=40) == []
+    assert (machine.vector_base == 0x3000).all() and (machine.irq_mask == 1).all()
@@ -0,0 +1,66 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.devices.memory import MemoryDevice
+from emulator.src.main import load_program
+
+import pytest
+
+LOOP = [
+    0b01_0000_00, 0b0_0001_001, 0x01,       # ADD r0, 1 (imm8)
+    0b100_000_00, 0b0_0000_010, 0x20, 0x00, # JMP 0x2000
+]
+
+def test_load_program_at_base():
+    memory = MemoryDevice("rom", 0x1000, 0x1FFF, "ro")
+    memory.load_program([1, 2, 3], 0x1FFD)
+    assert memory.data[-3:] == bytes([1, 2, 3]) and memory.read_byte(0x1FFD) == 1
+    with pytest.raises(ValueError, match="don't fit"):
+        memory.load_program([1, 2], 0x1FFF)
+    with pytest.raises(ValueError, match="don't fit"):
+        memory.load_program([1], 0x0FFF)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_load_file_at_base(tmp_path, engine):
+    filename = tmp_path / "loop.bin"
+    filename.write_bytes(bytes(LOOP))
+    cpu = load_program(filename, engine=engine, base_addr=0x2000)
+    assert cpu.pc == 0x2000 and cpu.bus.memory.data[0x2000 : 0x2007] == bytes(LOOP)
+    cpu.run(steps=4)
+    assert cpu.reg[0] == 2 and cpu.pc == 0x2000
+
+    filename.write_bytes(bytes(LOOP[:2]) + b"\x02") # ADD r0, 2, reloaded over cached code
+    assert cpu.bus.memory.load_file(filename, 0x2000) == 3
+    cpu.run(steps=2)
+    assert cpu.reg[0] == 4
+
+def test_shared_image(tmp_path):
+    image = tmp_path / "ram.img"
+    cpu = CPU()
+    cpu.bus.memory.map_image(image)
+    assert image.stat().st_size == cpu.bus.memory.size # Created at the RAM size
+    cpu.bus.memory.load_program(LOOP, 0x2000)
+    cpu.pc = 0x2000
+    cpu.run(steps=1)
+    cpu.bus.write_word(0x3000, 0xBEEF)
+    assert image.read_bytes()[0x2000 : 0x2007] == bytes(LOOP)
+    assert image.read_bytes()[0x3000 : 0x3002] == b"\xBE\xEF"
+
+    other = CPU()
+    other.bus.memory.map_image(image) # Sees the same memory
+    assert other.bus.read_word(0x3000) == 0xBEEF
+    cpu.bus.write_byte(0x3001, 0x00)
+    assert other.bus.read_word(0x3000) == 0xBE00
+
+def test_private_image(tmp_path):
+    image = tmp_path / "ram.img"
+    image.write_bytes(bytes(0x1000))
+    cpu = CPU()
+    with pytest.raises(ValueError, match="expected"):
+        cpu.bus.memory.map_image(image, shared=False)
+
+    contents = bytes(LOOP) + bytes(cpu.bus.memory.size - len(LOOP))
+    image.write_bytes(contents)
+    cpu.bus.memory.map_image(image, shared=False)
+    cpu.run(steps=2)
+    assert cpu.reg[0] == 1 and cpu.pc == 0x2000
+    cpu.bus.write_word(0x0000, 0xFFFF)
+    assert cpu.bus.read_word(0x0000) == 0xFFFF and image.read_bytes() == contents
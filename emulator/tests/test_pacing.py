@@ -0,0 +1,30 @@
+from emulator.src.cpu import CPU
+from emulator.src.pacing import ClockPacer, format_hz
+
+from time import perf_counter
+import pytest
+
+LOOP = [0b100_000_00, 0b0_0000_010, 0x00, 0x00] # JMP 0x0000 (2 cycles)
+
+def test_pacer_limits_clock_frequency():
+    cpu = CPU(engine="translated")
+    cpu.bus.memory.load_program(LOOP)
+    pacer = ClockPacer(cpu, 50_000)
+    pacer.start()
+    start = perf_counter()
+    with pytest.raises(RuntimeError):
+        cpu.run(max_cycles=5_000)
+    pacer.stop()
+
+    assert perf_counter() - start >= 0.09
+    assert pacer.achieved_hz <= 50_000 * 1.05
+    assert pacer.event.cancelled
+
+def test_invalid_frequency():
+    with pytest.raises(ValueError):
+        ClockPacer(CPU(), 0)
+
+def test_format_hz():
+    assert format_hz(2_500_000) == "2.500 MHz"
+    assert format_hz(1_000) == "1.000 kHz"
+    assert format_hz(60) == "60.0 Hz"
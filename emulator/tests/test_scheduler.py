@@ -0,0 +1,75 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.scheduler import Scheduler
+from emulator.src.devices.device import Device
+
+import pytest
+
+LOOP = [
+    0b01_0000_00, 0b0_0001_001, 0x01,       # ADD r0, 1 (imm8, 2 cycles)
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000 (2 cycles)
+]
+
+class TickingDevice(Device):
+    tick_rate = 7
+
+    def __init__(self, cpu):
+        super().__init__("ticker", 0xF100, 0xF1FF, "ro")
+        self.cpu = cpu
+        self.ticks = []
+
+    def tick(self):
+        self.ticks.append(self.cpu.clock_cycle)
+
+def test_events_run_in_cycle_order():
+    scheduler = Scheduler()
+    calls = []
+    scheduler.schedule(20, lambda: calls.append("b"))
+    scheduler.schedule(10, lambda: calls.append("a"))
+    cancelled = scheduler.schedule(15, lambda: calls.append("cancelled"))
+    scheduler.cancel(cancelled)
+
+    assert scheduler.next_cycle == 10
+    scheduler.run_due(20)
+    assert calls == ["a", "b"]
+    assert scheduler.next_cycle == float("inf")
+
+def test_periodic_event_skips_missed_periods():
+    scheduler = Scheduler()
+    calls = []
+    scheduler.every(10, lambda: calls.append(1))
+    scheduler.run_due(35)
+    assert calls == [1]
+    assert scheduler.next_cycle == 40
+
+def test_devices_without_tick_rate_are_not_scheduled():
+    cpu = CPU()
+    assert [event.callback for _, _, event in cpu.scheduler.events] == [cpu.idle.request_check]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_events_fire_after_crossing_instruction(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(LOOP)
+    ticker = TickingDevice(cpu)
+    cpu.attach_device(ticker)
+    samples = []
+    sampler = cpu.scheduler.every(10, lambda: samples.append(cpu.clock_cycle), cpu.clock_cycle)
+
+    cpu.run(steps=50)
+    assert cpu.clock_cycle == 100
+    assert ticker.ticks == [8, 14, 22, 28, 36, 42, 50, 56, 64, 70, 78, 84, 92, 98]
+    assert samples == [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+    cpu.scheduler.cancel(sampler)
+    assert cpu.scheduler.next_cycle == 105
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_halt_and_max_cycles_end_the_chunk(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(LOOP)
+    with pytest.raises(RuntimeError, match="Max cycles exceeded!"):
+        cpu.run(max_cycles=21)
+    assert cpu.clock_cycle == 22
+
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program([0b01_0000_00, 0b0_0001_000, 0b00_0001_00, 0b00000000]) # ADD r0, 1; HALT
+    cpu.run()
+    assert cpu.stop and cpu.reg[0] == 1 and cpu.clock_cycle == 2
@@ -0,0 +1,84 @@
+from emulator.src.cpu import CPU, ENGINES, RAM_SIZE
+from emulator.src.shared_state import SharedState, PUBLISH_RATE
+from emulator.src.snapshot import save_state, restore_state
+from emulator.src.ui.remote import MachineView, UIProcess
+from emulator.src.ui.windows.console_window import ConsoleWindow
+
+import pytest
+
+COUNTER = [
+    0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+    0b101_011_00, 0b0_0000_010, 0xC0, 0x00, # STORE r0, 0xC000
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+]
+
+class FakeTerminal():
+    def move_xy(self, x, y):
+        return ""
+
+@pytest.fixture
+def shared():
+    shared = SharedState(RAM_SIZE)
+    yield shared
+    shared.close()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cpu_runs_on_shared_memory(shared, engine):
+    cpu = CPU(engine=engine, shared=shared)
+    cpu.bus.memory.load_program(COUNTER)
+    cpu.bus.console.base_addr = 0xC000
+    cpu.run(steps=300)
+
+    other = SharedState(RAM_SIZE, shared.name) # Attached like the UI process does
+    view = MachineView(other)
+    try:
+        assert list(view.reg) == list(cpu.reg) and view.reg[0] == 100
+        assert bytes(view.bus.memory.data[0xC000 : 0xC002]) == bytes([0, 100])
+        assert (view.clock_cycle, view.status, view.bus.console.base_addr) == (cpu.clock_cycle, cpu.status, 0xC000)
+        assert view.flags["Z"] == 0 and not view.stop
+
+        state, clock_cycle = save_state(cpu), cpu.clock_cycle
+        cpu.run(steps=30)
+        assert view.reg[0] == 110
+        restore_state(cpu, state) # In place, the views stay valid
+        assert view.reg[0] == 100 and view.clock_cycle == clock_cycle
+    finally:
+        del view
+        other.close()
+
+def test_published_while_running(shared):
+    cpu = CPU(shared=shared)
+    cpu.bus.memory.load_program(COUNTER)
+    with pytest.raises(RuntimeError, match="Max cycles"):
+        cpu.run(max_cycles=PUBLISH_RATE * 3 + 10)
+    assert shared.header()[3] == PUBLISH_RATE * 3 + 10
+    cpu.stop = True
+    cpu.publish_state()
+    assert shared.stopped
+
+def test_console_window_from_view(shared):
+    cpu = CPU(shared=shared)
+    cpu.bus.memory.write_bytes(0xC000, b"Hello")
+    cpu.bus.console.base_addr = 0xC000
+    cpu.publish_state()
+    window = ConsoleWindow(FakeTerminal(), 25, 84, 0, 0, "test", MachineView(shared))
+    window.draw_contents()
+    assert window.buffer[0].startswith("Hello ")
+
+def test_ui_process(shared, capfd):
+    cpu = CPU(shared=shared)
+    cpu.bus.memory.load_program(COUNTER)
+    ui = UIProcess("counter", shared, fps=100)
+    ui.start()
+    cpu.run(steps=1000)
+    ui.stop()
+    assert ui.process.exitcode == 0
+
+def test_idle_detection_with_shared_registers(shared):
+    cpu = CPU(shared=shared)
+    cpu.bus.memory.load_program([
+        0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+    ])
+    cpu.run(steps=20_000) # Changes r0 every iteration, so it must not be fast-forwarded as idle
+    assert cpu.reg[0] == 10_000 and cpu.idle.skipped_cycles == 0
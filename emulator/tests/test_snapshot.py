@@ -0,0 +1,75 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.snapshot import save_state, restore_state
+
+from timeit import timeit
+import pytest
+
+COUNTER = [
+    0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+    0b101_011_00, 0b0_0000_010, 0x10, 0x00, # STORE r0, 0x1000
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+]
+
+def machine_state(cpu):
+    return list(cpu.reg), cpu.status, cpu.clock_cycle, cpu.stop, bytes(cpu.bus.memory.data), cpu.bus.console.base_addr
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_restore_continues_identically(engine):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(COUNTER)
+    cpu.bus.console.base_addr = 0xC000
+    cpu.run(steps=1000)
+    state = save_state(cpu)
+    saved = machine_state(cpu)
+    cpu.run(steps=1000)
+    expected = machine_state(cpu)
+
+    restore_state(cpu, state)
+    assert machine_state(cpu) == saved
+    cpu.run(steps=1000)
+    assert machine_state(cpu) == expected
+
+    other = CPU(engine=engine)
+    other.restore_state(state)
+    assert machine_state(other) == saved
+
+def test_restore_invalidates_translated_code():
+    cpu = CPU(engine="translated")
+    cpu.bus.memory.load_program(COUNTER)
+    state = save_state(cpu)
+    cpu.bus.memory.load_program([0b01_0000_00, 0b0_0010_000]) # ADD r0, 2
+    cpu.run(steps=3)
+    assert cpu.reg[0] == 2
+
+    restore_state(cpu, state)
+    cpu.run(steps=3)
+    assert cpu.reg[0] == 1
+
+def test_keyboard_state():
+    cpu = CPU()
+    keyboard = cpu.bus.keyboard
+    keyboard.put_input(b"AB")
+    state = save_state(cpu)
+
+    keyboard.input_buffer.get_nowait()
+    keyboard.status = 0
+    restore_state(cpu, state)
+    assert list(keyboard.input_buffer.queue) == [0x41, 0x42] and keyboard.status == 1
+
+    restored = CPU() # Headless CPUs have a keyboard too
+    restored.restore_state(state)
+    assert list(restored.bus.keyboard.input_buffer.queue) == [0x41, 0x42]
+
+def test_invalid_state():
+    state = bytearray(save_state(CPU()))
+    with pytest.raises(ValueError, match="Unsupported save state version"):
+        restore_state(CPU(), state[:4] + b"\xff\x00" + state[6:])
+    with pytest.raises(ValueError, match="Not a save state"):
+        restore_state(CPU(), b"\x00" * len(state))
+
+def test_restore_is_fast():
+    cpu = CPU(engine="translated")
+    cpu.bus.memory.load_program(COUNTER)
+    cpu.run(steps=100)
+    state = save_state(cpu)
+    assert timeit(lambda: restore_state(cpu, state), number=1000) < 1.0
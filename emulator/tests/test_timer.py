@@ -0,0 +1,112 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.devices.interrupts import IRQ_TIMER
+from emulator.src.devices.timer import TIMER_MATCH
+from emulator.src.snapshot import save_state, restore_state
+
+import pytest
+
+# Counts timer interrupts in r3 and wake ups in r2, the main loop only waits
+TIMER_WAIT = [
+    0b00_0011_00, 0b1_0000_010, 0x00, 0x2D, # MOV r1, 0x002D (handler)
+    0b101_011_00, 0b1_0000_010, 0x30, 0x02, # STORE r1, 0x3002 (vector of line 1)
+    0b00_0011_00, 0b1_0000_010, 0x30, 0x00, # MOV r1, 0x3000
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x08, # STORE r1, 0xF008 (vector table address)
+    0b00_0011_00, 0b1_0010_000,             # MOV r1, 2
+    0b101_010_00, 0b1_0000_010, 0xF0, 0x07, # STOREB r1, 0xF007 (unmask the timer line)
+    0b00_0011_00, 0b1_0000_010, 0x03, 0xE8, # MOV r1, 1000
+    0b101_011_00, 0b1_0000_010, 0xF0, 0x13, # STORE r1, 0xF013 (reload)
+    0b00_0011_00, 0b1_0001_000,             # MOV r1, 1
+    0b101_010_00, 0b1_0000_010, 0xF0, 0x19, # STOREB r1, 0xF019 (enable)
+    0b00_0100_00, 0b0_0000_000,             # EI
+    0b00_0111_00, 0b0_0000_000,             # 0x0026: WAIT
+    0b01_0000_01, 0b0_0001_000,             # ADD r2, 1
+    0b100_000_00, 0b0_0000_001, 0x26,       # JMP 0x0026
+    0b01_0000_01, 0b1_0001_000,             # 0x002D: ADD r3, 1
+    0b00_0110_00, 0b0_0000_000,             # RETI
+]
+TIMER_STARTED = 18 # Clock cycle after the STOREB that enables the timer
+
+def machine(engine="interpreter"):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(TIMER_WAIT)
+    return cpu
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_wait_for_timer_interrupts(engine):
+    cpu = machine(engine)
+    cpu.run(steps=12 + 5 * 5) # Setup and WAIT, then the handler (2), ADD, JMP and WAIT per period
+    assert cpu.reg[3] == 5 and cpu.reg[2] == 5 and cpu.waiting
+    assert cpu.bus.timer.event.cycle == TIMER_STARTED + 6 * 1000
+    assert cpu.clock_cycle == TIMER_STARTED + 5 * 1000 + 6 # Skipped to each expiry
+    assert cpu.counters.snapshot()["instructions"] == 37
+    assert cpu.bus.read_byte(0xF01A) == TIMER_MATCH and cpu.bus.read_byte(0xF006) == 0
+
+def test_compare_and_reload():
+    cpu = machine()
+    cpu.run(steps=12)
+    cpu.bus.write_word(0xF015, 3) # Compare: an interrupt every third expiry
+    cpu.bus.write_word(0xF013, 500) # Reload: from the next expiry on
+    cpu.run(steps=5)
+    assert cpu.reg[3] == 1 and cpu.clock_cycle == TIMER_STARTED + 1000 + 2 * 500 + 6
+    assert cpu.bus.read_word(0xF017) == 0
+    cpu.bus.write_byte(0xF01A, TIMER_MATCH)
+    assert cpu.bus.read_byte(0xF01A) == 0
+
+    cpu.bus.write_byte(0xF019, 0) # Stopped, nothing ends the wait before max cycles
+    with pytest.raises(RuntimeError, match="Max cycles"):
+        cpu.run(max_cycles=100_000)
+    assert cpu.clock_cycle == 100_000 and cpu.reg[3] == 1
+
+def test_wait_without_interrupts_enabled():
+    cpu = machine()
+    cpu.run(steps=11)
+    cpu.disable_interrupts()
+    cpu.run(steps=3) # Woken up by the pending line without taking it
+    assert (cpu.reg[2], cpu.reg[3]) == (1, 0) and cpu.clock_cycle == TIMER_STARTED + 1000 + 3
+    assert cpu.bus.read_byte(0xF006) == 1 << IRQ_TIMER
+    cpu.run(steps=3) # Still pending, WAIT doesn't wait
+    assert cpu.reg[2] == 2 and not cpu.waiting
+
+    cpu.bus.write_byte(0xF007, 0) # All lines masked, WAIT is a NOP
+    cpu.run(steps=3)
+    assert cpu.reg[2] == 3 and not cpu.waiting
+
+def test_expiry_in_snapshot():
+    cpu = machine()
+    cpu.run(steps=14)
+    state = save_state(cpu)
+    other = CPU()
+    other.clock_cycle = 123_456
+    restore_state(other, state)
+    assert other.bus.timer.event.cycle == cpu.bus.timer.event.cycle
+    other.run(steps=5)
+    cpu.run(steps=5)
+    assert list(other.reg) == list(cpu.reg) and other.clock_cycle == cpu.clock_cycle
+
+def test_wait_in_snapshot():
+    cpu = machine()
+    cpu.run(steps=12)
+    assert cpu.waiting
+    other = CPU()
+    restore_state(other, save_state(cpu))
+    assert other.waiting and not other.irq_requested # Still parked in WAIT
+    other.run(steps=5)
+    cpu.run(steps=5)
+    assert list(other.reg) == list(cpu.reg) and other.clock_cycle == cpu.clock_cycle == TIMER_STARTED + 1000 + 6
+
+    cpu.bus.interrupts.raise_irq(IRQ_TIMER) # Requested, not taken yet
+    restore_state(other, save_state(cpu))
+    assert other.irq_requested and other.scheduler.deadline == 0
+    other.run(steps=3)
+    cpu.run(steps=3)
+    assert list(other.reg) == list(cpu.reg) and other.reg[3] == 2
+
+def test_vector_engine_matches():
+    pytest.importorskip("numpy")
+    from emulator.src.engines.vector import VectorMachine, cross_check
+    machine = VectorMachine(4)
+    machine.load_program(TIMER_WAIT)
+    machine.memory[:, 0x18 : 0x1A] = [[0x03, 0xE8], [0x00, 0x10], [0x00, 0x07], [0x00, 0x00]] # Different reloads
+    assert cross_check(machine, range(4), steps=12) == []
+    assert cross_check(machine, range(4), steps=20) == []
+    assert machine.waiting.all() and (machine.reg[:, 3] == 4).all()
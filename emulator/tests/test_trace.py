@@ -0,0 +1,47 @@
+from emulator.src.cpu import CPU, ENGINES
+from emulator.src.trace import Tracer, TraceReader
+
+import pytest
+
+COUNTER = [
+    0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+    0b101_011_00, 0b0_0000_010, 0x10, 0x00, # STORE r0, 0x1000
+    0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+]
+
+def machine_state(cpu):
+    return list(cpu.reg), cpu.status, cpu.clock_cycle, bytes(cpu.bus.memory.data)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_trace_records_every_instruction(engine, tmp_path):
+    cpu = CPU(engine=engine)
+    cpu.bus.memory.load_program(COUNTER)
+    tracer = Tracer(cpu, tmp_path / "run.trace", capacity=64)
+    tracer.start()
+    cpu.run(steps=300)
+    tracer.close()
+
+    trace = TraceReader(tmp_path / "run.trace")
+    assert len(trace) == 300
+    assert [trace[i].pc for i in range(3)] == [0x0000, 0x0002, 0x0006]
+    store = trace[1]
+    assert (store.write_length, store.write_addr, store.write_old, store.write_new) == (2, 0x1000, 0, 1)
+    assert trace[-1].clock_cycle == cpu.clock_cycle
+    assert cpu.run_chunk != tracer.run_chunk
+
+def test_seek_matches_execution(tmp_path):
+    cpu = CPU()
+    cpu.bus.memory.load_program(COUNTER)
+    tracer = Tracer(cpu, tmp_path / "run.trace", capacity=100, keep_last=True)
+    tracer.start()
+    cpu.run(steps=400)
+    expected = machine_state(cpu)
+    cpu.run(steps=50)
+    tracer.close()
+
+    trace = TraceReader(tmp_path / "run.trace")
+    assert len(trace) == 100 # Only the most recent records are kept
+    assert machine_state(trace.seek(expected[2])) == expected
+    assert machine_state(trace.seek(cpu.clock_cycle)) == machine_state(cpu)
+    with pytest.raises(ValueError, match="Trace starts after cycle 10"):
+        trace.seek(10)
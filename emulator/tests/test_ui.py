@@ -0,0 +1,136 @@
+from emulator.src.cpu import CPU
+from emulator.src.ui.ui import UI
+from emulator.src.ui.frame import FrameThread
+from emulator.src.ui.windows.console_window import ConsoleWindow
+from emulator.src.ui.windows.memory_window import MemoryWindow
+
+from threading import Thread, Event
+from time import sleep
+import io
+import sys
+
+class FakeTerminal():
+    def move_xy(self, x, y):
+        return f"<{y},{x}>"
+
+class CountingOutput(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+def machine():
+    cpu = CPU()
+    cpu.term = FakeTerminal()
+    cpu.bus.console.base_addr = 0xC000
+    return cpu
+
+def test_console_only_draws_changed_rows():
+    cpu = machine()
+    window = ConsoleWindow(cpu.term, 25, 84, 0, 0, "test", cpu)
+    window.draw_contents()
+    assert len(window.buffer) == 24
+    window.render()
+
+    window.draw_contents()
+    assert window.buffer == []
+    cpu.bus.memory.write_bytes(0xC000 + 80 * 3, b"Hi\x07\xe9")
+    window.draw_contents()
+    assert window.render() == "<4,2>Hi \xe9" + " " * 76
+
+    cpu.bus.console.base_addr = 0xC050 # Scrolled by one row, the text moves up
+    window.draw_contents()
+    assert window.buffer == ["<3,2>Hi \xe9" + " " * 76, "<4,2>" + " " * 80]
+
+def test_memory_only_draws_changed_lines():
+    cpu = machine()
+    window = MemoryWindow(cpu.term, 9, 57, 0, 0, cpu)
+    window.draw_contents()
+    assert len(window.buffer) == 8
+    window.render()
+    cpu.bus.write_byte(0xC011, 0xAB)
+    window.draw_contents()
+    assert window.render() == "<3,2>C010: 00 AB" + " 00" * 14
+
+def test_one_write_per_frame(monkeypatch):
+    cpu = machine()
+    output = CountingOutput()
+    monkeypatch.setattr(sys, "stdout", output)
+    ui = UI("test", cpu)
+    output.writes = 0
+    ui.refresh()
+    assert output.writes == 1
+    ui.refresh()
+    assert output.writes == 1 # Nothing changed, nothing written
+    cpu.clock_cycle += 1
+    ui.refresh()
+    assert output.writes == 2 and output.getvalue().endswith("1")
+
+def test_call_soon_runs_between_instructions():
+    cpu = machine()
+    cpu.bus.memory.load_program([
+        0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+    ])
+    thread = Thread(target=cpu.run, daemon=True)
+    thread.start()
+    try:
+        seen = []
+        for _ in range(3):
+            done = Event()
+            cpu.call_soon(lambda: (seen.append((cpu.reg[8], cpu.clock_cycle)), done.set()))
+            assert done.wait(5)
+        assert all(pc in (0, 2) for pc, _ in seen) and seen[0][1] < seen[1][1] < seen[2][1]
+        cpu.paused = True
+        done = Event()
+        cpu.call_soon(done.set) # Also runs while paused
+        assert done.wait(5)
+    finally:
+        cpu.stop = True
+        thread.join(5)
+
+def test_frame_thread(monkeypatch):
+    cpu = machine()
+    cpu.bus.memory.load_program([
+        0b01_0000_00, 0b0_0001_000,             # ADD r0, 1
+        0b101_011_00, 0b0_0000_010, 0xC0, 0x00, # STORE r0, 0xC000
+        0b100_000_00, 0b0_0000_010, 0x00, 0x00, # JMP 0x0000
+    ])
+    monkeypatch.setattr(sys, "stdout", CountingOutput())
+    frames = FrameThread("test", cpu, fps=100)
+    frames.start()
+    thread = Thread(target=cpu.run, daemon=True)
+    thread.start()
+    try:
+        for _ in range(500):
+            if frames.frames >= 3:
+                break
+            sleep(0.01)
+    finally:
+        cpu.stop = True
+        thread.join(5)
+        frames.stop()
+    assert frames.frames >= 3
+    assert frames.snapshot.clock_cycle == cpu.clock_cycle and frames.snapshot.reg == tuple(cpu.reg)
+    assert f">{cpu.clock_cycle}<" in sys.stdout.getvalue() # The final frame
+
+def test_console_draws_committed_frames(monkeypatch):
+    cpu = machine()
+    monkeypatch.setattr(sys, "stdout", CountingOutput())
+    frames = FrameThread("test", cpu, render_on_commit=True)
+    window = frames.ui.console_win
+    cpu.bus.memory.write_bytes(0xC000, b"Hi")
+    frames.capture()
+    frames.ui.refresh()
+    assert window.screen_data == b"" # Nothing committed yet
+
+    cpu.bus.write_byte(0xF01B, 1)
+    cpu.run_host_calls() # The commit copies the screen at the end of the instruction
+    cpu.bus.memory.write_bytes(0xC000, b"Yo") # Next frame, half drawn
+    frames.capture()
+    frames.ui.refresh()
+    assert window.frame == 1 and window.screen_data[:2] == b"Hi"
+    assert "<1,2>Hi" in sys.stdout.getvalue() and "Yo" not in sys.stdout.getvalue()
@@ -0,0 +1,33 @@
+from emulator.tests.test_engines import random_program
+
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+from emulator.src.engines.vector import VectorMachine, cross_check
+
+def test_matches_cpu_with_shared_program():
+    rng = random.Random(0)
+    machine = VectorMachine(64)
+    machine.load_program(random_program(rng, 512))
+    machine.reg[:, :7] = np.array([[rng.randrange(0xE000) for _ in range(7)] for _ in range(64)])
+
+    assert cross_check(machine, range(64), steps=200) == []
+
+def test_matches_cpu_with_divergent_programs():
+    rng = random.Random(1)
+    machine = VectorMachine(64)
+    for i in range(64):
+        program = random_program(rng, 512)
+        machine.memory[i, :len(program)] = np.frombuffer(bytes(program), dtype=np.uint8)
+        machine.reg[i, :7] = [rng.randrange(0xE000) for _ in range(7)]
+
+    assert cross_check(machine, range(64), steps=200) == []
+    assert machine.faulted.any() and not machine.faulted.all()
+
+def test_max_cycles():
+    machine = VectorMachine(4)
+    machine.load_program([0b100_000_00, 0b0_0000_000]) # JMP 0
+    machine.run(max_cycles=10)
+    assert machine.timed_out.all()
+    assert (machine.clock_cycle == 10).all()
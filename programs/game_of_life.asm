@@ -8,6 +8,10 @@
 @let ALIVE = '@'
 ; Memory locations
 @let console_base_reg = 0xF000
+@let dma_dest_reg = 0xF00C
+@let dma_length_reg = 0xF00E
+@let dma_fill_reg = 0xF010 ; Followed by the control register
+@let frame_commit_reg = 0xF01B
 @let active_buffer = 0x1000
 @let hidden_buffer = 0x1002
 ; Local variables
@@ -31,15 +35,13 @@ main:
 .end:
     jmp .end
 
-init_buffers:
-.loop:
-    mov state, DEAD
-    storeb state, [active_cell]
-    storeb state, [new_cell]
-    add active_cell, 1
-    add new_cell, 1
-    cmp active_cell, DISPLAY_BUFFER_B ; Whole buffer filled, once it reaches the start of the 'B' buffer
-    jne .loop
+init_buffers: ; Clears both buffers with a single DMA fill
+    mov state, DISPLAY_BUFFER_A
+    store state, dma_dest_reg
+    mov state, 3840 ; 2 * BUFFER_SIZE
+    store state, dma_length_reg
+    mov state, 0x2002 ; Fill byte DEAD, then mode 2 (fill) into the control register, which starts the transfer
+    store state, dma_fill_reg
 .set_patterns:
     mov state, ALIVE
     storeb state, [0xC28A]
@@ -139,6 +141,7 @@ calculate_next_generation:
     load tmp, [hidden_buffer]
     store tmp, [active_buffer]
     store tmp, console_base_reg
+    storeb tmp, frame_commit_reg ; The new generation is complete
     pop tmp
     store tmp, [hidden_buffer]
     ret